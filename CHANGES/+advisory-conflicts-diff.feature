@@ -0,0 +1 @@
+Detect advisory conflicts from the advisories added in a repository version only.
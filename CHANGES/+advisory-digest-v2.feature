@@ -0,0 +1 @@
+Advisory digests are now computed directly from their fields instead of from their XML representation, and no longer depend on the order of their collections, packages and references.
@@ -0,0 +1 @@
+Determine which synced advisories already have relations with one query per batch, and create the collections of uploaded advisories in bulk.
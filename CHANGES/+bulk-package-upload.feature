@@ -0,0 +1 @@
+Added an endpoint to upload many RPMs, or a tar archive of RPMs, in a single task and repository version.
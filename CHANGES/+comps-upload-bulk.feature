@@ -0,0 +1 @@
+Look up existing comps content with one query per type when uploading a comps.xml, and stream the file to disk.
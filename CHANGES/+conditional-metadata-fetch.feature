@@ -0,0 +1 @@
+Sync now downloads repomd.xml and treeinfo files once per task, and optimized syncs request them conditionally using the ETag and Last-Modified of the previous sync, so a sync of an unchanged repository costs a single "304 Not Modified" request per repository.
@@ -0,0 +1 @@
+Copying advisories together with their packages and modules now uses a constant number of queries regardless of the number of advisories.
@@ -0,0 +1 @@
+Publications now reuse the package metadata of the previous publication of the repository and only generate metadata for newly added packages.
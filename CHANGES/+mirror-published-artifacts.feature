@@ -0,0 +1,2 @@
+Create the published artifacts of mirror_complete publications in bounded batches using PostgreSQL
+COPY, instead of building them all in memory and inserting them at once.
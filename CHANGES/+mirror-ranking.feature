@@ -0,0 +1 @@
+Mirrorlist syncs now probe the mirrors concurrently and rank them by latency, metalinks are supported with the repomd.xml of the mirrors verified against the metalink checksums, and artifacts are downloaded from the fastest mirrors, failing over between them.
@@ -0,0 +1 @@
+Resolving the packages of added and removed modules for new repository versions is now done with a few set-based queries instead of one query per module.
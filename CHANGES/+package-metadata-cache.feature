@@ -0,0 +1 @@
+Added a cache of the pre-serialized repository metadata of each package, which makes repeated publications of the same packages faster.
@@ -0,0 +1 @@
+Repository metadata files are now compressed and checksummed in parallel during publish, configurable with the ``RPM_METADATA_GENERATION_WORKERS`` setting.
@@ -0,0 +1 @@
+Sync the variant sub-repositories of distribution trees concurrently with the primary repository.
@@ -0,0 +1 @@
+Repository metadata is now parsed outside of the event loop during sync, so that downloads and saving content continue while large metadata files are parsed. The maximum lag of the event loop is reported as the `sync.event_loop_lag` progress report.
@@ -0,0 +1 @@
+Optimized syncs now only parse the metadata which changed since the previous sync, e.g. only the advisories, and carry the rest of the content forward from the latest repository version.
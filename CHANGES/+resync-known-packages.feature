@@ -0,0 +1 @@
+Packages which are already known to Pulp are no longer built from the full metadata when re-syncing a repository, skipping the parsing of their filelists and changelogs.
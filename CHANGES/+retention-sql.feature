@@ -0,0 +1 @@
+Select the packages removed by the retention policy in the database, and only among the names of the added packages when possible.
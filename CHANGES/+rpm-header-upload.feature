@@ -0,0 +1 @@
+Parse only the header of uploaded RPMs instead of copying the whole file out of the storage.
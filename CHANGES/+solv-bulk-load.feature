@@ -0,0 +1,2 @@
+Load RPMs into the dependency solver in bulk, by streaming them from the database into an rpmmd
+document which libsolv parses in a single call.
@@ -0,0 +1,2 @@
+Cache the RPMs of repository versions loaded into the dependency solver as libsolv files, speeding
+up repeated copies with dependency solving from the same repository versions.
@@ -0,0 +1 @@
+Reduced the memory usage of package metadata parsing during sync, and packages excluded from a sync no longer have their filelists and changelogs parsed.
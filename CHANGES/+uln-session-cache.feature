@@ -0,0 +1 @@
+ULN syncs now log in once and share the session key between all the downloads of a remote, logging in again when the key expires or is rejected.
@@ -0,0 +1 @@
+Sync now downloads only the changed chunks of zchunk package metadata, when createrepo_c supports zchunk, instead of the whole files.
@@ -3,8 +3,8 @@ from collections import defaultdict
 from itertools import chain
 
 import hashlib
+import json
 
-import createrepo_c as cr
 from datetime import datetime
 
 from django.conf import settings
@@ -21,8 +21,10 @@ from pulpcore.plugin.models import (
 
 from pulp_rpm.app.exceptions import AdvisoryConflict
 from pulp_rpm.app.models import (
+    UpdateCollection,
     UpdateCollectionPackage,
     UpdateRecord,
+    UpdateReference,
 )
 from pulp_rpm.app.shared_utils import is_previous_version
 
@@ -50,38 +52,31 @@ def resolve_advisories(version, previous_version):
                                                                    the current incomplete one
 
     """
-    # identify conflicting advisories
+    # Conflicts are only detected for the advisories added in this version, we are not trying to
+    # fix old conflicts in the existing repo version. There is no real harm in those, just
+    # confusing.
     advisory_pulp_type = UpdateRecord.get_pulp_type()
     current_advisories = UpdateRecord.objects.filter(
         pk__in=version.content.filter(pulp_type=advisory_pulp_type)
     )
-
-    # check for any conflict
-    unique_advisory_ids = {adv.id for adv in current_advisories}
-    if len(current_advisories) == len(unique_advisory_ids):
-        # no conflicts
-        return
-
-    current_advisories_by_id = defaultdict(list)
-    for advisory in current_advisories:
-        current_advisories_by_id[advisory.id].append(advisory)
-
     if previous_version:
-        previous_advisories = UpdateRecord.objects.filter(
+        added_advisories = current_advisories.exclude(
             pk__in=previous_version.content.filter(pulp_type=advisory_pulp_type)
         )
-        previous_advisory_ids = set(previous_advisories.values_list("id", flat=True))
-
-        # diff for querysets works fine but the result is not fully functional queryset,
-        # e.g. filtering doesn't work
-        added_advisories = current_advisories.difference(previous_advisories)
-        added_advisories_by_id = defaultdict(list)
-        for advisory in added_advisories:
-            added_advisories_by_id[advisory.id].append(advisory)
     else:
-        previous_advisory_ids = set()
         added_advisories = current_advisories
-        added_advisories_by_id = current_advisories_by_id
+
+    added_advisory_pks_by_id = defaultdict(list)
+    for pk, advisory_id in added_advisories.values_list("pk", "id").iterator():
+        added_advisory_pks_by_id[advisory_id].append(pk)
+    if not added_advisory_pks_by_id:
+        return
+
+    # The advisories which were already in the repo version and have the same id as an added one.
+    previous_advisories = current_advisories.filter(id__in=added_advisories.values("id")).exclude(
+        pk__in=added_advisories.values("pk")
+    )
+    previous_advisory_ids = set(previous_advisories.values_list("id", flat=True))
 
     # Conflicts can be in different places and behaviour differs based on that.
     # `in_added`, when conflict happens in the added advisories, this is not allowed and
@@ -90,19 +85,28 @@ def resolve_advisories(version, previous_version):
     # in the preceding repo version. This should be resolved according to the heuristics,
     # unless previous repo version has conflicts. In the latter case, the added advisory is picked.
     advisory_id_conflicts = {"in_added": [], "added_vs_previous": []}
-    for advisory_id, advisories in current_advisories_by_id.items():
-        # we are only interested in conflicts where added advisory is present, we are not trying
-        # to fix old conflicts in the existing repo version. There is no real harm in htose,
-        # just confusing.
-        if len(advisories) > 1 and advisory_id in added_advisories_by_id:
-            # if the conflict is in added advisories (2+ advisories with the same id are being
-            # added), we need to collect such ids to fail later with
-            # a list of all conflicting advisories. No other processing of those is needed.
-            if len(added_advisories_by_id[advisory_id]) > 1:
-                advisory_id_conflicts["in_added"].append(advisory_id)
-            # a standard conflict is detected
-            elif advisory_id in previous_advisory_ids:
-                advisory_id_conflicts["added_vs_previous"].append(advisory_id)
+    for advisory_id, pks in added_advisory_pks_by_id.items():
+        # if the conflict is in added advisories (2+ advisories with the same id are being
+        # added), we need to collect such ids to fail later with
+        # a list of all conflicting advisories. No other processing of those is needed.
+        if len(pks) > 1:
+            advisory_id_conflicts["in_added"].append(advisory_id)
+        # a standard conflict is detected
+        elif advisory_id in previous_advisory_ids:
+            advisory_id_conflicts["added_vs_previous"].append(advisory_id)
+
+    if not advisory_id_conflicts["in_added"] and not advisory_id_conflicts["added_vs_previous"]:
+        # no conflicts
+        return
+
+    # Only the conflicting advisories are loaded
+    conflicting_ids = advisory_id_conflicts["in_added"] + advisory_id_conflicts["added_vs_previous"]
+    current_advisories_by_id = defaultdict(list)
+    added_advisories_by_id = defaultdict(list)
+    for advisory in current_advisories.filter(id__in=conflicting_ids):
+        current_advisories_by_id[advisory.id].append(advisory)
+        if advisory.pk in added_advisory_pks_by_id[advisory.id]:
+            added_advisories_by_id[advisory.id].append(advisory)
 
     content_pks_to_add = set()
     content_pks_to_remove = set()
@@ -438,8 +442,11 @@ def merge_advisories(previous_advisory, added_advisory):
             collections_to_merge.add(collection)
 
         # Compute digest for the new merged advisory and save it
-        merged_advisory_cr = previous_advisory.to_createrepo_c(collections=collections_to_merge)
-        merged_digest = hash_update_record(merged_advisory_cr)
+        merged_digest = update_record_digest(
+            previous_advisory,
+            [(collection, collection.packages.all()) for collection in collections_to_merge],
+            references,
+        )
         merged_advisory = previous_advisory
         # Need to null both pk (content_ptr_id) and pulp_id here to insure django doesn't
         # find the original advisory instead of making a copy for us
@@ -465,9 +472,121 @@ def merge_advisories(previous_advisory, added_advisory):
     return merged_advisory
 
 
+# The fields of advisories and of their collections, packages and references which make up the
+# digest of an advisory. The version is hashed first, so that digests of other schemes never match.
+UPDATE_RECORD_DIGEST_VERSION = b"update-record-digest-v2"
+UPDATE_RECORD_DIGEST_FIELDS = (
+    "id",
+    "updated_date",
+    "description",
+    "issued_date",
+    "fromstr",
+    "status",
+    "title",
+    "summary",
+    "version",
+    "type",
+    "severity",
+    "solution",
+    "release",
+    "rights",
+    "pushcount",
+    "reboot_suggested",
+)
+UPDATE_COLLECTION_DIGEST_FIELDS = ("name", "shortname", "module")
+UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS = (
+    "arch",
+    "epoch",
+    "filename",
+    "name",
+    "reboot_suggested",
+    "relogin_suggested",
+    "restart_suggested",
+    "release",
+    "src",
+    "sum",
+    "sum_type",
+    "version",
+)
+UPDATE_REFERENCE_DIGEST_FIELDS = ("href", "ref_id", "title", "ref_type")
+AUTOFILLED_COLLECTION_NAME_PREFIX = "collection-autofill-"
+
+
+def _field_value(obj, field):
+    """Get a field of a part of an advisory, which is either a dict or a model."""
+    return obj.get(field) if isinstance(obj, dict) else getattr(obj, field, None)
+
+
+def _digest_values(obj, fields):
+    """
+    Encode the fields of a part of an advisory for its digest.
+
+    The same value is encoded the same whether it was parsed or read from the database: missing
+    values are empty, booleans are 0 or 1, and each value is prefixed with its length.
+    """
+    encoded = []
+    for field in fields:
+        value = _field_value(obj, field)
+        if value is None:
+            value = ""
+        elif isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, dict):
+            value = json.dumps(value, sort_keys=True)
+        value = str(value)
+        encoded.append("{}:{}".format(len(value), value))
+    return "\x1f".join(encoded).encode("utf-8")
+
+
+def update_record_digest(update_record, collections, references):
+    """
+    Find the hex digest of an advisory from its fields.
+
+    The digest does not depend on the order of the collections, packages and references, so it
+    can be computed both from parsed advisories and from the database. It only uses plain
+    values, so it can be computed in other processes.
+
+    Args:
+        update_record (dict or UpdateRecord): The fields of the advisory.
+        collections (list): The collections of the advisory, as (collection, packages) pairs of
+            dicts or models.
+        references (list): The references of the advisory, as dicts or models.
+
+    Returns:
+        str: a hex digest representing the update record
+
+    """
+    encoded_collections = []
+    for collection, packages in collections:
+        collection = {
+            field: _field_value(collection, field) for field in UPDATE_COLLECTION_DIGEST_FIELDS
+        }
+        if (collection["name"] or "").startswith(AUTOFILLED_COLLECTION_NAME_PREFIX):
+            # the name is random, it was made up for a collection which had none
+            collection["name"] = None
+        encoded_packages = sorted(
+            _digest_values(package, UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS) for package in packages
+        )
+        encoded_collections.append(
+            b"\x1e".join(
+                [_digest_values(collection, UPDATE_COLLECTION_DIGEST_FIELDS), *encoded_packages]
+            )
+        )
+
+    digest = hashlib.sha256(UPDATE_RECORD_DIGEST_VERSION)
+    digest.update(b"\x1d" + _digest_values(update_record, UPDATE_RECORD_DIGEST_FIELDS))
+    for encoded_collection in sorted(encoded_collections):
+        digest.update(b"\x1c" + encoded_collection)
+    for encoded_reference in sorted(
+        _digest_values(reference, UPDATE_REFERENCE_DIGEST_FIELDS) for reference in references
+    ):
+        digest.update(b"\x1d" + encoded_reference)
+    return digest.hexdigest()
+
+
 def hash_update_record(update):
     """
-    Find the hex digest for an update record xml from creatrepo_c.
+    Find the hex digest for an update record from creatrepo_c.
 
     Args:
         update(createrepo_c.UpdateRecord): update record
@@ -476,6 +595,17 @@ def hash_update_record(update):
         str: a hex digest representing the update record
 
     """
-    uinfo = cr.UpdateInfo()
-    uinfo.append(update)
-    return hashlib.sha256(uinfo.xml_dump().encode("utf-8")).hexdigest()
+    return update_record_digest(
+        UpdateRecord.createrepo_to_dict(update),
+        [
+            (
+                UpdateCollection.createrepo_to_dict(collection),
+                [
+                    UpdateCollectionPackage.createrepo_to_dict(package)
+                    for package in collection.packages
+                ],
+            )
+            for collection in update.collections
+        ],
+        [UpdateReference.createrepo_to_dict(reference) for reference in update.references],
+    )
@@ -95,6 +95,7 @@ CR_PACKAGE_ATTRS = SimpleNamespace(
 
 PACKAGE_REPODATA = ["primary", "filelists", "other"]
 PACKAGE_DB_REPODATA = ["primary_db", "filelists_db", "other_db"]
+PACKAGE_ZCK_REPODATA = ["primary_zck", "filelists_zck", "other_zck"]
 UPDATE_REPODATA = ["updateinfo"]
 MODULAR_REPODATA = ["modules"]
 COMPS_REPODATA = ["group"]
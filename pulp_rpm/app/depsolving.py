@@ -1,6 +1,11 @@
 import collections
+import itertools
 import logging
+import os
 import solv
+import tempfile
+import uuid
+from xml.sax.saxutils import escape
 
 from pulp_rpm.app import models
 
@@ -28,6 +33,19 @@ RPM_FIELDS = [
     "files",
 ]
 
+# Version of the layout of the cached RPM solvables. Bump it whenever the way RPMs are converted
+# to solvables changes, so that files written by older code are never loaded.
+SOLV_CACHE_FORMAT = 2
+
+# The frame of the rpmmd primary documents used to bulk load RPMs into libsolv.
+RPMMD_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<metadata xmlns="http://linux.duke.edu/metadata/common" '
+    'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n'
+)
+RPMMD_FOOTER = "</metadata>\n"
+RPMMD_DEPENDENCY_FLAGS = {"EQ", "LT", "GT", "LE", "GE"}
+
 MODULE_FIELDS = [
     "pk",
     "name",
@@ -517,6 +535,238 @@ def module_defaults_unit_to_solvable(solv_repo, unit):
     return solvable
 
 
+def rpmmd_escape(values, separator=""):
+    """Escape values for rpmmd text and attributes, joined by a separator.
+
+    Escaping many values at once is much faster than escaping them one by one.
+    """
+    return escape("\0".join(values)).replace('"', "&quot;").replace("\0", separator)
+
+
+def rpmmd_attrs(**attrs):
+    """Format the non-empty attributes of an rpmmd element."""
+    return "".join(
+        ' {}="{}"'.format(key, rpmmd_escape([str(value)])) for key, value in attrs.items() if value
+    )
+
+
+def rpm_to_rpmmd(unit):
+    """Convert a Pulp RPM dict to an rpmmd ``package`` element which libsolv can load.
+
+    This is the rpmmd counterpart of rpm_to_solvable() and rpm_dependency_conversion(), so the
+    same rules apply: rich dependencies only carry their name and the other dependencies are
+    related to their EVR by the flags, if any. The name.arch = evr provide is not expressible in
+    rpmmd, it is added once the package is loaded.
+
+    Args:
+        unit (dict): The unit being converted.
+
+    Returns:
+        (str) The rpmmd element.
+    """
+    parts = [
+        '<package type="rpm"><name>{}</name><arch>{}</arch><version{}/><format>'.format(
+            rpmmd_escape([unit.get("name")]),
+            rpmmd_escape([unit.get("arch", "noarch")]),
+            rpmmd_attrs(epoch=unit.get("epoch"), ver=unit.get("version"), rel=unit.get("release")),
+        )
+    ]
+
+    def add_names(names):
+        if names:
+            parts.append(
+                '<rpm:entry name="{}"/>'.format(rpmmd_escape(names, '"/><rpm:entry name="'))
+            )
+            names.clear()
+
+    for attribute_name in ("requires", "provides", "recommends"):
+        dependencies = unit.get(attribute_name)
+        if not dependencies:
+            continue
+
+        parts.append("<rpm:{}>".format(attribute_name))
+        # consecutive dependencies consisting of just a name are written together
+        names = []
+        for name, flags, epoch, version, release, *_ in dependencies:
+            if name.startswith("(") or not flags:
+                # the Rich/Boolean dependencies have just the 'name' attribute
+                names.append(name)
+            elif flags in RPMMD_DEPENDENCY_FLAGS:
+                add_names(names)
+                attrs = rpmmd_attrs(name=name, flags=flags, epoch=epoch, ver=version, rel=release)
+                parts.append("<rpm:entry{}/>".format(attrs))
+            else:
+                raise ValueError("Unsupported dependency flags %s" % flags)
+        add_names(names)
+        parts.append("</rpm:{}>".format(attribute_name))
+
+    # file_repr = e.g. (None, '/usr/bin/', 'bash'), skip the ones without a directory, see
+    # https://github.com/openSUSE/libsolv/issues/397
+    paths = [file_repr[1] + file_repr[2] for file_repr in unit.get("files", []) if file_repr[1]]
+    if paths:
+        parts.append("<file>{}</file>".format(rpmmd_escape(paths, "</file><file>")))
+
+    parts.append("</format></package>\n")
+    return "".join(parts)
+
+
+def write_rpm_solv(rpms, path):
+    """Convert RPMs to solvables and write them to a libsolv ``.solv`` file.
+
+    Instead of creating the solvables one dependency and file at a time, the RPMs are streamed
+    into an rpmmd primary document which libsolv parses in a single call. The conversion happens
+    in a separate pool, so that the file only contains the RPMs themselves. The pk of every unit
+    is stored as the SOLVABLE_PKGID of its solvable so that the solvables can be mapped back to
+    the units once the file is loaded. Note that libsolv leaves out zero epochs when parsing rpmmd,
+    which compare equal to missing ones.
+
+    Args:
+        rpms (iterable): Pulp RPM dicts with the RPM_FIELDS.
+        path (str): Path of the file to write.
+    """
+    pool = solv.Pool()
+    pool.setarch()
+    repo = pool.add_repo("rpms")
+
+    unit_ids = []
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".xml") as primary:
+        primary.write(RPMMD_HEADER)
+        for rpm in rpms:
+            unit_ids.append(rpm["pk"])
+            primary.write(rpm_to_rpmmd(rpm))
+        primary.write(RPMMD_FOOTER)
+        primary.flush()
+
+        primary_file = solv.xfopen(primary.name)
+        try:
+            loaded = repo.add_rpmmd(primary_file, None, 0)
+        finally:
+            primary_file.close()
+
+    if not loaded or repo.nsolvables != len(unit_ids):
+        raise ValueError("Unable to load RPMs into libsolv: {}".format(pool.errstr))
+
+    repodata = repo.first_repodata()
+    for solvable, unit_id in zip(repo.solvables, unit_ids):
+        repodata.set_str(solvable.id, solv.SOLVABLE_PKGID, str(unit_id))
+        # Prv: $n . $a = $evr
+        rel = pool.rel2id(solvable.nameid, solvable.archid, solv.REL_ARCH)
+        rel = pool.rel2id(rel, solvable.evrid, solv.REL_EQ)
+        solvable.add_deparray(solv.SOLVABLE_PROVIDES, rel)
+
+    repodata.internalize()
+    solv_file = solv.xfopen(path, "w")
+    repo.write(solv_file)
+    solv_file.close()
+
+
+class SolvCache:
+    """A size-capped LRU cache of the RPM solvables of repository versions.
+
+    Repository versions are immutable, so the solvables of their RPMs are written to a ``.solv``
+    file named after the pk of the version, which libsolv loads much faster than the solvables can
+    be rebuilt from the database. Using a file bumps its modification time, and the least recently
+    used files are removed once the cache grows past SOLVER_CACHE_MAX_SIZE bytes.
+
+    The files are kept on local disk rather than as artifacts in domain storage: libsolv can only
+    load a local file, so a remote artifact would have to be downloaded for every load, and a miss
+    merely costs rebuilding the solvables from the database. Since the files are named after
+    immutable repository versions they never go stale, so each host can keep its own cache.
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        """Cache Init."""
+        self.directory = (
+            directory
+            or settings.SOLVER_CACHE_DIR
+            or os.path.join(settings.WORKING_DIRECTORY, "solv-cache")
+        )
+        self.max_size = settings.SOLVER_CACHE_MAX_SIZE if max_size is None else max_size
+
+    @property
+    def enabled(self):
+        """Whether the cache is enabled."""
+        return self.max_size > 0
+
+    def path(self, repo_version):
+        """Return the path of the cache file of a repository version."""
+        return os.path.join(self.directory, "{}-{}.solv".format(repo_version.pk, SOLV_CACHE_FORMAT))
+
+    def get(self, repo_version):
+        """Return the path of the cache file of a repository version, or None on a miss."""
+        path = self.path(repo_version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, repo_version, write_func):
+        """Write the cache file of a repository version and return its path.
+
+        Args:
+            repo_version (pulpcore.models.RepositoryVersion): The repository version.
+            write_func (callable): Called with the path of a temporary file to write to.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_func(tmp_path)
+            path = self.path(repo_version)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        if self.fits(path):
+            self.evict(keep=path)
+        return path
+
+    def fits(self, path):
+        """Whether a cache file fits into the size cap on its own."""
+        try:
+            return os.path.getsize(path) <= self.max_size
+        except FileNotFoundError:
+            return True
+
+    def discard(self, repo_version):
+        """Remove the cache file of a repository version."""
+        try:
+            os.remove(self.path(repo_version))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the cache fits into its size cap.
+
+        Args:
+            keep (str): The path of a file which is in use and must not be removed.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".solv"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
 class UnitSolvableMapping:
     """Map libsolv solvables to Pulp units and repositories.
 
@@ -593,6 +843,7 @@ class Solver:
         self._pool.setarch()  # prevent https://github.com/openSUSE/libsolv/issues/267
         self._pool.set_flag(solv.Pool.POOL_FLAG_IMPLICITOBSOLETEUSESCOLORS, 1)
         self.mapping = UnitSolvableMapping()
+        self._solv_cache = SolvCache()
 
     def finalize(self):
         """Finalize the solver - a finalized solver is ready for depsolving.
@@ -669,19 +920,12 @@ class Solver:
             "pk"
         )
 
-        nonmodular_rpms = models.Package.objects.filter(
-            pk__in=package_ids, is_modular=False
-        ).values(*RPM_FIELDS)
-
-        for rpm in nonmodular_rpms.iterator(chunk_size=5000):
-            self._add_unit_to_solver(rpm_to_solvable, rpm, repo, libsolv_repo_name)
-
-        modular_rpms = models.Package.objects.filter(pk__in=package_ids, is_modular=True).values(
-            *RPM_FIELDS
-        )
-
-        for rpm in modular_rpms.iterator(chunk_size=5000):
-            self._add_unit_to_solver(rpm_to_solvable, rpm, repo, libsolv_repo_name)
+        start = repo.nsolvables
+        if self._solv_cache.enabled:
+            self._load_rpms_from_cache(repo_version, package_ids, repo)
+        else:
+            self._load_rpms_uncached(package_ids, repo)
+        self._register_solv_rpms(repo, start, libsolv_repo_name)
 
         # Load modules into the solver
 
@@ -712,9 +956,70 @@ class Solver:
         # Need to call pool->addfileprovides(), pool->createwhatprovides() after loading new repo
         self._finalized = False
 
-        repodata.internalize()
+        # Solvables loaded from solv files live in repodata of their own, in which case the combined
+        # target repo has no single first repodata anymore.
+        if repodata is not None:
+            repodata.internalize()
         return libsolv_repo_name
 
+    def _iter_rpms(self, package_ids):
+        """Iterate over the RPMs of a repository version, nonmodular ones first."""
+        for is_modular in (False, True):
+            rpms = models.Package.objects.filter(pk__in=package_ids, is_modular=is_modular).values(
+                *RPM_FIELDS
+            )
+            yield from rpms.iterator(chunk_size=5000)
+
+    def _load_rpms_uncached(self, package_ids, repo):
+        """Load the RPMs of a repository version through a temporary solv file."""
+        with tempfile.TemporaryDirectory(dir=".") as tmp_dir:
+            path = os.path.join(tmp_dir, "rpms.solv")
+            write_rpm_solv(self._iter_rpms(package_ids), path)
+            if not self._add_solv(repo, path):
+                raise RuntimeError("Unable to load the solv file {}".format(path))
+
+    def _load_rpms_from_cache(self, repo_version, package_ids, repo):
+        """Load the RPMs of a repository version from the solv cache, filling it on a miss.
+
+        A file larger than the whole cache is only used once and removed afterwards. If a file
+        cannot be loaded right after it was written, e.g. because another worker evicted it, the
+        RPMs are loaded without the cache.
+        """
+
+        def write_func(path):
+            write_rpm_solv(self._iter_rpms(package_ids), path)
+
+        path = self._solv_cache.get(repo_version)
+        if path is not None:
+            if self._add_solv(repo, path):
+                return
+            # The file is corrupt, was written by an incompatible libsolv or was just evicted
+            logger.debug("Rebuilding unreadable solv cache file {}".format(path))
+
+        path = self._solv_cache.put(repo_version, write_func)
+        loaded = self._add_solv(repo, path)
+        if not self._solv_cache.fits(path):
+            self._solv_cache.discard(repo_version)
+        if not loaded:
+            logger.debug("Unable to load the solv cache file {}, not using it".format(path))
+            self._load_rpms_uncached(package_ids, repo)
+
+    def _register_solv_rpms(self, repo, start, libsolv_repo_name):
+        """Register the RPM solvables loaded from a solv file after the first ``start`` ones."""
+        for solvable in itertools.islice(repo.solvables, start, None):
+            unit_id = uuid.UUID(solvable.lookup_str(solv.SOLVABLE_PKGID))
+            self.mapping.register(unit_id, solvable, libsolv_repo_name)
+
+    @staticmethod
+    def _add_solv(repo, path):
+        solv_file = solv.xfopen(path)
+        if solv_file is None:
+            return False
+        try:
+            return repo.add_solv(solv_file, 0)
+        finally:
+            solv_file.close()
+
     def _add_unit_to_solver(self, conversion_func, unit, repo, libsolv_repo_name):
         solvable = conversion_func(repo, unit)
         self.mapping.register(unit["pk"], solvable, libsolv_repo_name)
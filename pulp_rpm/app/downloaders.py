@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 
 from aiohttp_xmlrpc.client import ServerProxy, _Method
 from logging import getLogger
@@ -12,6 +14,17 @@ from pulp_rpm.app.shared_utils import urlpath_sanitize
 
 log = getLogger(__name__)
 
+# For how many seconds a ULN session key is used before logging in again, and the response
+# statuses with which ULN rejects a session key.
+ULN_SESSION_KEY_LIFETIME = 30 * 60
+ULN_AUTH_FAILURE_STATUSES = (401, 403)
+
+
+class NotModified(Exception):
+    """
+    Raised when a file requested conditionally has not been modified since it was last downloaded.
+    """
+
 
 class RpmFileDownloader(FileDownloader):
     """
@@ -29,6 +42,8 @@ class RpmFileDownloader(FileDownloader):
         Initialize the downloader.
         """
         kwargs.pop("silence_errors_for_response_status_codes", None)
+        kwargs.pop("byte_range", None)
+        kwargs.pop("validators", None)
         super().__init__(*args, **kwargs)
 
 
@@ -40,9 +55,15 @@ class RpmDownloader(HttpDownloader):
         silence_errors_for_response_status_codes (iterable): An iterable of response exception
             codes to be ignored when raising exception. e.g. `{404}`
         sles_auth_token (str): SLES authentication token.
+        byte_range (tuple): The first and the last byte of the file to download, if only a range of
+            it is requested.
+        validators (dict): The "etag" and "last_modified" of a previous download of the file, to
+            only download it if it has been modified since.
 
     Raises:
         FileNotFoundError: If aiohttp response status is 404 and silenced.
+        ValueError: If a byte range is requested and the server does not support range requests.
+        NotModified: If validators are given and the file has not been modified.
     """
 
     def __init__(
@@ -51,12 +72,16 @@ class RpmDownloader(HttpDownloader):
         silence_errors_for_response_status_codes=None,
         sles_auth_token=None,
         urlencode=True,
+        byte_range=None,
+        validators=None,
         **kwargs,
     ):
         """
         Initialize the downloader.
         """
         self.sles_auth_token = sles_auth_token
+        self.byte_range = byte_range
+        self.validators = validators
 
         if silence_errors_for_response_status_codes is None:
             silence_errors_for_response_status_codes = set()
@@ -111,10 +136,28 @@ class RpmDownloader(HttpDownloader):
         This method provides the same return object type and documented in
         :meth:`~pulpcore.plugin.download.BaseDownloader._run`.
         """
+        headers = {}
+        if self.byte_range:
+            headers["Range"] = "bytes={}-{}".format(*self.byte_range)
+        if self.validators:
+            if self.validators.get("etag"):
+                headers["If-None-Match"] = self.validators["etag"]
+            if self.validators.get("last_modified"):
+                headers["If-Modified-Since"] = self.validators["last_modified"]
         async with self.session.get(
-            self.url, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth
+            self.url,
+            proxy=self.proxy,
+            proxy_auth=self.proxy_auth,
+            auth=self.auth,
+            headers=headers or None,
         ) as response:
             self.raise_for_status(response)
+            if self.validators and response.status == 304:
+                raise NotModified(self.url)
+            if self.byte_range and response.status != 206:
+                raise ValueError(
+                    "The server does not support range requests for {}".format(self.url)
+                )
             to_return = await self._handle_response(response)
             await response.release()
             self.response_headers = response.headers
@@ -124,6 +167,88 @@ class RpmDownloader(HttpDownloader):
         return to_return
 
 
+class UlnSession:
+    """
+    The ULN session key of a remote, shared by all of its downloaders.
+
+    Logging in to ULN is an XML-RPC round trip, so the key is reused by all downloads until it
+    expires or is rejected. Concurrent downloads wait for a single login.
+    """
+
+    def __init__(self, server_base_url, username, password, lifetime=ULN_SESSION_KEY_LIFETIME):
+        """
+        Initialize the session, the login happens on the first download.
+
+        Args:
+            server_base_url (str): ULN server url.
+            username (str): Username for authentication in ULN network
+            password (str): password for authentication in ULN network
+            lifetime (int): For how many seconds a session key is used.
+        """
+        self.server_base_url = server_base_url
+        self.username = username
+        self.password = password
+        self.lifetime = lifetime
+        self._key = None
+        self._expires = 0
+        self._lock = None
+        self._lock_loop = None
+
+    async def login(self, client, proxy=None, proxy_auth=None, auth=None):
+        """
+        Log into the ULN account.
+
+        Args:
+            client (aiohttp.ClientSession): The HTTP session to make the XML-RPC call with.
+            proxy (str): The proxy to log in through.
+            proxy_auth (aiohttp.BasicAuth): The authentication for the proxy.
+            auth (aiohttp.BasicAuth): The authentication for the ULN server.
+
+        Returns:
+            str: The session key.
+
+        Raises:
+            UlnCredentialsError: If no or not valid ULN credentials are given.
+        """
+        server = AllowProxyServerProxy(
+            os.path.join(self.server_base_url, "rpc/api"),
+            client=client,
+            proxy=proxy,
+            proxy_auth=proxy_auth,
+            auth=auth,
+        )
+        key = await server.auth.login(self.username, self.password)
+        if len(key) != 43:
+            raise UlnCredentialsError("No valid ULN credentials given.")
+        return key
+
+    async def get_key(self, client, proxy=None, proxy_auth=None, auth=None):
+        """
+        Return the session key, logging in if there is no valid one.
+
+        Args:
+            client (aiohttp.ClientSession): The HTTP session to log in with, if needed.
+            proxy (str): The proxy to log in through.
+            proxy_auth (aiohttp.BasicAuth): The authentication for the proxy.
+            auth (aiohttp.BasicAuth): The authentication for the ULN server.
+        """
+        loop = asyncio.get_event_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+
+        async with self._lock:
+            if self._key is None or time.monotonic() >= self._expires:
+                self._key = await self.login(client, proxy, proxy_auth, auth)
+                self._expires = time.monotonic() + self.lifetime
+            return self._key
+
+    def invalidate(self, key):
+        """Forget a session key which was rejected, unless it was already replaced."""
+        if self._key == key:
+            self._key = None
+
+
 class UlnDownloader(RpmDownloader):
     """
     Custom Downloader for ULN repositories.
@@ -132,13 +257,23 @@ class UlnDownloader(RpmDownloader):
         username (str): Username for authentication in ULN network
         password (str): password for authentication in ULN network
         uln_server_base_url (str): ULN server url.
+        uln_session (UlnSession): The session shared by the downloaders of the remote. A new one is
+            created if not given.
 
     Raises:
         UlnCredentialsError: If no or not valid ULN credentials are given,
             this Error will be displayed
     """
 
-    def __init__(self, *args, username=None, password=None, uln_server_base_url=None, **kwargs):
+    def __init__(
+        self,
+        *args,
+        username=None,
+        password=None,
+        uln_server_base_url=None,
+        uln_session=None,
+        **kwargs,
+    ):
         """
         Initialize the downloader for ULN repositories.
 
@@ -147,6 +282,9 @@ class UlnDownloader(RpmDownloader):
         self.username = username
         self.password = password
         self.uln_server_base_url = uln_server_base_url
+        if uln_session is None:
+            uln_session = UlnSession(uln_server_base_url, username, password)
+        self.uln_session = uln_session
         self.headers = None
         self.session_key = None
 
@@ -156,44 +294,48 @@ class UlnDownloader(RpmDownloader):
         """
         Download, validate, and compute digests on the `url`. This is a coroutine.
 
-        Once per session the coroutine logs into the ULN account using the
-        ULN username and password. The returned key is used for authentification
-        for all other downloads.
+        The ULN session key of the remote is used for authentication, it is obtained by logging
+        into the ULN account once for all the downloads. If the key is rejected, the download is
+        retried once with a new one.
 
         This method provides the same return object type and documented in
         :meth:`~pulpcore.plugin.download.BaseDownloader._run`.
         """
         parsed = urlparse(self.url)
+        is_uln = parsed.scheme == "uln"
 
-        if parsed.scheme == "uln":
-            # get ULN Session-key
-            SERVER_URL = os.path.join(self.uln_server_base_url, "rpc/api")
-
-            # set proxy for authentification
-            client = AllowProxyServerProxy(
-                SERVER_URL, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth
-            )
-            if not self.session_key:
-                self.session_key = await client.auth.login(self.username, self.password)
-                if len(self.session_key) != 43:
-                    raise UlnCredentialsError("No valid ULN credentials given.")
-                self.headers = {"X-ULN-API-User-Key": self.session_key}
-                await client.close()
+        url = self.url
+        if is_uln:
             # build request url from input uri
             channelLabel = parsed.netloc
             path = parsed.path.lstrip("/")
             url = os.path.join(self.uln_server_base_url, "XMLRPC/GET-REQ", channelLabel, path)
-        async with self.session.get(
-            url, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth, headers=self.headers
-        ) as response:
-            self.raise_for_status(response)
-            to_return = await self._handle_response(response)
-            await response.release()
-            self.response_headers = response.headers
+
+        for attempt in range(2):
+            if is_uln:
+                self.session_key = await self.uln_session.get_key(
+                    self.session, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth
+                )
+                self.headers = {"X-ULN-API-User-Key": self.session_key}
+            async with self.session.get(
+                url,
+                proxy=self.proxy,
+                proxy_auth=self.proxy_auth,
+                auth=self.auth,
+                headers=self.headers,
+            ) as response:
+                if is_uln and attempt == 0 and response.status in ULN_AUTH_FAILURE_STATUSES:
+                    # the session key expired or was revoked, log in again
+                    self.uln_session.invalidate(self.session_key)
+                    continue
+                self.raise_for_status(response)
+                to_return = await self._handle_response(response)
+                await response.release()
+                self.response_headers = response.headers
+                break
 
         if self._close_session_on_finalize:
             self.session.close()
-            client.close()
         return to_return
 
 
@@ -3,8 +3,10 @@ import sys
 
 from django.conf import settings
 from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 
-from pulp_rpm.app.models import Package  # noqa
+from pulp_rpm.app.models import Package, PackageMetadataCache  # noqa
 
 
 class Command(BaseCommand):
@@ -51,6 +53,16 @@ class Command(BaseCommand):
             sys.stdout.write("\rTrimmed changelogs for {} packages".format(total))
             sys.stdout.flush()
 
+        def update_packages(packages):
+            # bulk_update() doesn't touch pulp_last_updated by itself, but publications rely on it
+            # to tell whether the metadata they have serialized before is still current
+            now = timezone.now()
+            for package in packages:
+                package.pulp_last_updated = now
+            with transaction.atomic():
+                Package.objects.bulk_update(packages, fields=["changelogs", "pulp_last_updated"])
+                PackageMetadataCache.objects.filter(package__in=packages).delete()
+
         for package in Package.objects.all().only("changelogs").iterator():
             # make sure the changelogs are ascending sorted by date
             package.changelogs.sort(key=lambda t: t[1])
@@ -58,12 +70,12 @@ class Command(BaseCommand):
             package.changelogs = package.changelogs[-changelog_limit:]
             batch.append(package)
             if len(batch) > 500:
-                Package.objects.bulk_update(batch, fields=["changelogs"])
+                update_packages(batch)
                 trimmed_packages += len(batch)
                 batch.clear()
                 update_total(trimmed_packages)
 
-        Package.objects.bulk_update(batch, fields=["changelogs"])
+        update_packages(batch)
         trimmed_packages += len(batch)
         batch.clear()
         update_total(trimmed_packages)
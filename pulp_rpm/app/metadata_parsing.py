@@ -41,11 +41,21 @@ class MetadataParser:
         """
         cr.xml_parse_primary(self.primary_xml_path, pkgcb=pkgcb, do_files=False)
 
-    def as_iterator(self):
-        """Return a package iterator."""
+    def as_iterator(self, skip_pkgids=None):
+        """Return a package iterator.
+
+        Args:
+            skip_pkgids (set): pkgIds of packages which should not be returned. Their filelists
+                and other metadata is not even loaded.
+        """
+
+        def skip_known(pkgId, name, arch):
+            return None if pkgId in skip_pkgids else cr.Package()
+
         return cr.PackageIterator(
             primary_path=self.primary_xml_path,
             filelists_path=self.filelists_xml_path,
             other_path=self.other_xml_path,
+            newpkgcb=skip_known if skip_pkgids else None,
             warningcb=warningcb,
         )
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_lifecycle.mixins
+import pulpcore.app.models.base
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rpm", "0061_fix_modulemd_defaults_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageMetadataCache",
+            fields=[
+                (
+                    "pulp_id",
+                    models.UUIDField(
+                        default=pulpcore.app.models.base.pulp_uuid,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("pulp_created", models.DateTimeField(auto_now_add=True)),
+                ("pulp_last_updated", models.DateTimeField(auto_now=True, null=True)),
+                (
+                    "checksum_type",
+                    models.TextField(
+                        choices=[
+                            ("unknown", "unknown"),
+                            ("md5", "md5"),
+                            ("sha1", "sha1"),
+                            ("sha1", "sha1"),
+                            ("sha224", "sha224"),
+                            ("sha256", "sha256"),
+                            ("sha384", "sha384"),
+                            ("sha512", "sha512"),
+                        ]
+                    ),
+                ),
+                ("pkgId", models.TextField()),
+                ("primary", models.TextField()),
+                ("filelists", models.TextField()),
+                ("other", models.TextField()),
+                (
+                    "package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metadata_cache",
+                        to="rpm.package",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("package", "checksum_type")},
+            },
+            bases=(django_lifecycle.mixins.LifecycleModelMixin, models.Model),
+        ),
+    ]
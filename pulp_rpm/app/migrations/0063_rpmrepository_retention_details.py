@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rpm", "0062_packagemetadatacache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rpmrepository",
+            name="retention_details",
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:12
+
+import hashlib
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# A frozen copy of the version 2 digest of pulp_rpm.app.advisory, so that later changes of the
+# digest do not change what this migration writes.
+UPDATE_RECORD_DIGEST_VERSION = b"update-record-digest-v2"
+UPDATE_RECORD_DIGEST_FIELDS = (
+    "id",
+    "updated_date",
+    "description",
+    "issued_date",
+    "fromstr",
+    "status",
+    "title",
+    "summary",
+    "version",
+    "type",
+    "severity",
+    "solution",
+    "release",
+    "rights",
+    "pushcount",
+    "reboot_suggested",
+)
+UPDATE_COLLECTION_DIGEST_FIELDS = ("name", "shortname", "module")
+UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS = (
+    "arch",
+    "epoch",
+    "filename",
+    "name",
+    "reboot_suggested",
+    "relogin_suggested",
+    "restart_suggested",
+    "release",
+    "src",
+    "sum",
+    "sum_type",
+    "version",
+)
+UPDATE_REFERENCE_DIGEST_FIELDS = ("href", "ref_id", "title", "ref_type")
+AUTOFILLED_COLLECTION_NAME_PREFIX = "collection-autofill-"
+
+
+def digest_values(obj, fields):
+    """Encode the fields of a part of an advisory for its digest."""
+    return encode_values(getattr(obj, field, None) for field in fields)
+
+
+def encode_values(values):
+    """Encode values, each prefixed with its length."""
+    encoded = []
+    for value in values:
+        if value is None:
+            value = ""
+        elif isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, dict):
+            value = json.dumps(value, sort_keys=True)
+        value = str(value)
+        encoded.append("{}:{}".format(len(value), value))
+    return "\x1f".join(encoded).encode("utf-8")
+
+
+def update_record_digest(advisory):
+    """Find the version 2 hex digest of a saved advisory."""
+    encoded_collections = []
+    for collection in advisory.collections.all():
+        values = [getattr(collection, field) for field in UPDATE_COLLECTION_DIGEST_FIELDS]
+        if (collection.name or "").startswith(AUTOFILLED_COLLECTION_NAME_PREFIX):
+            # the name is random, it was made up for a collection which had none
+            values[0] = None
+        encoded_packages = sorted(
+            digest_values(package, UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS)
+            for package in collection.packages.all()
+        )
+        encoded_collections.append(b"\x1e".join([encode_values(values), *encoded_packages]))
+
+    digest = hashlib.sha256(UPDATE_RECORD_DIGEST_VERSION)
+    digest.update(b"\x1d" + digest_values(advisory, UPDATE_RECORD_DIGEST_FIELDS))
+    for encoded_collection in sorted(encoded_collections):
+        digest.update(b"\x1c" + encoded_collection)
+    for encoded_reference in sorted(
+        digest_values(reference, UPDATE_REFERENCE_DIGEST_FIELDS)
+        for reference in advisory.references.all()
+    ):
+        digest.update(b"\x1d" + encoded_reference)
+    return digest.hexdigest()
+
+
+def recompute_advisory_digests(apps, schema_editor):
+    """Recompute the digests of the advisories from their fields."""
+
+    UpdateRecord = apps.get_model("rpm", "UpdateRecord")
+    advisories = UpdateRecord.objects.prefetch_related(
+        "collections__packages", "references"
+    ).order_by("pulp_created")
+
+    # Advisories which only differed by the order of their collections, packages or references
+    # now have the same digest, the duplicates keep their old one.
+    seen_digests = set()
+    advisories_to_update = []
+    for advisory in advisories.iterator(chunk_size=BATCH_SIZE):
+        digest = update_record_digest(advisory)
+        if (advisory._pulp_domain_id, digest) in seen_digests:
+            continue
+        seen_digests.add((advisory._pulp_domain_id, digest))
+        advisory.digest = digest
+        advisories_to_update.append(advisory)
+        if len(advisories_to_update) >= BATCH_SIZE:
+            UpdateRecord.objects.bulk_update(advisories_to_update, fields=["digest"])
+            advisories_to_update = []
+    UpdateRecord.objects.bulk_update(advisories_to_update, fields=["digest"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rpm", "0063_rpmrepository_retention_details"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=recompute_advisory_digests,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
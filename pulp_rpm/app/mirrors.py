@@ -0,0 +1,141 @@
+"""
+Parsing mirrorlists and metalinks, the lists of the mirrors of a repository.
+
+A mirrorlist lists the base URLs of the mirrors, one per line. A metalink is an XML document
+listing the URLs of the repomd.xml of the mirrors, along with the checksums of the current and the
+recent versions of the repomd.xml, which are used to reject outdated or broken mirrors.
+"""
+
+import hashlib
+import re
+from collections import namedtuple
+from gettext import gettext as _
+
+from lxml import etree
+
+MIRRORLIST_URL_PATTERN = re.compile(r"(^|^[\w\s=]+\s)((http(s)?)://.*)")
+METALINK_REPOMD_PATH = "repodata/repomd.xml"
+
+Metalink = namedtuple("Metalink", ["urls", "hashes"])
+
+
+def is_metalink(data):
+    """
+    Whether a list of mirrors is a metalink.
+
+    Args:
+        data (bytes): The content of the list.
+    """
+    return b"<metalink" in data[:4096]
+
+
+def parse_mirrorlist(data):
+    """
+    Parse a mirrorlist.
+
+    URLs which are commented out or have any punctuations in front of them are ignored.
+
+    Args:
+        data (bytes): The content of the mirrorlist.
+
+    Returns:
+        list: The base URLs of the mirrors, in order, without duplicates.
+    """
+    urls = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        match = re.match(MIRRORLIST_URL_PATTERN, line)
+        if match and match.group(2) not in urls:
+            urls.append(match.group(2))
+    return urls
+
+
+def parse_metalink(data):
+    """
+    Parse the repomd.xml entry of a metalink.
+
+    Args:
+        data (bytes): The content of the metalink.
+
+    Returns:
+        Metalink: The base URLs of the mirrors, most preferred first, and a list of the acceptable
+            versions of the repomd.xml, each a dict of its checksums by checksum type.
+
+    Raises:
+        ValueError: If the metalink is invalid or has no repomd.xml entry.
+    """
+    parser = etree.XMLParser(resolve_entities=False, no_network=True)
+    try:
+        root = etree.fromstring(data, parser)
+    except etree.XMLSyntaxError as exc:
+        raise ValueError(_("Invalid metalink: {}").format(exc))
+
+    for file_element in root.iter("{*}file"):
+        if file_element.get("name") == "repomd.xml":
+            break
+    else:
+        raise ValueError(_("The metalink has no entry for repomd.xml."))
+
+    hashes = []
+    for version in [file_element, *file_element.iter("{*}alternate")]:
+        verification = version.find("{*}verification")
+        if verification is None:
+            continue
+        digests = {
+            hash_element.get("type"): hash_element.text.strip()
+            for hash_element in verification.iter("{*}hash")
+            if hash_element.text
+        }
+        if digests:
+            hashes.append(digests)
+
+    preferred_urls = []
+    for url_element in file_element.iter("{*}url"):
+        url = (url_element.text or "").strip()
+        if not url.startswith(("http://", "https://")) or not url.endswith(METALINK_REPOMD_PATH):
+            continue
+        base_url = url[: -len(METALINK_REPOMD_PATH)]
+        try:
+            preference = int(url_element.get("preference", 0))
+        except ValueError:
+            preference = 0
+        preferred_urls.append((-preference, len(preferred_urls), base_url))
+
+    urls = []
+    for _preference, _position, url in sorted(preferred_urls):
+        if url not in urls:
+            urls.append(url)
+    return Metalink(urls, hashes)
+
+
+def verify_metalink_hashes(path, hashes):
+    """
+    Whether a repomd.xml matches one of the versions listed by a metalink.
+
+    Only the checksum types supported by hashlib are compared.
+
+    Args:
+        path (str): The path of the repomd.xml.
+        hashes (list): The acceptable versions of the repomd.xml, as returned by parse_metalink().
+    """
+    checksum_types = {
+        checksum_type
+        for digests in hashes
+        for checksum_type in digests
+        if checksum_type in hashlib.algorithms_available
+    }
+    hashers = {checksum_type: hashlib.new(checksum_type) for checksum_type in checksum_types}
+    with open(path, "rb") as repomd_file:
+        for chunk in iter(lambda: repomd_file.read(1024 * 1024), b""):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    computed = {checksum_type: hasher.hexdigest() for checksum_type, hasher in hashers.items()}
+
+    for digests in hashes:
+        compared = [
+            (checksum_type, digest)
+            for checksum_type, digest in digests.items()
+            if checksum_type in computed
+        ]
+        if compared and all(computed[t] == digest.lower() for t, digest in compared):
+            return True
+    return False
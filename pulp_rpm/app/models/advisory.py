@@ -199,12 +199,10 @@ class UpdateRecord(Content):
             pkglist(list): list of tuples with NEVRA info
 
         """
-        pkglist = []
-        for collection in self.collections.all():
-            for pkg in collection.packages.all().order_by("sum"):
-                nevra = (pkg.name, pkg.epoch, pkg.version, pkg.release, pkg.arch)
-                pkglist.append(nevra)
-        return pkglist
+        packages = UpdateCollectionPackage.objects.filter(
+            update_collection__update_record=self
+        ).order_by("update_collection", "sum")
+        return list(packages.values_list("name", "epoch", "version", "release", "arch"))
 
     def get_module_list(self):
         """
@@ -4,7 +4,7 @@ from django.db import models
 
 from pulpcore.plugin.models import Content
 from pulpcore.plugin.util import get_domain_pk
-from pulp_rpm.app.constants import CHECKSUM_CHOICES
+from pulp_rpm.app.constants import CHECKSUM_CHOICES, PACKAGE_ZCK_REPODATA
 
 log = getLogger(__name__)
 
@@ -45,3 +45,12 @@ class RepoMetadataFile(Content):
         Metadata files that are known to contain deltarpm's are unsupported!
         """
         return self.data_type in self.UNSUPPORTED_METADATA
+
+    @property
+    def zchunk_metadata_type(self):
+        """
+        Zchunk package metadata is only kept to download the next version of it incrementally.
+
+        It is not published, because the published package metadata is generated by Pulp.
+        """
+        return self.data_type in PACKAGE_ZCK_REPODATA
@@ -7,7 +7,7 @@ from django.db import models
 from django.db.models import Window, F
 from django.db.models.functions import RowNumber
 
-from pulpcore.plugin.models import Content, ContentManager
+from pulpcore.plugin.models import BaseModel, Content, ContentManager
 from pulpcore.plugin.util import get_domain_pk
 
 from pulp_rpm.app.constants import (
@@ -456,3 +456,41 @@ class Package(Content):
         package.url = getattr(self, PULP_PACKAGE_ATTRS.URL)
         package.version = getattr(self, PULP_PACKAGE_ATTRS.VERSION)
         return package
+
+
+class PackageMetadataCache(BaseModel):
+    """
+    Pre-serialized repository metadata of a Package, as published with a given checksum type.
+
+    The snippets are exactly what createrepo_c produces for the package in primary.xml,
+    filelists.xml and other.xml, so they can be written to new metadata files as they are.
+    Snippets stored before the package was last updated are stale and are not used.
+
+    Fields:
+
+        checksum_type (Text):
+            The checksum type the package is published with
+        pkgId (Text):
+            The checksum of the package the snippets were generated with
+        primary (Text):
+            The <package> element of primary.xml
+        filelists (Text):
+            The <package> element of filelists.xml
+        other (Text):
+            The <package> element of other.xml
+
+    Relations:
+
+        package (models.ForeignKey): The cached Package
+    """
+
+    checksum_type = models.TextField(choices=CHECKSUM_CHOICES)
+    pkgId = models.TextField()
+    primary = models.TextField()
+    filelists = models.TextField()
+    other = models.TextField()
+
+    package = models.ForeignKey(Package, related_name="metadata_cache", on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("package", "checksum_type")
@@ -46,7 +46,7 @@ from pulp_rpm.app.models import (
     UpdateRecord,
 )
 
-from pulp_rpm.app.downloaders import RpmDownloader, RpmFileDownloader, UlnDownloader
+from pulp_rpm.app.downloaders import RpmDownloader, RpmFileDownloader, UlnDownloader, UlnSession
 from pulp_rpm.app.exceptions import DistributionTreeConflict
 from pulp_rpm.app.shared_utils import urlpath_sanitize
 
@@ -148,6 +148,27 @@ class UlnRemote(Remote, AutoAddObjPermsMixin):
             self._download_factory._handler_map["uln"] = self._download_factory._http_or_https
             return self._download_factory
 
+    @property
+    def uln_session(self):
+        """
+        Return the ULN session shared by all the downloaders of this remote.
+
+        Upon first access, the UlnSession is instantiated and saved internally, like the
+        download factory, so that the session key is only requested once.
+
+        Returns:
+            UlnSession: The session of this remote.
+        """
+        try:
+            return self._uln_session
+        except AttributeError:
+            self._uln_session = UlnSession(
+                self.uln_server_base_url or settings.DEFAULT_ULN_SERVER_BASE_URL,
+                self.username,
+                self.password,
+            )
+            return self._uln_session
+
     def get_downloader(self, remote_artifact=None, url=None, **kwargs):
         """
         Get a downloader from either a RemoteArtifact or URL that is configured with this Remote.
@@ -179,6 +200,7 @@ class UlnRemote(Remote, AutoAddObjPermsMixin):
             username=self.username,
             password=self.password,
             uln_server_base_url=uln_server_base_url,
+            uln_session=self.uln_session,
             **kwargs,
         )
 
@@ -197,6 +219,8 @@ class RpmRepository(Repository, AutoAddObjPermsMixin):
         original_checksum_types (JSON): Checksum for each metadata type
         last_sync_details (JSON): Details about the last sync including repomd, settings used, etc.
         retain_package_versions (Integer): Max number of latest versions of each package to keep.
+        retention_details (JSON): The latest version the retention policy was applied to, and the
+            "retain_package_versions" it was applied with.
         autopublish (Boolean): Whether to automatically create a publication for new versions.
         metadata_checksum_type (String):
             The name of a checksum type to use for metadata when generating metadata.
@@ -229,6 +253,7 @@ class RpmRepository(Repository, AutoAddObjPermsMixin):
     original_checksum_types = models.JSONField(default=dict)
     last_sync_details = models.JSONField(default=dict)
     retain_package_versions = models.PositiveIntegerField(default=0)
+    retention_details = models.JSONField(default=dict)
 
     autopublish = models.BooleanField(default=False)
     checksum_type = models.TextField(null=True, choices=CHECKSUM_CHOICES)
@@ -246,6 +271,14 @@ class RpmRepository(Repository, AutoAddObjPermsMixin):
         """
         super().on_new_version(version)
 
+        if self.retain_package_versions > 0:
+            # remember which version the retention policy was applied to last
+            self.retention_details = {
+                "version": version.number,
+                "retain_package_versions": self.retain_package_versions,
+            }
+            self.save(update_fields=["retention_details"])
+
         # avoid circular import issues
         from pulp_rpm.app import tasks
 
@@ -435,29 +468,39 @@ class RpmRepository(Repository, AutoAddObjPermsMixin):
         ), "Cannot apply retention policy to completed repository versions"
 
         if self.retain_package_versions > 0:
-            # It would be more ideal if, instead of annotating with an age and filtering manually,
-            # we could use Django to filter the particular Package content we want to delete.
-            # Something like ".filter(F('age') > self.retain_package_versions)" would be better
-            # however this is not currently possible with Django. It would be possible with raw
-            # SQL but the repository version content membership subquery is currently
-            # django-managed and would be difficult to share.
-            #
-            # Instead we have to do the filtering manually.
-            nonmodular_packages = (
-                Package.objects.with_age()
-                .filter(
-                    pk__in=new_version.content.filter(pulp_type=Package.get_pulp_type()),
-                    is_modular=False,  # don't want to filter out modular RPMs
-                )
-                .only("pk")
+            package_pulp_type = Package.get_pulp_type()
+            nonmodular_packages = Package.objects.with_age().filter(
+                pk__in=new_version.content.filter(pulp_type=package_pulp_type),
+                is_modular=False,  # don't want to filter out modular RPMs
             )
 
-            old_packages = []
-            for package in nonmodular_packages:
-                if package.age > self.retain_package_versions:
-                    old_packages.append(package.pk)
+            # If the version this one is based on is known to comply with the policy, or with a
+            # stricter one, only the packages with the same names as the added ones can be old.
+            # Without an explicit base version, the version is based on the previous one.
+            base_version = new_version.base_version
+            if not base_version:
+                try:
+                    base_version = new_version.previous()
+                except RepositoryVersion.DoesNotExist:
+                    base_version = None
+            applied_retention = self.retention_details.get("retain_package_versions", 0)
+            if (
+                base_version
+                and self.retention_details.get("version") == base_version.number
+                and 0 < applied_retention <= self.retain_package_versions
+            ):
+                added = new_version.added(base_version=new_version.base_version)
+                added_packages = Package.objects.filter(
+                    pk__in=added.filter(pulp_type=package_pulp_type)
+                )
+                nonmodular_packages = nonmodular_packages.filter(
+                    name__in=added_packages.values("name")
+                )
 
-            new_version.remove_content(Content.objects.filter(pk__in=old_packages))
+            # Filtering on the window function wraps the query into a subquery, so that the old
+            # packages are selected by the database.
+            old_packages = nonmodular_packages.filter(age__gt=self.retain_package_versions)
+            new_version.remove_content(Content.objects.filter(pk__in=old_packages.values("pk")))
 
     def _resolve_distribution_trees(self, new_version, previous_version):
         """
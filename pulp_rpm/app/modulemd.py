@@ -26,40 +26,41 @@ def resolve_module_packages(version, previous_version):
     """
     Decide which packages to add/remove based on modular data.
 
+    The packages of the modules which were removed from the repository are removed as well, unless
+    a module which is still in the repository contains them. The added modules are among the
+    current ones, so none of their packages are missing from the current modules' packages.
+
+    The packages are resolved in the database, on the pks of the Modulemd.packages through-table.
+
     Args:
         version (pulpcore.app.models.RepositoryVersion): current incomplete repository version
         previous_version (pulpcore.app.models.RepositoryVersion) :  previous version of the same
                                                                     repository to compare to
 
     """
-
-    def modules_packages(modules):
-        packages = set()
-        for module in modules:
-            packages.update(module.packages.all())
-        return packages
+    if not previous_version:
+        return
 
     modulemd_pulp_type = Modulemd.get_pulp_type()
-    current_modules = Modulemd.objects.filter(
-        pk__in=version.content.filter(pulp_type=modulemd_pulp_type)
+    module_packages = Modulemd.packages.through.objects
+    current_modules = version.content.filter(pulp_type=modulemd_pulp_type).values("pk")
+    removed_modules = (
+        previous_version.content.filter(pulp_type=modulemd_pulp_type)
+        .exclude(pk__in=current_modules)
+        .values("pk")
+    )
+    if not removed_modules.exists():
+        return
+
+    current_module_packages = module_packages.filter(modulemd_id__in=current_modules).values(
+        "package_id"
+    )
+    packages_to_remove = (
+        module_packages.filter(modulemd_id__in=removed_modules)
+        .exclude(package_id__in=current_module_packages)
+        .values("package_id")
     )
-    current_module_packages = modules_packages(current_modules)
-
-    if previous_version:
-        previous_modules = Modulemd.objects.filter(
-            pk__in=previous_version.content.filter(pulp_type=modulemd_pulp_type)
-        )
-        added_modules = current_modules.difference(previous_modules)
-        removed_modules = previous_modules.difference(current_modules)
-        removed_module_packages = modules_packages(removed_modules)
-        packages_to_remove = removed_module_packages.difference(current_module_packages)
-        version.remove_content(Package.objects.filter(pk__in=packages_to_remove))
-    else:
-        added_modules = current_modules
-
-    added_module_packages = modules_packages(added_modules)
-    packages_to_add = added_module_packages.difference(current_module_packages)
-    version.add_content(Package.objects.filter(pk__in=packages_to_add))
+    version.remove_content(Package.objects.filter(pk__in=packages_to_remove))
 
 
 def split_modulemd_file(file: str):
@@ -26,7 +26,7 @@ from .modulemd import (  # noqa
     ModulemdDefaultsSerializer,
     ModulemdObsoleteSerializer,
 )
-from .package import PackageSerializer, MinimalPackageSerializer  # noqa
+from .package import PackageSerializer, MinimalPackageSerializer, PackageUploadSerializer  # noqa
 from .repository import (  # noqa
     CopySerializer,
     RpmDistributionSerializer,
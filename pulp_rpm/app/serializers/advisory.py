@@ -1,3 +1,4 @@
+from collections import defaultdict
 import copy
 from gettext import gettext as _
 import json
@@ -11,7 +12,7 @@ from pulpcore.plugin.serializers import (
     NoArtifactContentUploadSerializer,
 )
 
-from pulp_rpm.app.advisory import hash_update_record
+from pulp_rpm.app.advisory import update_record_digest
 from pulp_rpm.app.fields import (
     UpdateCollectionPackagesField,
     UpdateReferenceField,
@@ -123,8 +124,10 @@ class UpdateRecordSerializer(NoArtifactContentUploadSerializer):
         # detach any specified repository; attach once the advisory exists
         repository = validated_data.pop("repository", None)
 
+        update_collections_to_save = list()
         update_collection_packages_to_save = list()
         update_references_to_save = list()
+        collection_packages = defaultdict(list)
         with transaction.atomic():
             try:
                 # This persists an advisory with an empty digest
@@ -140,7 +143,7 @@ class UpdateRecordSerializer(NoArtifactContentUploadSerializer):
                 new_coll[PULP_UPDATE_COLLECTION_ATTRS.SHORTNAME] = new_coll.pop("short", "")
                 coll = UpdateCollection(**new_coll)
                 coll.update_record = update_record
-                coll.save()
+                update_collections_to_save.append(coll)
                 for package in packages:
                     pkg = UpdateCollectionPackage(**package)
                     try:
@@ -149,6 +152,7 @@ class UpdateRecordSerializer(NoArtifactContentUploadSerializer):
                         raise TypeError(f'"{pkg.sum_type}" is not supported.')
                     pkg.update_collection = coll
                     update_collection_packages_to_save.append(pkg)
+                    collection_packages[coll.pk].append(pkg)
             for reference in references:
                 new_ref = dict()
                 new_ref[PULP_UPDATE_REFERENCE_ATTRS.HREF] = reference.get(
@@ -167,13 +171,23 @@ class UpdateRecordSerializer(NoArtifactContentUploadSerializer):
                 ref.update_record = update_record
                 update_references_to_save.append(ref)
 
+            # the primary keys are generated on initialization, so the packages can be created
+            # along with their collections
+            if update_collections_to_save:
+                UpdateCollection.objects.bulk_create(update_collections_to_save)
             if update_collection_packages_to_save:
                 UpdateCollectionPackage.objects.bulk_create(update_collection_packages_to_save)
             if update_references_to_save:
                 UpdateReference.objects.bulk_create(update_references_to_save)
 
-            cr_update_record = update_record.to_createrepo_c()
-            update_record.digest = hash_update_record(cr_update_record)
+            update_record.digest = update_record_digest(
+                update_record,
+                [
+                    (collection, collection_packages[collection.pk])
+                    for collection in update_collections_to_save
+                ],
+                update_references_to_save,
+            )
 
             # The advisory now has a digest - *if* this works
             update_record.save()
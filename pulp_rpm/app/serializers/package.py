@@ -6,8 +6,10 @@ from gettext import gettext as _
 from rest_framework import serializers
 from rest_framework.exceptions import NotAcceptable
 
+from pulpcore.plugin.models import Repository
 from pulpcore.plugin.serializers import (
     ContentChecksumSerializer,
+    DetailRelatedField,
     SingleArtifactContentUploadSerializer,
 )
 from pulpcore.plugin.util import get_domain_pk
@@ -339,3 +341,40 @@ class MinimalPackageSerializer(PackageSerializer):
             "checksum_type",
         )
         model = Package
+
+
+class PackageUploadSerializer(serializers.Serializer):
+    """
+    A serializer for uploading many RPMs at once.
+    """
+
+    files = serializers.ListField(
+        child=serializers.FileField(),
+        help_text=_("RPM files to create packages from."),
+        required=False,
+        write_only=True,
+    )
+    archive = serializers.FileField(
+        help_text=_(
+            "A tar archive, which may be compressed, of RPM files to create packages from."
+        ),
+        required=False,
+        write_only=True,
+    )
+    repository = DetailRelatedField(
+        help_text=_("URI of an RPM repository the packages should be added to."),
+        required=False,
+        write_only=True,
+        view_name_pattern=r"repositories(-.*/.*)-detail",
+        queryset=Repository.objects.all(),
+    )
+
+    def validate(self, data):
+        """Validate that there is something to upload."""
+        data = super().validate(data)
+        if not data.get("files") and not data.get("archive"):
+            raise serializers.ValidationError(_("Either 'files' or 'archive' must be specified."))
+        return data
+
+    class Meta:
+        fields = ("files", "archive", "repository")
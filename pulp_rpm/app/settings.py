@@ -16,3 +16,11 @@ KEEP_CHANGELOG_LIMIT = 10
 SOLVER_DEBUG_LOGS = True
 RPM_METADATA_USE_REPO_PACKAGE_TIME = False
 NOCACHE_LIST = ["repomd.xml", "repomd.xml.asc", "repomd.xml.key"]
+RPM_INCREMENTAL_PUBLISH = True
+RPM_METADATA_GENERATION_WORKERS = 4
+RPM_CACHE_PACKAGE_METADATA = True
+SOLVER_CACHE_DIR = None
+SOLVER_CACHE_MAX_SIZE = 1024**3
+RPM_SUBREPO_SYNC_CONCURRENCY = 4
+RPM_SYNC_DOWNLOAD_MIRRORS = 3
+RPM_UPLOAD_PARSING_PROCESSES = 4
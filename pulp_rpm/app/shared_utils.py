@@ -1,6 +1,7 @@
 import createrepo_c as cr
+import struct
 import tempfile
-import shutil
+from gettext import gettext as _
 from hashlib import sha256
 
 from django.conf import settings
@@ -31,30 +32,99 @@ def format_nevra_short(name=None, epoch=0, version=None, release=None, arch=None
     return format_nvra(name, version, release, arch)
 
 
-def read_crpackage_from_artifact(artifact):
+# The size of the lead of an RPM, and the magic and the size of the preamble of the signature and
+# the header which follow it. A header is never larger than the limit of rpm itself.
+RPM_LEAD_SIZE = 96
+RPM_HEADER_MAGIC = b"\x8e\xad\xe8"
+RPM_HEADER_PREAMBLE_SIZE = 16
+RPM_HEADER_MAX_SIZE = 256 * 1024 * 1024
+
+
+def read_rpm_header(rpm_file):
     """
-    Helper function for creating package.
+    Read the lead, the signature and the header of an RPM, without its payload.
 
-    Copy file to a temp directory and parse it.
+    Args:
+        rpm_file: A file object of the RPM, positioned at its beginning.
 
-    Returns: package model as dict
+    Returns:
+        bytes: Everything in the RPM up to the end of the header.
+
+    Raises:
+        OSError: If the file is not an RPM.
+    """
+    data = bytearray()
+
+    def read_exactly(size):
+        chunk = rpm_file.read(size)
+        if len(chunk) != size:
+            raise OSError(_("The RPM file is truncated."))
+        data.extend(chunk)
+        return chunk
+
+    def read_header_structure():
+        preamble = read_exactly(RPM_HEADER_PREAMBLE_SIZE)
+        if preamble[:3] != RPM_HEADER_MAGIC:
+            raise OSError(_("The file is not an RPM."))
+        index_count, data_size = struct.unpack(">II", preamble[8:])
+        size = 16 * index_count + data_size
+        if size > RPM_HEADER_MAX_SIZE:
+            raise OSError(_("The header of the RPM is too large."))
+        read_exactly(size)
+
+    read_exactly(RPM_LEAD_SIZE)
+    read_header_structure()  # the signature
+    # the header is aligned to 8 bytes after the signature
+    read_exactly(-len(data) % 8)
+    read_header_structure()
+    return bytes(data)
+
+
+def read_crpackage_from_file(rpm_file, sha256, size):
+    """
+    Parse the header of an RPM.
+
+    Only the header of the RPM is copied to a temp file and parsed, the checksum and the size of
+    the package are the given ones.
 
     Args:
-        artifact: inited and validated artifact to save
+        rpm_file: A file object of the RPM, positioned at its beginning.
+        sha256 (str): The sha256 checksum of the RPM.
+        size (int): The size of the RPM.
+
+    Returns:
+        createrepo_c.Package: The parsed package.
     """
-    filename = f"{artifact.pulp_id}.rpm"
-    artifact_file = artifact.pulp_domain.get_storage().open(artifact.file.name)
-    with tempfile.NamedTemporaryFile("wb", dir=".", suffix=filename) as temp_file:
-        shutil.copyfileobj(artifact_file, temp_file)
+    rpm_header = read_rpm_header(rpm_file)
+    with tempfile.NamedTemporaryFile("wb", dir=".", suffix=".rpm") as temp_file:
+        temp_file.write(rpm_header)
         temp_file.flush()
         cr_pkginfo = cr.package_from_rpm(
             temp_file.name, changelog_limit=settings.KEEP_CHANGELOG_LIMIT
         )
 
-    artifact_file.close()
+    cr_pkginfo.pkgId = sha256
+    cr_pkginfo.checksum_type = "sha256"
+    cr_pkginfo.size_package = size
     return cr_pkginfo
 
 
+def read_crpackage_from_artifact(artifact):
+    """
+    Helper function for creating package.
+
+    Only the header of the RPM is read from the storage, the checksum and the size of the package
+    are those of the artifact.
+
+    Returns: package model as dict
+
+    Args:
+        artifact: inited and validated artifact to save
+    """
+    with artifact.pulp_domain.get_storage().open(artifact.file.name) as artifact_file:
+        return read_crpackage_from_file(artifact_file, artifact.sha256, artifact.size)
+
+
 def urlpath_sanitize(*args):
     """
     Join an arbitrary number of strings into a /-separated path.
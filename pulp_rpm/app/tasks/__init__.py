@@ -2,3 +2,4 @@ from .publishing import publish  # noqa
 from .synchronizing import synchronize  # noqa
 from .copy import copy_content  # noqa
 from .comps import upload_comps  # noqa
+from .package import upload_packages  # noqa
@@ -2,9 +2,10 @@ import createrepo_c as cr
 import libcomps
 import logging
 import os
+import shutil
 import tempfile
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 
 from pulpcore.plugin.models import PulpTemporaryFile, CreatedResource
 from pulpcore.plugin.models import Content
@@ -23,6 +24,42 @@ from pulp_rpm.app.models import (
 log = logging.getLogger(__name__)
 
 
+def get_or_create_comps_content(model, comps_dicts, domain):
+    """
+    Find the existing comps-related content of one type, and create the missing ones.
+
+    Args:
+        model: The content model.
+        comps_dicts (list): The fields of the content, including their digests.
+        domain: The domain of the content.
+
+    Returns:
+        tuple: The created content, and all the content.
+    """
+    comps_dicts_by_digest = {comps_dict["digest"]: comps_dict for comps_dict in comps_dicts}
+    content_by_digest = {
+        content.digest: content
+        for content in model.objects.filter(
+            digest__in=comps_dicts_by_digest.keys(), _pulp_domain=domain
+        )
+    }
+
+    created = []
+    # Create the content in digest order, which prevents deadlocks with concurrent uploads
+    for digest in sorted(comps_dicts_by_digest.keys() - content_by_digest.keys()):
+        content = model(**comps_dicts_by_digest[digest], _pulp_domain=domain)
+        try:
+            with transaction.atomic():
+                content.save()
+        except IntegrityError:
+            content = model.objects.get(digest=digest, _pulp_domain=domain)
+        else:
+            created.append(content)
+        content_by_digest[digest] = content
+
+    return created, [content_by_digest[digest] for digest in comps_dicts_by_digest]
+
+
 def parse_comps_components(comps_file):
     """Parse comps-related components found in the specified file."""
     # created = {"categories": [], "environments": [], "groups": [], "langpack": None}
@@ -30,60 +67,49 @@ def parse_comps_components(comps_file):
     all_objects = []
     comps = libcomps.Comps()
     curr_domain = get_domain()
-    # Read the file and pass the string along because comps.fromxml_f() will only take a
-    # path-string that doesn't work on things like S3 storage
-    with comps_file.file.open("rb") as comps_uploaded:
-        with tempfile.NamedTemporaryFile(dir=".", delete=False) as comps_on_disk:
-            comps_on_disk.write(comps_uploaded.read())
-            comps_on_disk.flush()
-        with tempfile.TemporaryDirectory(dir=".") as tf:
-            decompressed_path = os.path.join(tf, "comps.xml")
-            cr.decompress_file(comps_on_disk.name, decompressed_path, cr.AUTO_DETECT_COMPRESSION)
-            with open(decompressed_path) as f:
-                comps.fromxml_str(f.read())
-
+    # Copy the file to disk because comps.fromxml_f() will only take a path-string that doesn't
+    # work on things like S3 storage
+    with tempfile.TemporaryDirectory(dir=".") as tf:
+        compressed_path = os.path.join(tf, "comps")
+        with comps_file.file.open("rb") as comps_uploaded:
+            with open(compressed_path, "wb") as comps_on_disk:
+                shutil.copyfileobj(comps_uploaded, comps_on_disk)
+        decompressed_path = os.path.join(tf, "comps.xml")
+        cr.decompress_file(compressed_path, decompressed_path, cr.AUTO_DETECT_COMPRESSION)
+        comps.fromxml_f(decompressed_path)
+
+    comps_dicts = []
     if comps.langpacks:
         langpack_dict = PackageLangpacks.libcomps_to_dict(comps.langpacks)
-        langpack, created = PackageLangpacks.objects.get_or_create(
-            matches=strdict_to_dict(comps.langpacks),
-            digest=dict_digest(langpack_dict),
-            _pulp_domain=curr_domain,
-        )
-        if created:
-            created_objects.append(langpack)
-        all_objects.append(langpack)
-
-    if comps.categories:
-        for category in comps.categories:
-            category_dict = PackageCategory.libcomps_to_dict(category)
-            category_dict["digest"] = dict_digest(category_dict)
-            category_dict["_pulp_domain"] = curr_domain
-            packagecategory, created = PackageCategory.objects.get_or_create(**category_dict)
-            if created:
-                created_objects.append(packagecategory)
-            all_objects.append(packagecategory)
-
-    if comps.environments:
-        for environment in comps.environments:
-            environment_dict = PackageEnvironment.libcomps_to_dict(environment)
-            environment_dict["digest"] = dict_digest(environment_dict)
-            environment_dict["_pulp_domain"] = curr_domain
-            packageenvironment, created = PackageEnvironment.objects.get_or_create(
-                **environment_dict
+        comps_dicts.append(
+            (
+                PackageLangpacks,
+                [
+                    {
+                        "matches": strdict_to_dict(comps.langpacks),
+                        "digest": dict_digest(langpack_dict),
+                    }
+                ],
             )
-            if created:
-                created_objects.append(packageenvironment)
-            all_objects.append(packageenvironment)
-
-    if comps.groups:
-        for group in comps.groups:
-            group_dict = PackageGroup.libcomps_to_dict(group)
-            group_dict["digest"] = dict_digest(group_dict)
-            group_dict["_pulp_domain"] = curr_domain
-            packagegroup, created = PackageGroup.objects.get_or_create(**group_dict)
-            if created:
-                created_objects.append(packagegroup)
-            all_objects.append(packagegroup)
+        )
+
+    for model, comps_objects in (
+        (PackageCategory, comps.categories),
+        (PackageEnvironment, comps.environments),
+        (PackageGroup, comps.groups),
+    ):
+        model_dicts = []
+        for comps_object in comps_objects:
+            comps_dict = model.libcomps_to_dict(comps_object)
+            comps_dict["digest"] = dict_digest(comps_dict)
+            model_dicts.append(comps_dict)
+        comps_dicts.append((model, model_dicts))
+
+    for model, model_dicts in comps_dicts:
+        if model_dicts:
+            created, all_content = get_or_create_comps_content(model, model_dicts, curr_domain)
+            created_objects.extend(created)
+            all_objects.extend(all_content)
 
     return created_objects, all_objects
 
@@ -1,11 +1,13 @@
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 
 from pulpcore.plugin.models import Content, RepositoryVersion
 from pulpcore.plugin.util import get_domain_pk
 
 from pulp_rpm.app.depsolving import Solver
 from pulp_rpm.app.models import (
+    UpdateCollection,
+    UpdateCollectionPackage,
     UpdateRecord,
     Package,
     PackageCategory,
@@ -37,7 +39,6 @@ def find_children_of_content(content, src_repo_version):
     package_ids = src_repo_version.content.filter(pulp_type=Package.get_pulp_type()).only("pk")
     module_ids = src_repo_version.content.filter(pulp_type=Modulemd.get_pulp_type()).only("pk")
 
-    advisories = UpdateRecord.objects.filter(pk__in=advisory_ids)
     packages = Package.objects.filter(pk__in=package_ids)
     packagecategories = PackageCategory.objects.filter(pk__in=packagecategory_ids)
     packageenvironments = PackageEnvironment.objects.filter(pk__in=packageenvironment_ids)
@@ -46,35 +47,40 @@ def find_children_of_content(content, src_repo_version):
 
     children = set()
 
-    for advisory in advisories.iterator():
-        # Find rpms referenced by Advisories/Errata
-        package_nevras = advisory.get_pkglist()
-        advisory_package_q = Q(pk__in=[])
-        for nevra in package_nevras:
-            (name, epoch, version, release, arch) = nevra
-            advisory_package_q |= Q(
-                name=name,
-                epoch=epoch,
-                version=version,
-                release=release,
-                arch=arch,
-                pulp_domain=get_domain_pk(),
-            )
-        children.update(packages.filter(advisory_package_q).values_list("pk", flat=True))
-
-        module_nsvcas = advisory.get_module_list()
-        advisory_module_q = Q(pk__in=[])
-        for nsvca in module_nsvcas:
-            (name, stream, version, context, arch) = nsvca
-            advisory_module_q |= Q(
-                name=name,
-                stream=stream,
-                version=version,
-                context=context,
-                arch=arch,
-                pulp_domain=get_domain_pk(),
-            )
-        children.update(modules.filter(advisory_module_q).values_list("pk", flat=True))
+    # Find rpms referenced by Advisories/Errata. The NEVRAs of all the selected advisories are
+    # joined against the source packages by the database in a single query.
+    advisory_packages = UpdateCollectionPackage.objects.filter(
+        update_collection__update_record__in=advisory_ids,
+        name=OuterRef("name"),
+        epoch=OuterRef("epoch"),
+        version=OuterRef("version"),
+        release=OuterRef("release"),
+        arch=OuterRef("arch"),
+    )
+    children.update(
+        packages.filter(Exists(advisory_packages), pulp_domain=get_domain_pk()).values_list(
+            "pk", flat=True
+        )
+    )
+
+    # Find modules referenced by Advisories/Errata
+    module_nsvcas = set()
+    collection_modules = UpdateCollection.objects.filter(
+        update_record__in=advisory_ids, module__isnull=False
+    ).values_list("module", flat=True)
+    for module in collection_modules.iterator():
+        if not module:
+            continue
+        nsvca = (module["name"], module["stream"], module["version"], module["context"])
+        module_nsvcas.add(tuple(str(field) for field in nsvca) + (str(module["arch"]),))
+
+    if module_nsvcas:
+        advisory_modules = modules.filter(
+            name__in={nsvca[0] for nsvca in module_nsvcas}, pulp_domain=get_domain_pk()
+        ).values_list("pk", "name", "stream", "version", "context", "arch")
+        for pk, *nsvca in advisory_modules.iterator():
+            if tuple(nsvca) in module_nsvcas:
+                children.add(pk)
 
     # PackageCategories & PackageEnvironments resolution must go before PackageGroups
     packagegroup_names = set()
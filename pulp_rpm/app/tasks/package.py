@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from gettext import gettext as _
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from pulpcore.plugin.models import (
+    Artifact,
+    Content,
+    ContentArtifact,
+    CreatedResource,
+    PulpTemporaryFile,
+)
+from pulpcore.plugin.util import get_domain
+
+from pulp_rpm.app.models import Package, RpmRepository
+from pulp_rpm.app.shared_utils import format_nvra, read_crpackage_from_file
+
+
+def read_package_data(path, sha256, size):
+    """
+    Parse the header of an RPM into the fields of a Package.
+
+    This may run in the processes of the parsing pool, so it must not access the database.
+
+    Args:
+        path (str): The path of the RPM.
+        sha256 (str): The sha256 checksum of the RPM.
+        size (int): The size of the RPM.
+
+    Returns:
+        dict: The fields of the Package.
+
+    Raises:
+        ValueError: If the RPM cannot be parsed.
+    """
+    try:
+        with open(path, "rb") as rpm_file:
+            return Package.createrepo_to_dict(read_crpackage_from_file(rpm_file, sha256, size))
+    except OSError:
+        raise ValueError(_("The RPM with sha256 {} cannot be parsed for metadata.").format(sha256))
+
+
+def read_packages_data(artifacts):
+    """
+    Parse the headers of the uploaded RPMs, in parallel by up to RPM_UPLOAD_PARSING_PROCESSES.
+
+    Args:
+        artifacts (list): The unsaved artifacts of the RPMs.
+
+    Returns:
+        list: The fields of the Package of each artifact.
+
+    Raises:
+        ValueError: If an RPM cannot be parsed.
+    """
+    paths = [str(artifact.file) for artifact in artifacts]
+    checksums = [artifact.sha256 for artifact in artifacts]
+    sizes = [artifact.size for artifact in artifacts]
+
+    processes = min(settings.RPM_UPLOAD_PARSING_PROCESSES, len(artifacts), os.cpu_count() or 1)
+    if processes <= 1:
+        return list(map(read_package_data, paths, checksums, sizes))
+
+    # The parsing processes are forked so that they inherit the configured Django application
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        return list(executor.map(read_package_data, paths, checksums, sizes))
+
+
+def extract_rpms(archive_file, working_dir):
+    """
+    Extract the RPMs of a tar archive.
+
+    The RPMs are extracted under generated names, the paths of the archive members are never used
+    on disk.
+
+    Args:
+        archive_file: A file object of the tar archive, which may be compressed.
+        working_dir (str): The directory to extract the RPMs into.
+
+    Returns:
+        list: The paths of the extracted RPMs.
+    """
+    rpm_paths = []
+    with tarfile.open(fileobj=archive_file, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".rpm"):
+                continue
+            path = os.path.join(working_dir, "archive-{}.rpm".format(len(rpm_paths)))
+            with archive.extractfile(member) as member_file, open(path, "wb") as rpm_file:
+                shutil.copyfileobj(member_file, rpm_file)
+            rpm_paths.append(path)
+    return rpm_paths
+
+
+def save_artifacts(artifacts):
+    """
+    Save the artifacts of the uploaded RPMs, reusing the ones which already exist.
+
+    Args:
+        artifacts (list): Unsaved artifacts, with distinct sha256 checksums.
+
+    Returns:
+        dict: The saved artifacts by sha256.
+    """
+    existing_artifacts = Artifact.objects.filter(
+        sha256__in=[artifact.sha256 for artifact in artifacts], pulp_domain=get_domain()
+    )
+    existing_artifacts.touch()
+    saved_artifacts = {artifact.sha256: artifact for artifact in existing_artifacts}
+
+    new_artifacts = sorted(
+        (artifact for artifact in artifacts if artifact.sha256 not in saved_artifacts),
+        key=lambda artifact: artifact.sha256,
+    )
+    for artifact in Artifact.objects.bulk_get_or_create(new_artifacts):
+        saved_artifacts[artifact.sha256] = artifact
+    return saved_artifacts
+
+
+def save_packages(packages_data, artifacts):
+    """
+    Save the packages of the uploaded RPMs, reusing the ones which already exist.
+
+    Args:
+        packages_data (list): The fields of the packages.
+        artifacts (dict): The saved artifacts of the packages by sha256.
+
+    Returns:
+        list: The saved packages.
+    """
+    existing_packages = Package.objects.filter(
+        pkgId__in=[package_data["pkgId"] for package_data in packages_data],
+        pulp_domain=get_domain(),
+    )
+    existing_packages.touch()
+    packages = {package.pkgId: package for package in existing_packages}
+
+    # Packages which were synced on-demand get the uploaded artifact
+    pkg_ids = {package.pk: package.pkgId for package in packages.values()}
+    content_artifacts = list(
+        ContentArtifact.objects.filter(content__in=pkg_ids, artifact__isnull=True)
+    )
+    for content_artifact in content_artifacts:
+        content_artifact.artifact = artifacts[pkg_ids[content_artifact.content_id]]
+    ContentArtifact.objects.bulk_update(content_artifacts, ["artifact"])
+
+    new_packages = [
+        Package(**package_data)
+        for package_data in packages_data
+        if package_data["pkgId"] not in packages
+    ]
+    # Process the packages in natural key order, which prevents deadlocks with concurrent uploads
+    new_packages.sort(key=lambda package: "".join(map(str, package.natural_key())))
+    new_content_artifacts = []
+    for package in new_packages:
+        try:
+            with transaction.atomic():
+                package.save()
+        except IntegrityError:
+            package = Package.objects.get(package.q())
+        else:
+            new_content_artifacts.append(
+                ContentArtifact(
+                    artifact=artifacts[package.pkgId],
+                    content=package,
+                    relative_path=package.location_href,
+                )
+            )
+        packages[package.pkgId] = package
+
+    new_content_artifacts.sort(
+        key=lambda content_artifact: ContentArtifact.sort_key(content_artifact)
+    )
+    ContentArtifact.objects.bulk_get_or_create(new_content_artifacts)
+    return list(packages.values())
+
+
+def upload_packages(tmp_file_ids, archive_id=None, repo_id=None):
+    """
+    Create packages from many uploaded RPMs, and from a tar archive of RPMs, in a single task.
+
+    The headers of the RPMs are parsed in parallel, and all the packages are added to the
+    repository in a single repository version.
+
+    Args:
+        tmp_file_ids (list): The uploaded RPMs.
+        archive_id (str): An uploaded tar archive of RPMs.
+        repo_id (str): The repository to add the packages to.
+    """
+    with tempfile.TemporaryDirectory(dir=".") as working_dir:
+        rpm_paths = []
+        for temp_file in PulpTemporaryFile.objects.filter(pk__in=tmp_file_ids):
+            path = os.path.join(working_dir, "upload-{}.rpm".format(len(rpm_paths)))
+            with temp_file.file.open("rb") as uploaded_file, open(path, "wb") as rpm_file:
+                shutil.copyfileobj(uploaded_file, rpm_file)
+            rpm_paths.append(path)
+        if archive_id:
+            archive = PulpTemporaryFile.objects.get(pk=archive_id)
+            with archive.file.open("rb") as archive_file:
+                rpm_paths.extend(extract_rpms(archive_file, working_dir))
+
+        if not rpm_paths:
+            raise ValueError(_("No RPMs were uploaded."))
+
+        # The same RPM may be uploaded more than once
+        artifacts = {}
+        for path in rpm_paths:
+            artifact = Artifact.init_and_validate(path)
+            artifacts.setdefault(artifact.sha256, artifact)
+        artifacts = list(artifacts.values())
+
+        packages_data = read_packages_data(artifacts)
+
+        for package_data in packages_data:
+            package_data["location_href"] = (
+                format_nvra(
+                    package_data["name"],
+                    package_data["version"],
+                    package_data["release"],
+                    package_data["arch"],
+                )
+                + ".rpm"
+            )
+
+        with transaction.atomic():
+            saved_artifacts = save_artifacts(artifacts)
+            packages = save_packages(packages_data, saved_artifacts)
+
+    CreatedResource.objects.bulk_create(
+        [CreatedResource(content_object=package) for package in packages]
+    )
+
+    if repo_id:
+        repository = RpmRepository.objects.get(pk=repo_id)
+        with repository.new_version() as new_version:
+            new_version.add_content(
+                Content.objects.filter(pk__in=[package.pk for package in packages])
+            )
@@ -1,15 +1,19 @@
 import logging
+import multiprocessing
 import os
+import queue
+import re
 import shutil
 import tempfile
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from gettext import gettext as _
 
 import createrepo_c as cr
 import libcomps
 from django.conf import settings
 from django.core.files import File
-from django.db.models import Q
+from django.db.models import F, Q
 from pulpcore.plugin.models import (
     AsciiArmoredDetachedSigningService,
     ContentArtifact,
@@ -38,6 +42,7 @@ from pulp_rpm.app.models import (
     PackageEnvironment,
     PackageGroup,
     PackageLangpacks,
+    PackageMetadataCache,
     RepoMetadataFile,
     RpmPublication,
     UpdateRecord,
@@ -47,6 +52,33 @@ log = logging.getLogger(__name__)
 
 REPODATA_PATH = "repodata"
 
+# Number of packages whose metadata is fetched from the database at once when publishing
+PACKAGE_BATCH_SIZE = 500
+
+PRIMARY_PKGID_RE = re.compile(r'<checksum type="[^"]*" pkgid="YES">([^<]+)</checksum>')
+PRIMARY_TIME_FILE_RE = re.compile(r'<time file="(\d+)"')
+PKGID_ATTR_RE = re.compile(r'^<package pkgid="([^"]+)"')
+
+# Maximum number of package batches waiting to be written by a metadata writer process
+WRITER_QUEUE_SIZE = 8
+
+REPOMD_RECORD_ATTRS = (
+    "location_real",
+    "location_href",
+    "location_base",
+    "checksum",
+    "checksum_type",
+    "checksum_open",
+    "checksum_open_type",
+    "checksum_header",
+    "checksum_header_type",
+    "timestamp",
+    "size",
+    "size_open",
+    "size_header",
+    "db_ver",
+)
+
 
 class PublicationData:
     """
@@ -95,6 +127,8 @@ class PublicationData:
                 # Normally these types are not synced in the first place, we skip them here, since
                 # they might still exist in old repo versions from before we started excluding them.
                 continue
+            if repo_metadata_file.zchunk_metadata_type:
+                continue
             content_artifact = repo_metadata_file.contentartifact_set.get()
             current_file = content_artifact.artifact.file.file
             path = content_artifact.relative_path.split("/")[-1]
@@ -323,6 +357,300 @@ def cr_checksum_type_from_string(checksum_type):
     return getattr(cr, checksum_type.upper())
 
 
+def get_previous_publication(publication):
+    """
+    Find the most recent complete publication whose package metadata can be reused.
+
+    Publications created by mirrored syncs contain the upstream metadata verbatim and are
+    never considered.
+
+    Args:
+        publication (pulp_rpm.app.models.RpmPublication): The publication being created.
+
+    Returns:
+        The previous RpmPublication of the same repository or None.
+    """
+    return (
+        RpmPublication.objects.filter(
+            repository_version__repository=publication.repository_version.repository,
+            repository_version__number__lte=publication.repository_version.number,
+            complete=True,
+        )
+        .exclude(pk=publication.pk)
+        .exclude(checksum_type=CHECKSUM_TYPES.UNKNOWN)
+        .order_by("-repository_version__number", "-pulp_created")
+        .first()
+    )
+
+
+def iter_published_package_chunks(publication, metadata_type):
+    """
+    Iterate over the per-package XML chunks of a published primary, filelists or other file.
+
+    Chunks are returned exactly as they were written by createrepo_c, so that they can be
+    passed to ``add_chunk()`` and produce output identical to ``add_pkg()``.
+
+    Args:
+        publication (pulp_rpm.app.models.RpmPublication): The publication to read from.
+        metadata_type (str): One of "primary", "filelists" or "other".
+
+    Yields:
+        tuple: (pkgId, chunk, time_file) where time_file is only set for primary chunks.
+    """
+    published_metadata = PublishedMetadata.objects.filter(
+        publication=publication,
+        relative_path__regex=rf"^{REPODATA_PATH}/[0-9a-f]+-{metadata_type}\.xml\.(gz|zst)$",
+    ).first()
+    if not published_metadata:
+        return
+
+    artifact = published_metadata.contentartifact_set.select_related("artifact").get().artifact
+    compressed_path = f"previous-{os.path.basename(published_metadata.relative_path)}"
+    decompressed_path = f"previous-{metadata_type}.xml"
+    with artifact.file.open("rb") as src, open(compressed_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    cr.decompress_file(compressed_path, decompressed_path, cr.AUTO_DETECT_COMPRESSION)
+    os.remove(compressed_path)
+
+    try:
+        yield from iter_package_chunks(decompressed_path, metadata_type)
+    finally:
+        os.remove(decompressed_path)
+
+
+def iter_package_chunks(xml_path, metadata_type):
+    """
+    Split an uncompressed primary, filelists or other file into per-package XML chunks.
+
+    Args:
+        xml_path (str): Path to the uncompressed metadata file.
+        metadata_type (str): One of "primary", "filelists" or "other".
+
+    Yields:
+        tuple: (pkgId, chunk, time_file) where time_file is only set for primary chunks.
+    """
+    with open(xml_path, "r", encoding="utf-8", newline="") as xml_file:
+        lines = []
+        for line in xml_file:
+            # XML special characters are always escaped in the text nodes, so package elements
+            # are the only lines starting with "<package "
+            if line.startswith("<package "):
+                lines = [line]
+            elif lines:
+                lines.append(line)
+                if line == "</package>\n":
+                    chunk = "".join(lines)
+                    lines = []
+                    if metadata_type == "primary":
+                        pkgid = PRIMARY_PKGID_RE.search(chunk)
+                        time_file = PRIMARY_TIME_FILE_RE.search(chunk)
+                        yield (
+                            pkgid and pkgid.group(1),
+                            chunk,
+                            time_file and int(time_file.group(1)),
+                        )
+                    else:
+                        pkgid = PKGID_ATTR_RE.match(chunk)
+                        yield pkgid and pkgid.group(1), chunk, None
+
+
+class PublishedChunkLookup:
+    """
+    Look up per-package XML chunks of a previous publication in a single streaming pass.
+
+    Packages are published in the same order every time, so chunks are usually found right
+    at the head of the stream. Chunks skipped over which may still be requested later are
+    buffered, everything else (e.g. removed packages) is discarded immediately.
+    """
+
+    def __init__(self, publication, metadata_type, wanted_pkgids):
+        """
+        Args:
+            publication (pulp_rpm.app.models.RpmPublication): The publication to read from.
+            metadata_type (str): One of "primary", "filelists" or "other".
+            wanted_pkgids (set): The pkgIds for which chunks may be requested.
+        """
+        self._chunks = iter_published_package_chunks(publication, metadata_type)
+        self._wanted = wanted_pkgids
+        self._buffer = {}
+
+    def get(self, pkgid):
+        """
+        Return the (chunk, time_file) tuple for the given pkgId or None if it is not available.
+        """
+        while pkgid not in self._buffer:
+            try:
+                chunk_pkgid, chunk, time_file = next(self._chunks)
+            except StopIteration:
+                break
+            if chunk_pkgid in self._wanted:
+                self._buffer[chunk_pkgid] = (chunk, time_file)
+        return self._buffer.pop(pkgid, None)
+
+    def close(self):
+        """
+        Stop reading the previous metadata and clean up.
+        """
+        self._chunks.close()
+        self._buffer.clear()
+
+
+def open_xml_file(xml_file_cls, path, compression_type, num_of_pkgs):
+    """
+    Open a createrepo_c package metadata file for writing.
+    """
+    xml_file = xml_file_cls(path, compressiontype=compression_type)
+    xml_file.set_num_of_pkgs(num_of_pkgs)
+    return xml_file
+
+
+def write_xml_file_from_queue(xml_file_cls, path, compression_type, num_of_pkgs, chunk_queue):
+    """
+    Write batches of chunks received through a queue until None is received.
+    """
+    xml_file = open_xml_file(xml_file_cls, path, compression_type, num_of_pkgs)
+    for chunks in iter(chunk_queue.get, None):
+        for chunk in chunks:
+            xml_file.add_chunk(chunk)
+    xml_file.close()
+
+
+class MetadataFileWriter:
+    """
+    Writes per-package chunks to a createrepo_c metadata file in the current process.
+    """
+
+    def __init__(self, xml_file_cls, path, compression_type, num_of_pkgs):
+        """
+        Args:
+            xml_file_cls (type): One of the createrepo_c XmlFile classes.
+            path (str): Path of the file to write.
+            compression_type (int): createrepo_c compression type.
+            num_of_pkgs (int): Number of packages the file is going to contain.
+        """
+        self.path = path
+        self._xml_file = open_xml_file(xml_file_cls, path, compression_type, num_of_pkgs)
+
+    def add_chunks(self, chunks):
+        """
+        Add a list of chunks to the file.
+        """
+        for chunk in chunks:
+            self._xml_file.add_chunk(chunk)
+
+    def finish(self):
+        """
+        Signal that no more chunks will be added.
+        """
+        self._xml_file.close()
+
+    def close(self):
+        """
+        Wait until the file is completely written.
+        """
+
+    def abort(self):
+        """
+        Stop writing the file without waiting.
+        """
+        self.finish()
+
+
+class MetadataFileWriterProcess(MetadataFileWriter):
+    """
+    Writes per-package chunks to a createrepo_c metadata file in a separate process.
+
+    createrepo_c holds the GIL while compressing, so the compression of each file happens in a
+    child process to keep it off the process which queries the database and serializes packages.
+    """
+
+    def __init__(self, xml_file_cls, path, compression_type, num_of_pkgs):
+        self.path = path
+        context = multiprocessing.get_context("fork")
+        self._queue = context.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._process = context.Process(
+            target=write_xml_file_from_queue,
+            args=(xml_file_cls, path, compression_type, num_of_pkgs, self._queue),
+            daemon=True,
+        )
+        self._process.start()
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                self._check_alive()
+
+    def _check_alive(self):
+        if not self._process.is_alive() and self._process.exitcode != 0:
+            raise RuntimeError(
+                _("Writing of metadata file {path} failed.").format(
+                    path=os.path.basename(self.path)
+                )
+            )
+
+    def add_chunks(self, chunks):
+        self._put(chunks)
+
+    def finish(self):
+        self._put(None)
+
+    def close(self):
+        self._process.join()
+        self._check_alive()
+
+    def abort(self):
+        self._process.terminate()
+        self._process.join()
+
+
+def fill_repomd_record(name, path, checksum_type):
+    """
+    Compute the checksums and sizes of a metadata file and rename it to include its checksum.
+
+    Args:
+        name (str): The metadata type of the file.
+        path (str): Path to the metadata file.
+        checksum_type (int): createrepo_c checksum type.
+
+    Returns:
+        dict: The attributes of the filled createrepo_c.RepomdRecord.
+    """
+    record = cr.RepomdRecord(name, path)
+    record.fill(checksum_type)
+    record.rename_file()
+    return {attr: getattr(record, attr) for attr in REPOMD_RECORD_ATTRS}
+
+
+def fill_repomd_records(records, workers):
+    """
+    Fill repomd records, concurrently if more than one worker is allowed.
+
+    Args:
+        records (list): A list of (name, path, checksum_type) tuples.
+        workers (int): The maximum number of processes to use.
+
+    Returns:
+        list: The filled createrepo_c.RepomdRecord objects in the original order.
+    """
+    if workers > 1 and len(records) > 1:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(min(workers, len(records)), mp_context=context) as executor:
+            results = list(executor.map(fill_repomd_record, *zip(*records)))
+    else:
+        results = [fill_repomd_record(*record) for record in records]
+
+    filled = []
+    for (name, _path, _checksum_type), attrs in zip(records, results):
+        record = cr.RepomdRecord(name, attrs["location_real"])
+        for attr, value in attrs.items():
+            setattr(record, attr, value)
+        filled.append(record)
+    return filled
+
+
 def publish(
     repository_version_pk,
     metadata_signing_service=None,
@@ -380,6 +708,9 @@ def publish(
             )
             with ProgressReport(**pb_data) as publish_pb:
                 content = publication.repository_version.content
+                previous_publication = None
+                if settings.RPM_INCREMENTAL_PUBLISH:
+                    previous_publication = get_previous_publication(publication)
 
                 # Main repo
                 generate_repo_metadata(
@@ -389,6 +720,7 @@ def publish(
                     publication_data.repomdrecords,
                     metadata_signing_service=metadata_signing_service,
                     compression_type=compression_type,
+                    previous_publication=previous_publication,
                 )
                 publish_pb.increment()
 
@@ -413,6 +745,140 @@ def publish(
             return publication
 
 
+def package_to_createrepo_c(package, pkg_to_hash, repo_pkg_times=None):
+    """
+    Convert a Package into a createrepo_c package object ready to be published.
+
+    Args:
+        package (pulp_rpm.app.models.Package): The package to convert.
+        pkg_to_hash (dict): A mapping of package pks to (checksum_type, pkgId) tuples.
+        repo_pkg_times (dict): An optional mapping of package pks to the time they were added.
+
+    Returns:
+        createrepo_c.Package: The package with the checksum and location rewritten.
+    """
+    pkg = package.to_createrepo_c()
+
+    # rewrite the checksum and checksum type with the desired ones
+    (checksum, pkgId) = pkg_to_hash[package.pk]
+    pkg.checksum_type = checksum
+    pkg.pkgId = pkgId
+
+    pkg_filename = os.path.basename(package.location_href)
+    # this can cause an issue when two same RPM package names appears
+    # a/name1.rpm b/name1.rpm
+    pkg.location_href = os.path.join(PACKAGES_DIRECTORY, pkg_filename[0].lower(), pkg_filename)
+
+    if repo_pkg_times is not None:
+        pkg.time_file = repo_pkg_times[package.pk]
+
+    return pkg
+
+
+def get_previous_chunks(previous_chunks, pkgid, time_file):
+    """
+    Get the primary, filelists and other chunks of a package from the previous publication.
+
+    Args:
+        previous_chunks (dict): PublishedChunkLookup objects by metadata type.
+        pkgid (str): The pkgId the package is going to be published with.
+        time_file (int): The file time the package is going to be published with.
+
+    Returns:
+        A (primary, filelists, other) tuple or None if any of them can't be reused.
+    """
+    chunks = []
+    for metadata_type in ("primary", "filelists", "other"):
+        found = previous_chunks[metadata_type].get(pkgid)
+        chunks.append(found)
+    if not all(chunks) or chunks[0][1] != time_file:
+        return None
+    return tuple(chunk for chunk, _time_file in chunks)
+
+
+def get_cached_chunks(pks, pkg_to_hash):
+    """
+    Get the pre-serialized metadata of packages which is still valid for this publication.
+
+    Entries which were stored before their package was last updated are stale and ignored.
+
+    Args:
+        pks (list): The pks of the packages to look up.
+        pkg_to_hash (dict): A mapping of package pks to (checksum_type, pkgId) tuples.
+
+    Returns:
+        dict: A mapping of package pks to (primary, filelists, other) tuples.
+    """
+    cached = PackageMetadataCache.objects.filter(
+        package__in=pks, pulp_last_updated__gte=F("package__pulp_last_updated")
+    ).values_list("package", "checksum_type", "pkgId", "primary", "filelists", "other")
+    return {
+        pk: chunks
+        for pk, checksum_type, pkgid, *chunks in cached.iterator()
+        if pkg_to_hash[pk] == (checksum_type, pkgid)
+    }
+
+
+def write_package_chunks(batch, writers, pkg_to_hash, repo_pkg_times):
+    """
+    Write the metadata of a batch of packages, serializing only those without reusable chunks.
+
+    Packages serialized here are stored in the PackageMetadataCache, unless their metadata
+    depends on the repository they are published in.
+
+    Args:
+        batch (list): A list of (package pk, chunks) tuples in publishing order.
+        writers (tuple): MetadataFileWriters for the primary, filelists and other files.
+        pkg_to_hash (dict): A mapping of package pks to (checksum_type, pkgId) tuples.
+        repo_pkg_times (dict): An optional mapping of package pks to the time they were added.
+
+    Returns:
+        int: The number of packages which did not need to be serialized.
+    """
+    use_cache = settings.RPM_CACHE_PACKAGE_METADATA and repo_pkg_times is None
+    to_serialize = [pk for pk, chunks in batch if chunks is None]
+    cached = get_cached_chunks(to_serialize, pkg_to_hash) if use_cache and to_serialize else {}
+    to_serialize = [pk for pk in to_serialize if pk not in cached]
+    packages = Package.objects.in_bulk(to_serialize) if to_serialize else {}
+
+    chunks_by_file = ([], [], [])
+    new_cache_entries = []
+    for pk, chunks in batch:
+        if chunks is None:
+            chunks = cached.get(pk)
+        if chunks is None:
+            pkg = package_to_createrepo_c(packages[pk], pkg_to_hash, repo_pkg_times)
+            chunks = cr.xml_dump(pkg)
+            if use_cache:
+                checksum_type, pkgid = pkg_to_hash[pk]
+                new_cache_entries.append(
+                    PackageMetadataCache(
+                        package_id=pk,
+                        checksum_type=checksum_type,
+                        pkgId=pkgid,
+                        primary=chunks[0],
+                        filelists=chunks[1],
+                        other=chunks[2],
+                    )
+                )
+        for file_chunks, chunk in zip(chunks_by_file, chunks):
+            file_chunks.append(chunk)
+
+    for writer, file_chunks in zip(writers, chunks_by_file):
+        writer.add_chunks(file_chunks)
+
+    if new_cache_entries:
+        # concurrent publications may be caching the same packages
+        PackageMetadataCache.objects.bulk_create(
+            new_cache_entries,
+            update_conflicts=True,
+            unique_fields=["package", "checksum_type"],
+            update_fields=["pkgId", "primary", "filelists", "other", "pulp_last_updated"],
+        )
+
+    return len(batch) - len(to_serialize)
+
+
 def generate_repo_metadata(
     content,
     publication,
@@ -421,6 +887,7 @@ def generate_repo_metadata(
     sub_folder=None,
     metadata_signing_service=None,
     compression_type=COMPRESSION_TYPES.GZ,
+    previous_publication=None,
 ):
     """
     Creates a repomd.xml file.
@@ -434,6 +901,8 @@ def generate_repo_metadata(
             A reference to an associated signing service.
         compression_type(pulp_rpm.app.constants.COMPRESSION_TYPES):
             Compression type to use for metadata files.
+        previous_publication(pulp_rpm.app.models.RpmPublication): a publication of an earlier
+            version of the repository whose package metadata can be reused
 
     """
     cwd = os.getcwd()
@@ -464,9 +933,6 @@ def generate_repo_metadata(
     mod_yml_path = os.path.join(cwd, "modules.yaml")
     comps_xml_path = os.path.join(cwd, "comps.xml")
 
-    pri_xml = cr.PrimaryXmlFile(pri_xml_path, compressiontype=cr_compression_type)
-    fil_xml = cr.FilelistsXmlFile(fil_xml_path, compressiontype=cr_compression_type)
-    oth_xml = cr.OtherXmlFile(oth_xml_path, compressiontype=cr_compression_type)
     upd_xml = None
 
     # We want to support publishing with a different checksum type than the one built-in to the
@@ -538,10 +1004,6 @@ def generate_repo_metadata(
 
     total_packages = packages.count() - len(pkg_pks_to_ignore)
 
-    pri_xml.set_num_of_pkgs(total_packages)
-    fil_xml.set_num_of_pkgs(total_packages)
-    oth_xml.set_num_of_pkgs(total_packages)
-
     if settings.RPM_METADATA_USE_REPO_PACKAGE_TIME:
         # gather the times the packages were added to the repo
         repo_content = (
@@ -553,29 +1015,69 @@ def generate_repo_metadata(
             .values_list("content", "pulp_created")
         )
         repo_pkg_times = {pk: created.timestamp() for pk, created in repo_content}
+    else:
+        repo_pkg_times = None
+
+    # Reuse the package metadata of the previous publication for packages which were not added
+    # by this repository version, so that they don't need to be serialized all over again.
+    # Packages which were updated in place since then (e.g. their changelogs were trimmed) are
+    # serialized again.
+    previous_chunks = {}
+    reusable_pks = set()
+    if previous_publication and not settings.RPM_METADATA_USE_REPO_PACKAGE_TIME:
+        added = publication.repository_version.added(
+            base_version=previous_publication.repository_version
+        )
+        reusable_packages = packages.exclude(pk__in=added.values("pk")).exclude(
+            pulp_last_updated__gt=previous_publication.pulp_created
+        )
+        reusable_pks = set(reusable_packages.values_list("pk", flat=True)) - pkg_pks_to_ignore
+        wanted_pkgids = {pkg_to_hash[pk][1] for pk in reusable_pks}
+        for metadata_type in ("primary", "filelists", "other"):
+            previous_chunks[metadata_type] = PublishedChunkLookup(
+                previous_publication, metadata_type, wanted_pkgids
+            )
+    reused = 0
+
+    # The package metadata files are compressed by separate processes while the packages are
+    # being serialized and the rest of the metadata is being generated.
+    workers = settings.RPM_METADATA_GENERATION_WORKERS
+    writer_cls = MetadataFileWriterProcess if workers > 1 else MetadataFileWriter
+    writers = (
+        writer_cls(cr.PrimaryXmlFile, pri_xml_path, cr_compression_type, total_packages),
+        writer_cls(cr.FilelistsXmlFile, fil_xml_path, cr_compression_type, total_packages),
+        writer_cls(cr.OtherXmlFile, oth_xml_path, cr_compression_type, total_packages),
+    )
 
     # Process all packages
-    for package in packages.order_by("name", "evr").iterator():
-        if package.pk in pkg_pks_to_ignore:  # Temporary!
-            continue
-        pkg = package.to_createrepo_c()
-
-        # rewrite the checksum and checksum type with the desired ones
-        (checksum, pkgId) = pkg_to_hash[package.pk]
-        pkg.checksum_type = checksum
-        pkg.pkgId = pkgId
-
-        pkg_filename = os.path.basename(package.location_href)
-        # this can cause an issue when two same RPM package names appears
-        # a/name1.rpm b/name1.rpm
-        pkg.location_href = os.path.join(PACKAGES_DIRECTORY, pkg_filename[0].lower(), pkg_filename)
-
-        if settings.RPM_METADATA_USE_REPO_PACKAGE_TIME:
-            pkg.time_file = repo_pkg_times[package.pk]
-
-        pri_xml.add_pkg(pkg)
-        fil_xml.add_pkg(pkg)
-        oth_xml.add_pkg(pkg)
+    try:
+        batch = []
+        packages_qs = packages.order_by("name", "evr").values_list("pk", "time_file")
+        for pk, time_file in packages_qs.iterator():
+            if pk in pkg_pks_to_ignore:  # Temporary!
+                continue
+            chunks = None
+            if pk in reusable_pks:
+                chunks = get_previous_chunks(previous_chunks, pkg_to_hash[pk][1], time_file)
+            batch.append((pk, chunks))
+            if len(batch) >= PACKAGE_BATCH_SIZE:
+                reused += write_package_chunks(batch, writers, pkg_to_hash, repo_pkg_times)
+                batch = []
+        reused += write_package_chunks(batch, writers, pkg_to_hash, repo_pkg_times)
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    for writer in writers:
+        writer.finish()
+
+    for lookup in previous_chunks.values():
+        lookup.close()
+    log.info(
+        _("Reused existing metadata of {reused} out of {total} packages").format(
+            reused=reused, total=total_packages
+        )
+    )
 
     # Process update records
     update_records = UpdateRecord.objects.filter(pk__in=content).order_by("id", "digest")
@@ -637,9 +1139,8 @@ def generate_repo_metadata(
         },
     )
 
-    pri_xml.close()
-    fil_xml.close()
-    oth_xml.close()
+    for writer in writers:
+        writer.close()
     if upd_xml:
         upd_xml.close()
 
@@ -666,13 +1167,17 @@ def generate_repo_metadata(
 
     repomdrecords.extend(extra_repomdrecords)
 
-    for name, path in repomdrecords:
-        record = cr.RepomdRecord(name, path)
-        checksum_type = cr_checksum_type_from_string(
-            get_checksum_type(name, checksum_types, default=publication.checksum_type)
+    records_to_fill = [
+        (
+            name,
+            path,
+            cr_checksum_type_from_string(
+                get_checksum_type(name, checksum_types, default=publication.checksum_type)
+            ),
         )
-        record.fill(checksum_type)
-        record.rename_file()
+        for name, path in repomdrecords
+    ]
+    for record in fill_repomd_records(records_to_fill, workers):
         path = record.location_href.split("/")[-1]
         repomd.set_record(record)
 
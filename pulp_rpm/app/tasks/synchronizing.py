@@ -1,21 +1,26 @@
+import array
 import asyncio
-import collections
-import functools
+import contextlib
 import json
 import logging
 import os
-import re
+import shutil
+import sqlite3
 import tempfile
+import threading
 import uuid
 
 from collections import defaultdict
+from functools import partial
 from gettext import gettext as _  # noqa:F401
+from resource import RUSAGE_SELF, getrusage
+from urllib.parse import urlparse
 
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files import File
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
 from django.db.models import Q
 
 
@@ -25,9 +30,12 @@ from aiohttp.web_exceptions import HTTPNotFound
 import createrepo_c as cr
 import libcomps
 
+from pulpcore.plugin.download import DownloadResult
+from pulpcore.plugin.exceptions import DigestValidationError, SizeValidationError
 from pulpcore.plugin.util import get_domain
 from pulpcore.plugin.models import (
     Artifact,
+    Content,
     ContentArtifact,
     ProgressReport,
     Remote,
@@ -38,16 +46,20 @@ from pulpcore.plugin.stages import (
     ACSArtifactHandler,
     ArtifactDownloader,
     ArtifactSaver,
+    ContentAssociation,
     ContentSaver,
     DeclarativeArtifact,
     DeclarativeContent,
     DeclarativeVersion,
+    EndStage,
     RemoteArtifactSaver,
     Stage,
     QueryExistingArtifacts,
     QueryExistingContents,
+    create_pipeline,
 )
-from pulp_rpm.app.advisory import hash_update_record
+from pulp_rpm.app import zchunk
+from pulp_rpm.app.advisory import AUTOFILLED_COLLECTION_NAME_PREFIX, update_record_digest
 from pulp_rpm.app.constants import (
     CHECKSUM_TYPES,
     COMPS_REPODATA,
@@ -55,6 +67,7 @@ from pulp_rpm.app.constants import (
     MODULAR_REPODATA,
     PACKAGE_DB_REPODATA,
     PACKAGE_REPODATA,
+    PACKAGE_ZCK_REPODATA,
     PULP_MODULE_ATTR,
     SYNC_POLICIES,
     UPDATE_REPODATA,
@@ -86,9 +99,17 @@ from pulp_rpm.app.models import (
 from pulp_rpm.app.modulemd import parse_modular
 
 from pulp_rpm.app.comps import strdict_to_dict, dict_digest
+from pulp_rpm.app.downloaders import NotModified
 from pulp_rpm.app.kickstart.treeinfo import PulpTreeInfo, TreeinfoData
 from pulp_rpm.app.metadata_parsing import MetadataParser
+from pulp_rpm.app.mirrors import (
+    is_metalink,
+    parse_metalink,
+    parse_mirrorlist,
+    verify_metalink_hashes,
+)
 from pulp_rpm.app.shared_utils import (
+    format_nevra,
     is_previous_version,
     get_sha256,
     urlpath_sanitize,
@@ -98,13 +119,47 @@ from pulp_rpm.app.rpm_version import RpmVersion
 log = logging.getLogger(__name__)
 
 
-# TODO: https://pulp.plan.io/issues/8687
-# A global dictionary for storing data about the remote's metadata files, used for mirroring
-# Indexed by repository.pk due to sub-repos.
-metadata_files_for_mirroring = collections.defaultdict(dict)
-# A global dictionary for storing data mapping pkgid to location_href for all packages, used
-# for mirroring. Indexed by repository.pk due to sub-repos.
-pkgid_to_location_href = collections.defaultdict(functools.partial(collections.defaultdict, set))
+# The number of rows written to or looked up in the mirror index at once.
+MIRROR_INDEX_BATCH_SIZE = 1000
+# The number of PublishedArtifacts of a mirrored publication saved at once.
+PUBLISHED_ARTIFACT_BATCH_SIZE = 2000
+# The number of pkgIds looked up in the database at once when checking for known packages.
+KNOWN_PACKAGES_BATCH_SIZE = 5000
+# The fields loaded for packages which are already known to Pulp, besides the natural key.
+KNOWN_PACKAGE_FIELDS = ("pulp_id", "pulp_type", "location_href", "size_package", "is_modular")
+# The number of parsed items passed from a parser thread to the event loop at once, and the
+# number of such batches which may be waiting for the pipeline.
+PARSER_BATCH_SIZE = 100
+PARSER_QUEUE_SIZE = 10
+# How often the lag of the event loop is measured during a sync, in seconds.
+EVENT_LOOP_LAG_INTERVAL = 0.1
+# Changed zchunk chunks separated by at most this many bytes are downloaded in one range request,
+# and if more range requests than the maximum would be needed, the whole file is downloaded.
+ZCHUNK_RANGE_GAP = 64 * 1024
+ZCHUNK_MAX_RANGES = 100
+
+# The number of mirrors of a mirrorlist or metalink which are probed, how many of them at once,
+# and how long a mirror may take to answer, in seconds.
+MIRROR_PROBE_LIMIT = 20
+MIRROR_PROBE_CONCURRENCY = 10
+MIRROR_PROBE_TIMEOUT = 30
+
+# The details of the previous sync which are reused if the repomd.xml has not been modified since.
+REPOMD_SYNC_DETAILS = ("revision", "repomd_checksum", "repomd_checksums", "treeinfo_checksum")
+
+# The types of repomd records which are parsed together, and the content parsed from them. If none
+# of the records of a group changed since the previous sync, its content is carried forward.
+METADATA_GROUPS = (
+    (
+        frozenset(PACKAGE_REPODATA + PACKAGE_ZCK_REPODATA + MODULAR_REPODATA),
+        (Package, Modulemd, ModulemdDefaults, ModulemdObsolete),
+    ),
+    (
+        frozenset(COMPS_REPODATA),
+        (PackageGroup, PackageCategory, PackageEnvironment, PackageLangpacks),
+    ),
+    (frozenset(UPDATE_REPODATA), (UpdateRecord,)),
+)
 
 
 MIRROR_INCOMPATIBLE_REPO_ERR_MSG = (
@@ -113,47 +168,180 @@ MIRROR_INCOMPATIBLE_REPO_ERR_MSG = (
 )
 
 
-def store_metadata_for_mirroring(repo, md_path, relative_path):
+class MirrorIndex:
+    """
+    An index of the metadata files and packages of the repositories being mirrored by a sync.
+
+    Mirror-publishing after the sync needs to know where every metadata file was downloaded to
+    and at which locations every package is present in the remote repositories. This is stored
+    in an SQLite database in the working directory of the sync task, so that the memory used by
+    the sync does not grow with the size of the repositories being mirrored. The index is indexed
+    by repository.pk due to sub-repos.
+    """
+
+    def __init__(self):
+        """Create an empty index in the working directory."""
+        fd, self.path = tempfile.mkstemp(dir=".", suffix=".sqlite3")
+        os.close(fd)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        # The index is thrown away with the task, it does not need to survive a crash
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE metadata_files ("
+            "repository TEXT, relative_path TEXT, path TEXT, "
+            "PRIMARY KEY (repository, relative_path)"
+            ")"
+        )
+        self._connection.execute(
+            "CREATE TABLE packages ("
+            "repository TEXT, pkgid TEXT, location_href TEXT, "
+            "PRIMARY KEY (repository, pkgid, location_href)"
+            ") WITHOUT ROWID"
+        )
+        self._pending_packages = []
+
+    def add_metadata_file(self, repo, md_path, relative_path):
+        """Store the path a metadata file of a repository was downloaded to."""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO metadata_files VALUES (?, ?, ?)",
+            (str(repo.pk), relative_path, md_path),
+        )
+
+    def add_package(self, repo, pkgid, location_href):
+        """Store a location of a package within a repository."""
+        self._pending_packages.append((str(repo.pk), pkgid, location_href))
+        if len(self._pending_packages) >= MIRROR_INDEX_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._pending_packages:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO packages VALUES (?, ?, ?)", self._pending_packages
+            )
+            self._pending_packages.clear()
+        self._connection.commit()
+
+    def has_metadata_file(self, repo, relative_path):
+        """Whether a metadata file of a repository was downloaded."""
+        cursor = self._connection.execute(
+            "SELECT 1 FROM metadata_files WHERE repository = ? AND relative_path = ?",
+            (str(repo.pk), relative_path),
+        )
+        return cursor.fetchone() is not None
+
+    def metadata_files(self, repo):
+        """Iterate over the (relative_path, md_path) pairs of the metadata files of a repository."""
+        self._flush()
+        yield from self._connection.execute(
+            "SELECT relative_path, path FROM metadata_files WHERE repository = ?", (str(repo.pk),)
+        )
+
+    def package_locations(self, repo, pkgids):
+        """Iterate over the (pkgid, location_href) pairs of the given packages of a repository."""
+        self._flush()
+        pkgids = list(pkgids)
+        for i in range(0, len(pkgids), MIRROR_INDEX_BATCH_SIZE):
+            batch = pkgids[i : i + MIRROR_INDEX_BATCH_SIZE]
+            yield from self._connection.execute(
+                "SELECT pkgid, location_href FROM packages "
+                "WHERE repository = ? AND pkgid IN ({})".format(", ".join("?" * len(batch))),
+                [str(repo.pk), *batch],
+            )
+
+    def close(self):
+        """Close and remove the index."""
+        self._connection.close()
+        os.remove(self.path)
+
+
+def store_metadata_for_mirroring(mirror_index, repo, md_path, relative_path):
     """Used to store data about the downloaded metadata for mirror-publishing after the sync.
 
     Args:
+        mirror_index: The MirrorIndex of the sync, or None if the sync is not mirroring metadata
         repo: Which repository the metadata is associated with
         md_path: The path to the metadata file
         relative_path: The relative path to the metadata file within the repository
     """
-    global metadata_files_for_mirroring
-    metadata_files_for_mirroring[str(repo.pk)][relative_path] = md_path
+    if mirror_index is not None:
+        mirror_index.add_metadata_file(repo, md_path, relative_path)
+
+
+def get_known_packages(pkgids):
+    """Look up which of the packages with the given pkgIds are already saved in the database.
 
+    Only the fields needed to pass the packages down the sync pipeline are loaded, and the
+    packages are touched so that they are not removed as orphans while the sync is running.
 
-def store_package_for_mirroring(repo, pkgid, location_href):
+    Args:
+        pkgids (iterable): The pkgIds of the packages of the remote repository
+
+    Returns:
+        tuple: The attnames of the loaded fields, in the order of the model's concrete fields, and
+            a dict of the loaded field values of the known packages by their pkgId. pkgIds which
+            match more than one package are left out.
+    """
+    wanted_fields = set(KNOWN_PACKAGE_FIELDS)
+    wanted_fields.add(Package._meta.pk.attname)
+    wanted_fields.update(
+        Package._meta.get_field(name).attname for name in Package.natural_key_fields()
+    )
+    field_names = tuple(
+        field.attname for field in Package._meta.concrete_fields if field.attname in wanted_fields
+    )
+    pkgid_index = field_names.index("pkgId")
+
+    known_packages = {}
+    ambiguous_pkgids = set()
+    pkgids = list(pkgids)
+    for i in range(0, len(pkgids), KNOWN_PACKAGES_BATCH_SIZE):
+        packages = Package.objects.filter(
+            pkgId__in=pkgids[i : i + KNOWN_PACKAGES_BATCH_SIZE], pulp_domain=get_domain()
+        )
+        packages.touch()
+        for values in packages.values_list(*field_names).iterator():
+            pkgid = values[pkgid_index]
+            if pkgid in known_packages:
+                ambiguous_pkgids.add(pkgid)
+            known_packages[pkgid] = values
+
+    for pkgid in ambiguous_pkgids:
+        del known_packages[pkgid]
+    return field_names, known_packages
+
+
+def store_package_for_mirroring(mirror_index, repo, pkgid, location_href):
     """Used to store data about the packages for mirror-publishing after the sync.
 
     Args:
+        mirror_index: The MirrorIndex of the sync, or None if the sync is not mirroring metadata
         repo: Which repository the metadata is associated with
         pkgid: The checksum of the package
         location_href: The relative path to the package within the repository
     """
-    global pkgid_to_location_href
     # this shouldn't really add the location_href to a list, really it ought to set the value
     # but unfortunately some repositories have the same packages present in multiple places
     # same pkgid, >1 different location_hrefs
-    pkgid_to_location_href[str(repo.pk)][pkgid].add(location_href)
+    if mirror_index is not None:
+        mirror_index.add_package(repo, pkgid, location_href)
 
 
-def add_metadata_to_publication(publication, version, prefix=""):
+def add_metadata_to_publication(publication, version, mirror_index, prefix=""):
     """Create a mirrored publication for the given repository version.
 
-    Uses the `metadata_files` global data.
+    Uses the data stored in the `mirror_index` during the sync.
 
     Args:
         publication: The publication to add downloaded repo metadata to
         version: The repository version the repo corresponds to
+        mirror_index: The MirrorIndex of the sync
     Kwargs:
         prefix: Subdirectory underneath the root repository (if a sub-repo)
     """
-    repo_metadata_files = metadata_files_for_mirroring[str(version.repository.pk)]
+    repository = version.repository
 
-    for relative_path, metadata_file_path in repo_metadata_files.items():
+    for relative_path, metadata_file_path in mirror_index.metadata_files(repository):
         with open(metadata_file_path, "rb") as metadata_fd:
             PublishedMetadata.create_from_file(
                 file=File(metadata_fd),
@@ -161,65 +349,116 @@ def add_metadata_to_publication(publication, version, prefix=""):
                 publication=publication,
             )
 
-    published_artifacts = []
-
-    # Handle packages
-    pkg_data = ContentArtifact.objects.filter(
-        content__in=version.content, content__pulp_type=Package.get_pulp_type()
-    ).values("pk", "content__rpm_package__pkgId")
-    for ca in pkg_data.iterator():
-        for relative_path in pkgid_to_location_href[str(version.repository.pk)][
-            ca["content__rpm_package__pkgId"]
-        ]:
-            pa = PublishedArtifact(
-                content_artifact_id=ca["pk"],
+    def package_artifacts(content_artifact_pks):
+        locations = mirror_index.package_locations(repository, content_artifact_pks.keys())
+        for pkgid, relative_path in locations:
+            yield PublishedArtifact(
+                content_artifact_id=content_artifact_pks[pkgid],
                 relative_path=os.path.join(prefix, relative_path),
                 publication=publication,
             )
-            published_artifacts.append(pa)
-
-    # Handle everything else
-    # TODO: this code is copied directly from publication, we should deduplicate it later
-    # (if possible)
-    is_treeinfo = Q(relative_path__in=["treeinfo", ".treeinfo"])
-    unpublishable_types = Q(
-        content__pulp_type__in=[
-            RepoMetadataFile.get_pulp_type(),
-            Modulemd.get_pulp_type(),
-            ModulemdDefaults.get_pulp_type(),
-            # already dealt with
-            Package.get_pulp_type(),
-        ]
-    )
+        content_artifact_pks.clear()
+
+    def published_artifacts():
+        # Handle packages
+        pkg_data = ContentArtifact.objects.filter(
+            content__in=version.content, content__pulp_type=Package.get_pulp_type()
+        ).values_list("pk", "content__rpm_package__pkgId")
+        content_artifact_pks = {}
+        for ca_pk, pkgid in pkg_data.iterator(chunk_size=MIRROR_INDEX_BATCH_SIZE):
+            content_artifact_pks[pkgid] = ca_pk
+            if len(content_artifact_pks) >= MIRROR_INDEX_BATCH_SIZE:
+                yield from package_artifacts(content_artifact_pks)
+        yield from package_artifacts(content_artifact_pks)
+
+        # Handle everything else
+        # TODO: this code is copied directly from publication, we should deduplicate it later
+        # (if possible)
+        is_treeinfo = Q(relative_path__in=["treeinfo", ".treeinfo"])
+        unpublishable_types = Q(
+            content__pulp_type__in=[
+                RepoMetadataFile.get_pulp_type(),
+                Modulemd.get_pulp_type(),
+                ModulemdDefaults.get_pulp_type(),
+                # already dealt with
+                Package.get_pulp_type(),
+            ]
+        )
 
-    contentartifact_qs = (
-        ContentArtifact.objects.filter(content__in=version.content)
-        .exclude(unpublishable_types)
-        .exclude(is_treeinfo)
-    )
+        contentartifact_qs = (
+            ContentArtifact.objects.filter(content__in=version.content)
+            .exclude(unpublishable_types)
+            .exclude(is_treeinfo)
+        )
 
-    for content_artifact in contentartifact_qs.values("pk", "relative_path").iterator():
-        published_artifacts.append(
-            PublishedArtifact(
+        for content_artifact in contentartifact_qs.values("pk", "relative_path").iterator():
+            yield PublishedArtifact(
                 relative_path=content_artifact["relative_path"],
                 publication=publication,
                 content_artifact_id=content_artifact["pk"],
             )
-        )
 
-    PublishedArtifact.objects.bulk_create(published_artifacts)
+    bulk_create_published_artifacts(published_artifacts())
+
+
+def bulk_create_published_artifacts(published_artifacts):
+    """Save a stream of PublishedArtifacts in batches of PUBLISHED_ARTIFACT_BATCH_SIZE.
 
+    Only one batch is kept in memory at a time. On PostgreSQL the batches are sent with COPY,
+    which is much cheaper than a multi-row INSERT for the database.
 
-def get_repomd_file(remote, url):
+    Args:
+        published_artifacts (iterable): The unsaved PublishedArtifacts.
     """
-    Check if repodata exists.
+    if connection.vendor == "postgresql":
+        save_batch = copy_published_artifacts
+    else:
+        save_batch = PublishedArtifact.objects.bulk_create
+
+    batch = []
+    for published_artifact in published_artifacts:
+        batch.append(published_artifact)
+        if len(batch) >= PUBLISHED_ARTIFACT_BATCH_SIZE:
+            save_batch(batch)
+            batch.clear()
+    if batch:
+        save_batch(batch)
+
+
+def copy_published_artifacts(published_artifacts):
+    """Insert PublishedArtifacts with the PostgreSQL COPY protocol.
+
+    Like bulk_create(), this neither calls save() nor sends signals. Field defaults and automatic
+    timestamps are filled in by the fields themselves.
+
+    Args:
+        published_artifacts (list): The unsaved PublishedArtifacts.
+    """
+    meta = PublishedArtifact._meta
+    fields = meta.concrete_fields
+    statement = "COPY {} ({}) FROM STDIN".format(
+        connection.ops.quote_name(meta.db_table),
+        ", ".join(connection.ops.quote_name(field.column) for field in fields),
+    )
+    with connection.cursor() as cursor, cursor.copy(statement) as copy:
+        for published_artifact in published_artifacts:
+            copy.write_row(
+                [
+                    field.get_db_prep_save(field.pre_save(published_artifact, True), connection)
+                    for field in fields
+                ]
+            )
+
+
+def get_repomd_url(url):
+    """
+    Get the URL of the repomd.xml of a repository.
 
     Args:
-        remote (RpmRemote or UlnRemote): An RpmRemote or UlnRemote to download with.
         url (str): A remote repository URL
 
     Returns:
-        pulpcore.plugin.download.DownloadResult: downloaded repomd.xml
+        str: The URL of the repomd.xml
 
     """
     # URLs, esp mirrorlist URLs, can come into this method with parameters attached.
@@ -228,43 +467,414 @@ def get_repomd_file(remote, url):
     # Make sure we're only looking for the repomd.xml file, no matter what weirdness comes
     # in. See https://pulp.plan.io/issues/8981 for more details.
     url = url.split("?")[0]
-    downloader = remote.get_downloader(url=urlpath_sanitize(url, "repodata/repomd.xml"))
-    return downloader.fetch()
+    return urlpath_sanitize(url, "repodata/repomd.xml")
+
+
+def get_repomd_downloader(remote, url):
+    """
+    Get a downloader for the repomd.xml of a repository.
+
+    Args:
+        remote (RpmRemote or UlnRemote): An RpmRemote or UlnRemote to download with.
+        url (str): A remote repository URL
+
+    Returns:
+        pulpcore.plugin.download.BaseDownloader: downloader of the repomd.xml
+
+    """
+    return remote.get_downloader(url=get_repomd_url(url))
+
+
+def get_repomd_file(remote, url, fetch_cache=None, validators=None):
+    """
+    Check if repodata exists.
+
+    Args:
+        remote (RpmRemote or UlnRemote): An RpmRemote or UlnRemote to download with.
+        url (str): A remote repository URL
+        fetch_cache (MetadataFetchCache): The cache of the files fetched by the task, if any.
+        validators (dict): The validators of the files of the previous sync by URL, to request
+            the repomd.xml conditionally.
+
+    Returns:
+        pulpcore.plugin.download.DownloadResult: downloaded repomd.xml, or None if it was requested
+            conditionally and has not been modified
+
+    """
+    if fetch_cache is None:
+        return get_repomd_downloader(remote, url).fetch()
+    return asyncio.get_event_loop().run_until_complete(
+        fetch_cache.fetch(remote, get_repomd_url(url), validators=validators)
+    )
+
+
+def get_previous_treeinfo(repository, url):
+    """
+    Get the treeinfo file synced to the latest version of a repository.
+
+    Args:
+        repository (RpmRepository): The repository.
+        url (str): The URL the file was synced from.
+
+    Returns:
+        pulpcore.plugin.download.DownloadResult: A copy of the file, or None if the latest version
+            has no distribution tree of the treeinfo file synced last.
+
+    """
+    distribution_tree = DistributionTree.objects.filter(
+        pk__in=repository.latest_version().content
+    ).first()
+    if distribution_tree is None:
+        return None
+    content_artifact = (
+        distribution_tree.contentartifact_set.filter(relative_path=".treeinfo")
+        .select_related("artifact__pulp_domain")
+        .first()
+    )
+    artifact = content_artifact and content_artifact.artifact
+    if artifact is None or artifact.sha256 != repository.last_sync_details.get("treeinfo_checksum"):
+        return None
+
+    with artifact.pulp_domain.get_storage().open(artifact.file.name) as treeinfo_file:
+        with tempfile.NamedTemporaryFile("wb", dir=".", delete=False) as copy:
+            shutil.copyfileobj(treeinfo_file, copy)
+    return DownloadResult(
+        url=url,
+        artifact_attributes={"size": artifact.size, "sha256": artifact.sha256},
+        path=copy.name,
+        headers=None,
+    )
+
+
+class MetadataFetchCache:
+    """
+    The repomd.xml and treeinfo files fetched during a sync task, by URL.
+
+    The checks before a sync and the sync itself need the same files, so each of them is only
+    downloaded once per task. Files can be requested conditionally, with the ETag and Last-Modified
+    validators of the previous sync, and servers then answer "304 Not Modified" for files which
+    have not changed.
+
+    Attributes:
+        validators (dict): The validators of the fetched files by URL, to be stored for the next
+            sync.
+    """
+
+    def __init__(self):
+        """Create an empty cache."""
+        self.validators = {}
+        self._results = {}
+        self._not_modified = set()
+        self._not_found = set()
+
+    @staticmethod
+    def response_validators(headers):
+        """Return the validators of a file from the headers of the response it was fetched with."""
+        if not headers:
+            return {}
+        validators = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        return {key: value for key, value in validators.items() if value}
+
+    def not_modified(self, url):
+        """Whether a file has been requested conditionally and has not been modified."""
+        return url in self._not_modified
+
+    def get(self, url):
+        """Return the DownloadResult of a file which has already been downloaded, or None."""
+        return self._results.get(url)
+
+    async def fetch(self, remote, url, validators=None, **kwargs):
+        """
+        Download a file, unless it has already been downloaded during this task.
 
+        Args:
+            remote (RpmRemote or UlnRemote): The remote to download with.
+            url (str): The URL of the file.
+            validators (dict): The validators of the files of the previous sync by URL. If given,
+                the file is requested conditionally.
+            kwargs: Passed to the downloader.
+
+        Returns:
+            pulpcore.plugin.download.DownloadResult: The downloaded file, or None if it was
+                requested conditionally and has not been modified.
+
+        Raises:
+            FileNotFoundError: If the file does not exist and the downloader silences the error.
+        """
+        if url in self._not_found:
+            raise FileNotFoundError(url)
+        if validators is not None and url in self._not_modified:
+            return None
+        if url in self._results:
+            return self._results[url]
+
+        file_validators = validators.get(url) if validators else None
+        downloader = remote.get_downloader(url=url, validators=file_validators, **kwargs)
+        try:
+            result = await downloader.run()
+        except NotModified:
+            self._not_modified.add(url)
+            self.validators[url] = file_validators
+            return None
+        except FileNotFoundError:
+            self._not_found.add(url)
+            raise
+        self._results[url] = result
+        self.validators[url] = self.response_validators(result.headers)
+        return result
+
+
+def run_concurrently(coroutines, max_concurrent, return_exceptions=False):
+    """
+    Run coroutines in the event loop, at most `max_concurrent` of them at a time.
+
+    The coroutines are started in order. If one of them fails, the others are cancelled.
+
+    Args:
+        coroutines (list): The coroutines to run.
+        max_concurrent (int): The maximum number of coroutines running at the same time.
+        return_exceptions (bool): Return exceptions like results instead of raising them.
+
+    Returns:
+        list: The results of the coroutines, in order.
+
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrent, 1))
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    async def run_all():
+        tasks = [asyncio.ensure_future(run(coroutine)) for coroutine in coroutines]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    return asyncio.get_event_loop().run_until_complete(run_all())
+
+
+async def run_in_thread(func, *args):
+    """
+    Run a CPU-bound function, e.g. a metadata parser, in a separate thread.
+
+    Running it in a coroutine would block the event loop, and with it the downloads and database
+    saves of the other stages of the pipeline.
+
+    Args:
+        func (callable): The function to run.
+        args: The positional arguments of the function.
+
+    Returns:
+        The result of the function.
+
+    """
+    return await sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def iterate_in_thread(
+    iterable_func, batch_size=PARSER_BATCH_SIZE, max_size=PARSER_QUEUE_SIZE
+):
+    """
+    Iterate over a CPU-bound iterable, e.g. a metadata parser, in a separate thread.
+
+    The items are passed to the event loop in batches through a bounded queue, so the thread
+    can't run arbitrarily far ahead of the pipeline. If the iteration is stopped early, the
+    thread stops at the next item.
+
+    Args:
+        iterable_func (callable): A function returning the iterable, called in the thread.
+        batch_size (int): The number of items passed to the event loop at once.
+        max_size (int): The maximum number of batches waiting to be consumed.
+
+    Yields:
+        The items of the iterable, in order.
+
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_size)
+    stopped = threading.Event()
+
+    def put(batch):
+        asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+
+    def produce():
+        try:
+            batch = []
+            for item in iterable_func():
+                if stopped.is_set():
+                    return
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    put(batch)
+                    batch = []
+            put(batch)
+        finally:
+            put(None)
+
+    producer = asyncio.ensure_future(run_in_thread(produce))
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            for item in batch:
+                yield item
+        await producer
+    finally:
+        stopped.set()
+        # the thread may be waiting for room in the queue
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait([producer], timeout=EVENT_LOOP_LAG_INTERVAL)
+        if not producer.cancelled():
+            producer.exception()
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how late the event loop runs scheduled callbacks, while it is used as a context.
+
+    Any CPU-bound work done in a coroutine delays everything else running in the event loop. A
+    task sleeping for a fixed interval measures how much later than that it is woken up.
+    """
+
+    def __init__(self, interval=EVENT_LOOP_LAG_INTERVAL):
+        """
+        Args:
+            interval (float): How often the lag is measured, in seconds.
+        """
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self._task = None
+
+    @property
+    def mean_lag(self):
+        """The mean lag of the event loop, in seconds."""
+        return self.total_lag / self.samples if self.samples else 0.0
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+
+    async def __aenter__(self):
+        self._task = asyncio.ensure_future(self._measure())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+
+async def probe_mirror(remote, url, fetch_cache, validators=None, metalink_hashes=None):
+    """
+    Fetch the repomd.xml of a mirror, measuring how long it takes.
+
+    Args:
+        remote (RpmRemote or UlnRemote): The remote to download with.
+        url (str): The base URL of the mirror.
+        fetch_cache (MetadataFetchCache): The cache of the files fetched by the task.
+        validators (dict): The validators of the files of the previous sync by URL, to request
+            the repomd.xml conditionally.
+        metalink_hashes (list): The acceptable versions of the repomd.xml listed by a metalink.
+
+    Returns:
+        float: The time it took to fetch the repomd.xml, in seconds.
+
+    Raises:
+        ValueError: If the repomd.xml does not match any of the versions listed by the metalink.
+    """
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    result = await asyncio.wait_for(
+        fetch_cache.fetch(remote, get_repomd_url(url), validators=validators),
+        MIRROR_PROBE_TIMEOUT,
+    )
+    latency = loop.time() - start
+    if metalink_hashes and not verify_metalink_hashes(result.path, metalink_hashes):
+        raise ValueError(_("The repomd.xml does not match the metalink, the mirror is outdated."))
+    return latency
+
+
+def fetch_mirrors(remote, fetch_cache=None, validators=None):
+    """
+    Fetch the working mirrors of a mirrorlist or metalink feed, the fastest first.
 
-def fetch_mirror(remote):
-    """Fetch the first valid mirror from a list of all available mirrors from a mirror list feed.
+    The repomd.xml of the first mirrors of the list is fetched concurrently, and the mirrors are
+    ranked by how long it took. The repomd.xml of the mirrors of a metalink is verified against the
+    checksums it lists, and fetched unconditionally for that.
 
-    URLs which are commented out or have any punctuations in front of them are being ignored.
+    Args:
+        remote (RpmRemote or UlnRemote): The remote whose URL is the mirrorlist or metalink.
+        fetch_cache (MetadataFetchCache): The cache of the files fetched by the task, if any.
+        validators (dict): The validators of the files of the previous sync by URL.
+
+    Returns:
+        list: The base URLs of the working mirrors, the fastest first.
     """
+    if fetch_cache is None:
+        fetch_cache = MetadataFetchCache()
+
     downloader = remote.get_downloader(url=remote.url.rstrip("/"), urlencode=False)
     result = downloader.fetch()
+    with open(result.path, "rb") as mirror_list_file:
+        data = mirror_list_file.read()
+
+    metalink_hashes = None
+    if is_metalink(data):
+        mirror_urls, metalink_hashes = parse_metalink(data)
+        validators = None
+    else:
+        mirror_urls = parse_mirrorlist(data)
+    mirror_urls = mirror_urls[:MIRROR_PROBE_LIMIT]
+
+    latencies = run_concurrently(
+        [
+            probe_mirror(remote, mirror_url, fetch_cache, validators, metalink_hashes)
+            for mirror_url in mirror_urls
+        ],
+        MIRROR_PROBE_CONCURRENCY,
+        return_exceptions=True,
+    )
 
-    url_pattern = re.compile(r"(^|^[\w\s=]+\s)((http(s)?)://.*)")
-    with open(result.path) as mirror_list_file:
-        for mirror in mirror_list_file:
-            match = re.match(url_pattern, mirror)
-            if not match:
-                continue
-
-            mirror_url = match.group(2)
-            try:
-                get_repomd_file(remote, mirror_url)
-                # just check if the metadata exists
-                return mirror_url
-            except Exception as exc:
-                log.warning(
-                    "Url '{}' from mirrorlist was tried and failed with error: {}".format(
-                        mirror_url, exc
-                    )
+    mirrors = []
+    for mirror_url, latency in zip(mirror_urls, latencies):
+        if isinstance(latency, Exception):
+            log.warning(
+                "Url '{}' from mirrorlist was tried and failed with error: {}".format(
+                    mirror_url, str(latency) or type(latency).__name__
                 )
-                continue
+            )
+            continue
+        mirrors.append((latency, mirror_url))
+    mirrors.sort(key=lambda mirror: mirror[0])
+    return [mirror_url for _latency, mirror_url in mirrors]
 
-    return None
 
+def fetch_remote_urls(remote, custom_url=None, fetch_cache=None, validators=None):
+    """
+    Fetch the URLs of a remote from which content can be synced.
 
-def fetch_remote_url(remote, custom_url=None):
-    """Fetch a single remote from which can be content synced."""
+    The repomd.xml is fetched through the cache of the task and conditionally, if a
+    MetadataFetchCache and the validators of the previous sync are given.
+
+    Returns:
+        list: The URL of the repository, or the URLs of its working mirrors, the fastest first.
+    """
 
     def normalize_url(url_to_normalize):
         return url_to_normalize.rstrip("/") + "/"
@@ -273,9 +883,9 @@ def fetch_remote_url(remote, custom_url=None):
 
     try:
         normalized_remote_url = normalize_url(url)
-        get_repomd_file(remote, normalized_remote_url)
+        get_repomd_file(remote, normalized_remote_url, fetch_cache, validators)
         # just check if the metadata exists
-        return normalized_remote_url
+        return [normalized_remote_url]
     except ClientResponseError as exc:
         # If 'custom_url' is passed it is a call from ACS refresh
         # which doesn't support mirror lists.
@@ -289,14 +899,14 @@ def fetch_remote_url(remote, custom_url=None):
         log.info(
             _("Attempting to resolve a true url from potential mirrolist url '{}'").format(url)
         )
-        remote_url = fetch_mirror(remote)
-        if remote_url:
+        mirrors = fetch_mirrors(remote, fetch_cache, validators)
+        if mirrors:
             log.info(
                 _("Using url '{}' from mirrorlist in place of the provided url {}").format(
-                    remote_url, url
+                    mirrors[0], url
                 )
             )
-            return normalize_url(remote_url)
+            return [normalize_url(mirror) for mirror in mirrors]
 
         if exc.status == 404:
             raise ValueError(_("An invalid remote URL was provided: {}").format(url))
@@ -304,16 +914,21 @@ def fetch_remote_url(remote, custom_url=None):
         raise exc
 
 
-def should_optimize_sync(sync_details, last_sync_details):
+def fetch_remote_url(remote, custom_url=None, fetch_cache=None, validators=None):
+    """Fetch a single remote from which can be content synced."""
+    return fetch_remote_urls(remote, custom_url, fetch_cache, validators)[0]
+
+
+def sync_configuration_has_changed(sync_details, last_sync_details):
     """
-    Check whether the sync should be optimized by comparing its parameters with the previous sync.
+    Check whether the content of the previous sync can't be relied on for the current sync.
 
     Args:
         sync_details (dict): A collection of details about the current sync configuration.
         last_sync_details (dict): A collection of details about the previous sync configuration.
 
     Returns:
-        bool: True, if sync is optimized; False, otherwise.
+        bool: True, if the configuration or the repository changed; False, otherwise.
 
     """
     might_download_content = (
@@ -325,7 +940,7 @@ def should_optimize_sync(sync_details, last_sync_details):
         and sync_details["sync_policy"] == SYNC_POLICIES.MIRROR_COMPLETE
     )
     if might_download_content or might_create_publication:
-        return False
+        return True
 
     url_has_changed = last_sync_details.get("url") != sync_details["url"]
     retain_package_versions_has_changed = (
@@ -334,7 +949,22 @@ def should_optimize_sync(sync_details, last_sync_details):
     repository_has_been_modified = (
         last_sync_details.get("most_recent_version") != sync_details["most_recent_version"]
     )
-    if url_has_changed or repository_has_been_modified or retain_package_versions_has_changed:
+    return url_has_changed or repository_has_been_modified or retain_package_versions_has_changed
+
+
+def should_optimize_sync(sync_details, last_sync_details):
+    """
+    Check whether the sync should be optimized by comparing its parameters with the previous sync.
+
+    Args:
+        sync_details (dict): A collection of details about the current sync configuration.
+        last_sync_details (dict): A collection of details about the previous sync configuration.
+
+    Returns:
+        bool: True, if sync is optimized; False, otherwise.
+
+    """
+    if sync_configuration_has_changed(sync_details, last_sync_details):
         return False
 
     old_revision = is_previous_version(sync_details["revision"], last_sync_details.get("revision"))
@@ -351,6 +981,42 @@ def should_optimize_sync(sync_details, last_sync_details):
     return True
 
 
+def get_unchanged_metadata(sync_details, last_sync_details):
+    """
+    Find the metadata which has not changed since the previous sync, by comparing its checksums.
+
+    Only whole groups of metadata which are parsed together are considered unchanged, see
+    METADATA_GROUPS. The content parsed from them in the previous sync can be carried forward
+    instead of parsing them again.
+
+    Args:
+        sync_details (dict): A collection of details about the current sync configuration.
+        last_sync_details (dict): A collection of details about the previous sync configuration.
+
+    Returns:
+        tuple: The set of the unchanged repomd record types, and the list of the content models
+            parsed from them.
+
+    """
+    unchanged_metadata = set()
+    unchanged_models = []
+    if sync_configuration_has_changed(sync_details, last_sync_details):
+        return unchanged_metadata, unchanged_models
+    if last_sync_details.get("skip_types") != sync_details["skip_types"]:
+        return unchanged_metadata, unchanged_models
+
+    last_checksums = last_sync_details.get("repomd_checksums")
+    if last_checksums is None:
+        return unchanged_metadata, unchanged_models
+
+    checksums = sync_details["repomd_checksums"]
+    for record_types, models in METADATA_GROUPS:
+        if all(last_checksums.get(t) == checksums.get(t) for t in record_types):
+            unchanged_metadata |= record_types & set(checksums)
+            unchanged_models.extend(models)
+    return unchanged_metadata, unchanged_models
+
+
 def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url=None):
     """
     Sync content from the remote repository.
@@ -396,24 +1062,74 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
     deferred_download = remote.policy != Remote.IMMEDIATE  # Interpret download policy
     skip_treeinfo = "treeinfo" in skip_types
 
-    def get_treeinfo_data(remote, remote_url):
-        """Get Treeinfo data from remote."""
-        treeinfo_serialized = {}
+    # The repomd.xml and treeinfo files are downloaded once per task. Unless the sync is not
+    # optimized, they are requested conditionally, and for files which have not been modified the
+    # details of the previous sync are reused.
+    fetch_cache = MetadataFetchCache()
+    conditional_fetch = optimize and sync_policy != SYNC_POLICIES.MIRROR_COMPLETE
+
+    def get_validators(repository):
+        """Get the validators of the files of the previous sync, if its details can be reused."""
+        last_sync_details = repository.last_sync_details
+        if not conditional_fetch or not all(
+            key in last_sync_details for key in REPOMD_SYNC_DETAILS
+        ):
+            return None
+        return last_sync_details.get("validators", {})
+
+    async def download_treeinfo(remote, remote_url, repository):
+        """
+        Download the treeinfo file from remote, returning its namespace and download result.
+
+        The download result is None if the file has not been modified since the previous sync.
+        """
         if skip_treeinfo:
-            return treeinfo_serialized
+            return None, None
+
+        validators = get_validators(repository)
+        if (
+            validators is not None
+            and not repository.last_sync_details["treeinfo_checksum"]
+            and fetch_cache.not_modified(get_repomd_url(remote_url))
+        ):
+            # the repository has not been modified and had no treeinfo file
+            return None, None
 
         namespaces = [".treeinfo", "treeinfo"]
         for namespace in namespaces:
-            downloader = remote.get_downloader(
-                url=urlpath_sanitize(remote_url, namespace),
-                silence_errors_for_response_status_codes={403, 404},
-            )
-
             try:
-                result = downloader.fetch()
+                return namespace, await fetch_cache.fetch(
+                    remote,
+                    urlpath_sanitize(remote_url, namespace),
+                    validators=validators,
+                    silence_errors_for_response_status_codes={403, 404},
+                )
             except FileNotFoundError:
                 continue
 
+        return None, None
+
+    def get_treeinfo_data(remote, remote_url, repository, downloaded_treeinfo=None):
+        """Get Treeinfo data from remote."""
+        treeinfo_serialized = {}
+        if downloaded_treeinfo is None:
+            downloaded_treeinfo = asyncio.get_event_loop().run_until_complete(
+                download_treeinfo(remote, remote_url, repository)
+            )
+
+        namespace, result = downloaded_treeinfo
+        if namespace is not None and result is None:
+            # not modified since the previous sync, the file synced then is parsed again
+            url = urlpath_sanitize(remote_url, namespace)
+            result = get_previous_treeinfo(repository, url)
+            if result is None:
+                result = asyncio.get_event_loop().run_until_complete(
+                    fetch_cache.fetch(
+                        remote, url, silence_errors_for_response_status_codes={403, 404}
+                    )
+                )
+
+        if result is not None:
             treeinfo = PulpTreeInfo()
             treeinfo.load(f=result.path)
             sha256 = result.artifact_attributes["sha256"]
@@ -432,34 +1148,78 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             )
             treeinfo_file = tempfile.NamedTemporaryFile(dir=".", delete=False)
             treeinfo.dump(treeinfo_file.name, main_variant=main_variant)
-            store_metadata_for_mirroring(repository, treeinfo_file.name, namespace)
-            break
+            store_metadata_for_mirroring(mirror_index, repository, treeinfo_file.name, namespace)
 
         return treeinfo_serialized
 
-    def get_sync_details(remote, url, sync_policy, repository):
+    async def download_sync_files(remote, url, repository):
+        """
+        Download the repomd.xml and the treeinfo file of a repository.
+
+        The download results are None for files which have not been modified since the previous
+        sync.
+        """
+        repomd_result = await fetch_cache.fetch(
+            remote, get_repomd_url(url), validators=get_validators(repository)
+        )
+        return repomd_result, await download_treeinfo(remote, url, repository)
+
+    def get_sync_details(remote, url, sync_policy, repository, sync_files=None):
         version = repository.latest_version()
         with tempfile.TemporaryDirectory(dir="."):
-            result = get_repomd_file(remote, url)
-            repomd_path = result.path
-            repomd = cr.Repomd(repomd_path)
-            repomd_checksum = get_sha256(repomd_path)
-            treeinfo_file_data = get_treeinfo_data(remote, url)
-            treeinfo_checksum = treeinfo_file_data.get("hash", "")
-
-        return {
-            "url": remote.url,  # use the original remote url so that mirrorlists are optimizable
-            "download_policy": remote.policy,
-            "sync_policy": sync_policy,
-            "most_recent_version": version.number,
-            "revision": repomd.revision,
-            "repomd_checksum": repomd_checksum,
-            "treeinfo_checksum": treeinfo_checksum,
-            "retain_package_versions": repository.retain_package_versions,
-        }
+            if sync_files is None:
+                sync_files = asyncio.get_event_loop().run_until_complete(
+                    download_sync_files(remote, url, repository)
+                )
+            result, downloaded_treeinfo = sync_files
+            if result is None:
+                sync_details = {
+                    key: repository.last_sync_details[key] for key in REPOMD_SYNC_DETAILS
+                }
+            else:
+                repomd = cr.Repomd(result.path)
+                sync_details = {
+                    "revision": repomd.revision,
+                    "repomd_checksum": get_sha256(result.path),
+                    "repomd_checksums": {record.type: record.checksum for record in repomd.records},
+                }
+            treeinfo_file_data = get_treeinfo_data(remote, url, repository, downloaded_treeinfo)
+            sync_details["treeinfo_checksum"] = treeinfo_file_data.get("hash", "")
+
+        fetched_urls = [get_repomd_url(url)]
+        treeinfo_namespace = downloaded_treeinfo[0]
+        if treeinfo_namespace is not None:
+            fetched_urls.append(urlpath_sanitize(url, treeinfo_namespace))
+
+        sync_details.update(
+            {
+                # use the original remote url so that mirrorlists are optimizable
+                "url": remote.url,
+                "download_policy": remote.policy,
+                "sync_policy": sync_policy,
+                "most_recent_version": version.number,
+                "retain_package_versions": repository.retain_package_versions,
+                "skip_types": sorted(skip_types),
+                "validators": {
+                    fetched_url: fetch_cache.validators[fetched_url]
+                    for fetched_url in fetched_urls
+                    if fetch_cache.validators.get(fetched_url)
+                },
+            }
+        )
+        return sync_details
+
+    def update_validators(repository, sync_details):
+        """Store the validators of the files of a skipped sync, for the next one to reuse."""
+        if repository.last_sync_details.get("validators") != sync_details["validators"]:
+            repository.last_sync_details["validators"] = sync_details["validators"]
+            repository.save()
 
     mirror = sync_policy.startswith("mirror")
     mirror_metadata = sync_policy == SYNC_POLICIES.MIRROR_COMPLETE
+    # The index is stored in the working directory of the task, which is cleaned up even if the
+    # sync fails.
+    mirror_index = MirrorIndex() if mirror_metadata else None
 
     repo_sync_config = {}
     # this is the "directory" of the repo within the target repo location - for the primary
@@ -470,12 +1230,17 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
         return directory != PRIMARY_REPO
 
     with tempfile.TemporaryDirectory(dir="."):
-        remote_url = fetch_remote_url(remote, url)
+        remote_urls = fetch_remote_urls(remote, url, fetch_cache, get_validators(repository))
+        remote_url = remote_urls[0]
+        # Artifacts are downloaded from the fastest mirrors, failing over to the others
+        download_mirrors = remote_urls[: max(settings.RPM_SYNC_DOWNLOAD_MIRRORS, 1)]
 
         # Find and set up to deal with any subtrees
-        treeinfo = get_treeinfo_data(remote, remote_url)
+        treeinfo = get_treeinfo_data(remote, remote_url, repository)
         if treeinfo:
             treeinfo["repositories"] = {}
+            sub_repos = []
+            sub_repo_mirrors = {}
             for repodata in set(treeinfo["download"]["repodatas"]):
                 if repodata == DIST_TREE_MAIN_REPO_PATH:
                     treeinfo["repositories"].update({repodata: None})
@@ -488,9 +1253,28 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
                 treeinfo["repositories"].update({directory: str(sub_repo.pk)})
                 path = f"{repodata}/"
                 new_url = urlpath_sanitize(remote_url, path)
+                sub_repos.append((directory, sub_repo, new_url))
+                sub_repo_mirrors[directory] = [
+                    urlpath_sanitize(mirror, path) for mirror in download_mirrors
+                ]
+
+            # Download the files the sync details of the sub-repos depend on concurrently
+            sub_repos_sync_files = run_concurrently(
+                [
+                    download_sync_files(remote, new_url, sub_repo)
+                    for _, sub_repo, new_url in sub_repos
+                ],
+                settings.RPM_SUBREPO_SYNC_CONCURRENCY,
+                return_exceptions=True,
+            )
 
+            for (directory, sub_repo, new_url), sync_files in zip(sub_repos, sub_repos_sync_files):
                 try:
-                    subrepo_sync_details = get_sync_details(remote, new_url, sync_policy, sub_repo)
+                    if isinstance(sync_files, BaseException):
+                        raise sync_files
+                    subrepo_sync_details = get_sync_details(
+                        remote, new_url, sync_policy, sub_repo, sync_files
+                    )
                 except ClientResponseError as exc:
                     if is_subrepo(directory) and exc.status == 404:
                         log.warning("Unable to sync sub-repo '{}' from treeinfo.".format(directory))
@@ -503,6 +1287,7 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
                     ),
                     "sync_details": subrepo_sync_details,
                     "url": new_url,
+                    "mirror_urls": sub_repo_mirrors[directory],
                     "repo": sub_repo,
                 }
 
@@ -512,6 +1297,7 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             "should_skip": should_optimize_sync(sync_details, repository.last_sync_details),
             "sync_details": sync_details,
             "url": remote_url,
+            "mirror_urls": download_mirrors,
             "repo": repository,
         }
 
@@ -523,10 +1309,15 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             ) as pb:
                 pb.done = len(repo_sync_config)
                 pb.total = len(repo_sync_config)
+            for config in repo_sync_config.values():
+                update_validators(config["repo"], config["sync_details"])
+            if mirror_index:
+                mirror_index.close()
             return
 
         skipped_syncs = 0
         repo_sync_results = {}
+        declarative_versions = {}
 
         # If some repos need to be synced and others do not, we go through them all
         # items() returns in insertion-order - make sure PRIMARY is the LAST thing we process
@@ -537,9 +1328,29 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             # publication needs to contain exactly the same metadata at the same paths.
             if not mirror_metadata and optimize and repo_config["should_skip"]:
                 skipped_syncs += 1
+                update_validators(repo, repo_config["sync_details"])
                 repo_sync_results[directory] = repo.latest_version()
                 continue
 
+            # Only the metadata which changed since the previous sync is parsed, the content of
+            # the rest is carried forward from the latest version. Metadata-mirroring needs all of
+            # the metadata.
+            unchanged_metadata = set()
+            carried_content = None
+            if not mirror_metadata and optimize:
+                unchanged_metadata, unchanged_models = get_unchanged_metadata(
+                    repo_config["sync_details"], repo.last_sync_details
+                )
+                if unchanged_models:
+                    log.info(
+                        _("Metadata unchanged since the previous sync, not parsing it: {}").format(
+                            ", ".join(sorted(unchanged_metadata))
+                        )
+                    )
+                    carried_content = repo.latest_version().content.filter(
+                        pulp_type__in=[model.get_pulp_type() for model in unchanged_models]
+                    )
+
             stage = RpmFirstStage(
                 remote,
                 repo,
@@ -547,12 +1358,28 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
                 mirror_metadata,
                 skip_types=skip_types,
                 new_url=repo_config["url"],
+                mirror_urls=repo_config["mirror_urls"],
                 treeinfo=(treeinfo if not is_subrepo(directory) else None),
                 namespace=directory,
+                mirror_index=mirror_index,
+                unchanged_metadata=unchanged_metadata,
+                fetch_cache=fetch_cache,
+            )
+
+            declarative_versions[directory] = RpmDeclarativeVersion(
+                first_stage=stage, repository=repo, mirror=mirror, carried_content=carried_content
             )
 
-            dv = RpmDeclarativeVersion(first_stage=stage, repository=repo, mirror=mirror)
-            repo_version = dv.create() or repo.latest_version()
+        # The pipelines of all the repos run concurrently, the versions of the sub-repos are
+        # finalized before the one of the PRIMARY repo.
+        repo_versions = create_repository_versions(
+            list(declarative_versions.values()), settings.RPM_SUBREPO_SYNC_CONCURRENCY
+        )
+
+        for directory, new_version in zip(declarative_versions, repo_versions):
+            repo_config = repo_sync_config[directory]
+            repo = repo_config["repo"]
+            repo_version = new_version or repo.latest_version()
 
             repo_config["sync_details"]["most_recent_version"] = repo_version.number
             repo.last_sync_details = repo_config["sync_details"]
@@ -572,8 +1399,8 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             repo_sync_results[PRIMARY_REPO], pass_through=False
         ) as publication:
             gpgcheck = repository.repo_config.get("gpgcheck", 0)
-            has_repomd_signature = (
-                "repodata/repomd.xml.asc" in metadata_files_for_mirroring[str(repository.pk)].keys()
+            has_repomd_signature = mirror_index.has_metadata_file(
+                repository, "repodata/repomd.xml.asc"
             )
             repo_gpgcheck = has_repomd_signature and repository.repo_config.get("repo_gpgcheck", 0)
 
@@ -586,24 +1413,102 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             }
 
             for path, repo_version in repo_sync_results.items():
-                add_metadata_to_publication(publication, repo_version, prefix=path)
+                add_metadata_to_publication(publication, repo_version, mirror_index, prefix=path)
+
+        mirror_index.close()
 
     return repo_sync_results[PRIMARY_REPO]
 
 
+def create_repository_versions(declarative_versions, max_concurrent):
+    """
+    Create the repository versions of several declarative versions with concurrent pipelines.
+
+    This is the concurrent counterpart of DeclarativeVersion.create(). The pipelines run in one
+    event loop, at most `max_concurrent` of them at a time, and once they are all done the new
+    versions are finalized in order, the last one last.
+
+    Args:
+        declarative_versions (list): The RpmDeclarativeVersions to create.
+        max_concurrent (int): The maximum number of pipelines running at the same time.
+
+    Returns:
+        list: The created RepositoryVersions, in order, or None for the ones which represent no
+            change from the latest.
+
+    """
+    new_versions = []
+    with tempfile.TemporaryDirectory(dir="."), contextlib.ExitStack() as stack:
+        # the new versions are finalized in the reverse order they are entered in
+        for dv in reversed(declarative_versions):
+            new_versions.insert(0, stack.enter_context(dv.repository.new_version()))
+
+        pipelines = []
+        for dv, new_version in zip(declarative_versions, new_versions):
+            stages = dv.pipeline_stages(new_version)
+            stages.append(ContentAssociation(new_version, dv.mirror))
+            stages.append(EndStage())
+            pipelines.append(create_pipeline(stages))
+
+        run_concurrently(pipelines, max_concurrent)
+
+    return [new_version if new_version.complete else None for new_version in new_versions]
+
+
+class MirroredDeclarativeArtifact(DeclarativeArtifact):
+    """
+    A DeclarativeArtifact whose downloads are spread across the mirrors of the remote.
+
+    The URLs keep the same first mirror, which is stored on the RemoteArtifact, so that resyncs do
+    not rewrite the RemoteArtifacts of existing content. Only the order in which the mirrors are
+    tried for the download is rotated by the given offset.
+    """
+
+    __slots__ = ("mirror_urls", "mirror_offset")
+
+    def __init__(self, *args, mirror_offset=0, **kwargs):
+        """
+        Initialize the artifact.
+
+        Args:
+            mirror_offset (int): The index of the mirror to try first when downloading.
+        """
+        super().__init__(*args, **kwargs)
+        self.mirror_urls = self.urls
+        self.mirror_offset = mirror_offset
+
+    async def download(self):
+        """Download the artifact, trying the mirrors from the offset on."""
+        if self.urls is not self.mirror_urls:
+            # the URLs were replaced, e.g. by an alternate content source which is tried first
+            return await super().download()
+
+        offset = self.mirror_offset % len(self.mirror_urls)
+        self.urls = self.mirror_urls[offset:] + self.mirror_urls[:offset]
+        try:
+            return await super().download()
+        finally:
+            self.urls = self.mirror_urls
+
+
 class RpmDeclarativeVersion(DeclarativeVersion):
     """
     Subclassed Declarative version creates a custom pipeline for RPM sync.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, carried_content=None, **kwargs):
         """
         Adding support for ACS.
 
         Adding it here, because we call RpmDeclarativeVersion multiple times in sync.
+
+        Keyword Args:
+            carried_content (QuerySet): Content of the latest version which is kept without being
+                synced again, because the metadata it was parsed from has not changed.
         """
         kwargs["acs"] = True
         super().__init__(*args, **kwargs)
+        self.carried_content = carried_content
 
     def pipeline_stages(self, new_version):
         """
@@ -635,9 +1540,40 @@ class RpmDeclarativeVersion(DeclarativeVersion):
                 RemoteArtifactSaver(fix_mismatched_remote_artifacts=True),
             ]
         )
+        # Without mirroring, content which is not synced again is kept anyway.
+        if self.mirror and self.carried_content is not None:
+            pipeline.append(RpmCarryForwardContent(self.carried_content))
         return pipeline
 
 
+class RpmCarryForwardContent(Stage):
+    """
+    A stage that passes the content carried forward from the latest version to ContentAssociation.
+
+    When mirroring, ContentAssociation removes all the content it is not passed from the new
+    version. Only the pks of the carried content are needed, it is already saved and related.
+    """
+
+    def __init__(self, content):
+        """
+        Args:
+            content (QuerySet): The content to carry forward.
+        """
+        super().__init__()
+        self.content = content
+
+    async def run(self):
+        """
+        Pass the content of the sync, then the carried content.
+        """
+        async for d_content in self.items():
+            await self.put(d_content)
+
+        pks = await sync_to_async(list)(self.content.values_list("pk", flat=True))
+        for pk in pks:
+            await self.put(DeclarativeContent(content=Content(pk=pk)))
+
+
 class RpmFirstStage(Stage):
     """
     First stage of the Asyncio Stage Pipeline.
@@ -656,6 +1592,10 @@ class RpmFirstStage(Stage):
         new_url=None,
         treeinfo=None,
         namespace="",
+        mirror_index=None,
+        unchanged_metadata=None,
+        fetch_cache=None,
+        mirror_urls=None,
     ):
         """
         The first stage of a pulp_rpm sync pipeline.
@@ -673,6 +1613,14 @@ class RpmFirstStage(Stage):
             new_url(str): URL to replace remote url
             treeinfo(dict): Treeinfo data
             namespace(str): Path where this repo is located relative to some parent repo.
+            mirror_index(MirrorIndex): Index to store the metadata files and package locations
+                in for mirror-publishing.
+            unchanged_metadata(set): Types of repomd records which are neither downloaded nor
+                parsed, because they have not changed since the previous sync.
+            fetch_cache(MetadataFetchCache): Cache of the repomd.xml and treeinfo files already
+                downloaded by the task.
+            mirror_urls(list): URLs of the mirrors to download artifacts from, the URL of the
+                repository first.
 
         """
         super().__init__()
@@ -688,9 +1636,23 @@ class RpmFirstStage(Stage):
         self.namespace_depth = 0 if not namespace else len(namespace.strip("/").split("/"))
 
         self.treeinfo = treeinfo
+        self.mirror_index = mirror_index
         self.skip_types = [] if skip_types is None else skip_types
+        self.unchanged_metadata = set() if unchanged_metadata is None else unchanged_metadata
+        self.fetch_cache = MetadataFetchCache() if fetch_cache is None else fetch_cache
 
         self.remote_url = new_url or self.remote.url
+        self.mirror_urls = mirror_urls or [self.remote_url]
+        self.mirror_rotation = 0
+
+        # Zchunk package metadata is downloaded incrementally, reusing the unchanged chunks of the
+        # file synced the last time. Mirrored metadata is downloaded as-is.
+        self.use_zchunk = (
+            bool(cr.HAS_ZCK)
+            and not mirror_metadata
+            and urlparse(self.remote_url).scheme in ("http", "https")
+        )
+        self.zchunk_artifacts = {}
 
         self.nevra_to_module = defaultdict(dict)
         self.pkgname_to_groups = defaultdict(list)
@@ -714,22 +1676,42 @@ class RpmFirstStage(Stage):
         uinfo = cr.UpdateInfo()
 
         # TODO: handle parsing errors/warnings, warningcb callback can be used
-        cr.xml_parse_updateinfo(updateinfo_xml_path, uinfo)
+        await run_in_thread(cr.xml_parse_updateinfo, updateinfo_xml_path, uinfo)
         return uinfo.updates
 
     async def run(self):
         """Build `DeclarativeContent` from the repodata."""
+        async with EventLoopLagMonitor() as lag_monitor:
+            await self.parse_remote_repository()
+
+        log.info(
+            _("Event loop lag during metadata parsing: mean {mean:.3f}s, max {max:.3f}s").format(
+                mean=lag_monitor.mean_lag, max=lag_monitor.max_lag
+            )
+        )
+        progress_data = {
+            "message": "Maximum Event Loop Lag",
+            "code": "sync.event_loop_lag",
+            "done": round(lag_monitor.max_lag * 1000),
+            "suffix": "ms",
+        }
+        async with ProgressReport(**progress_data) as lag_pb:
+            await lag_pb.asave()
+
+    async def parse_remote_repository(self):
+        """Download the repodata and parse it, the parsing is done outside of the event loop."""
         with tempfile.TemporaryDirectory(dir="."):
             progress_data = dict(
                 message="Downloading Metadata Files", code="sync.downloading.metadata"
             )
             async with ProgressReport(**progress_data) as metadata_pb:
-                # download repomd.xml
-                downloader = self.remote.get_downloader(
-                    url=urlpath_sanitize(self.remote_url, "repodata/repomd.xml")
+                # download repomd.xml, unless it was already downloaded to check for changes
+                result = await self.fetch_cache.fetch(
+                    self.remote, urlpath_sanitize(self.remote_url, "repodata/repomd.xml")
+                )
+                store_metadata_for_mirroring(
+                    self.mirror_index, self.repository, result.path, "repodata/repomd.xml"
                 )
-                result = await downloader.run()
-                store_metadata_for_mirroring(self.repository, result.path, "repodata/repomd.xml")
                 await metadata_pb.aincrement()
 
                 repomd_path = result.path
@@ -757,6 +1739,14 @@ class RpmFirstStage(Stage):
                     | set(MODULAR_REPODATA)
                 )
 
+                zchunk_types = set()
+                if self.use_zchunk:
+                    zchunk_types = {
+                        record.type
+                        for record in repomd.records
+                        if record.type in PACKAGE_ZCK_REPODATA
+                    }
+
                 async def run_repomdrecord_download(name, location_href, downloader):
                     result = await downloader.run()
                     return name, location_href, result
@@ -777,7 +1767,21 @@ class RpmFirstStage(Stage):
                         ):
                             raise ValueError(MIRROR_INCOMPATIBLE_REPO_ERR_MSG)
 
-                    if not self.mirror_metadata and record.type not in types_to_download:
+                    if (
+                        not self.mirror_metadata
+                        and record.type not in types_to_download
+                        and record.type not in zchunk_types
+                    ):
+                        continue
+                    if record.type in self.unchanged_metadata:
+                        continue
+                    if "{}_zck".format(record.type) in zchunk_types:
+                        # the zchunk variant of the file is downloaded instead
+                        continue
+                    if record.type in zchunk_types:
+                        repomd_downloaders[record.type] = asyncio.ensure_future(
+                            self.download_zchunk_metadata(record)
+                        )
                         continue
 
                     base_url = record.location_base or self.remote_url
@@ -795,7 +1799,9 @@ class RpmFirstStage(Stage):
                 try:
                     for future in asyncio.as_completed(list(repomd_downloaders.values())):
                         name, location_href, result = await future
-                        store_metadata_for_mirroring(self.repository, result.path, location_href)
+                        store_metadata_for_mirroring(
+                            self.mirror_index, self.repository, result.path, location_href
+                        )
                         repomd_files[name] = result
                         await metadata_pb.aincrement()
                 except ClientResponseError as exc:
@@ -812,7 +1818,9 @@ class RpmFirstStage(Stage):
                                 silence_errors_for_response_status_codes={403, 404},
                             )
                             result = await downloader.run()
-                            store_metadata_for_mirroring(self.repository, result.path, file_href)
+                            store_metadata_for_mirroring(
+                                self.mirror_index, self.repository, result.path, file_href
+                            )
                             await metadata_pb.aincrement()
                         except (ClientResponseError, FileNotFoundError):
                             pass
@@ -825,7 +1833,7 @@ class RpmFirstStage(Stage):
                         )
                         result = await downloader.run()
                         store_metadata_for_mirroring(
-                            self.repository, result.path, "extra_files.json"
+                            self.mirror_index, self.repository, result.path, "extra_files.json"
                         )
                         await metadata_pb.aincrement()
                     except (ClientResponseError, FileNotFoundError):
@@ -847,7 +1855,10 @@ class RpmFirstStage(Stage):
                                     )
                                     result = await downloader.run()
                                     store_metadata_for_mirroring(
-                                        self.repository, result.path, data["file"]
+                                        self.mirror_index,
+                                        self.repository,
+                                        result.path,
+                                        data["file"],
                                     )
                                     await metadata_pb.aincrement()
                         except ClientResponseError as exc:
@@ -859,13 +1870,169 @@ class RpmFirstStage(Stage):
 
             await self.parse_repository_metadata(repomd, repomd_files)
 
+    def get_previous_metadata_artifact(self, data_type):
+        """
+        Return the artifact of a metadata file of the latest version of the repository, if any.
+
+        Args:
+            data_type (str): The repomd record type of the metadata file.
+        """
+        latest_version = self.repository.latest_version()
+        if latest_version is None:
+            return None
+        metadata_file = RepoMetadataFile.objects.filter(
+            pk__in=latest_version.content, data_type=data_type
+        ).first()
+        if metadata_file is None:
+            return None
+        content_artifact = (
+            metadata_file.contentartifact_set.select_related("artifact__pulp_domain")
+            .exclude(artifact=None)
+            .first()
+        )
+        return content_artifact and content_artifact.artifact
+
+    async def download_zchunk_metadata(self, record):
+        """
+        Download a zchunk package metadata file, fetching only the chunks which changed.
+
+        The whole file is downloaded if there is no previous version of it, or if fetching just
+        the changed chunks fails, e.g. because the server does not support range requests.
+
+        Args:
+            record (createrepo_c.RepomdRecord): The repomd record of the file.
+
+        Returns:
+            tuple: The type of the package metadata, the location of the file and the
+                DownloadResult. The path of the result ends in ".zck", for createrepo_c to detect
+                the compression.
+        """
+        url = urlpath_sanitize(record.location_base or self.remote_url, record.location_href)
+        previous_artifact = await sync_to_async(self.get_previous_metadata_artifact)(record.type)
+
+        artifact = None
+        if previous_artifact is not None and record.size_header:
+            try:
+                artifact = await self.download_zchunk_changes(record, url, previous_artifact)
+            except (
+                ValueError,
+                ClientResponseError,
+                DigestValidationError,
+                SizeValidationError,
+            ) as exc:
+                log.info(
+                    _("Downloading all of {url}, its changed chunks could not be: {exc}").format(
+                        url=url, exc=exc
+                    )
+                )
+
+        if artifact is None:
+            downloader = self.remote.get_downloader(
+                url=url,
+                expected_size=record.size,
+                expected_digests={record.checksum_type: record.checksum},
+            )
+            result = await downloader.run()
+            path = "{}.zck".format(result.path)
+            os.rename(result.path, path)
+            artifact = Artifact(**result.artifact_attributes, file=path)
+
+        self.zchunk_artifacts[record.type] = artifact
+        result = DownloadResult(url=url, artifact_attributes=None, path=artifact.file, headers=None)
+        return record.type[: -len("_zck")], record.location_href, result
+
+    async def download_zchunk_changes(self, record, url, previous_artifact):
+        """
+        Assemble a zchunk file from the previous version of it and the chunks which changed.
+
+        Args:
+            record (createrepo_c.RepomdRecord): The repomd record of the file.
+            url (str): The URL of the file.
+            previous_artifact (Artifact): The previous version of the file.
+
+        Returns:
+            Artifact: The unsaved, validated artifact of the assembled file.
+
+        Raises:
+            ValueError: If the file can not be assembled from the changed chunks.
+        """
+        header_checksum_type = getattr(CHECKSUM_TYPES, record.checksum_header_type.upper())
+        downloader = self.remote.get_downloader(
+            url=url,
+            byte_range=(0, record.size_header - 1),
+            expected_size=record.size_header,
+            expected_digests={header_checksum_type: record.checksum_header},
+        )
+        header_result = await downloader.run()
+        with open(header_result.path, "rb") as header_file:
+            header_data = header_file.read()
+        header = zchunk.ZchunkHeader(header_data)
+
+        def open_previous_file():
+            return previous_artifact.pulp_domain.get_storage().open(previous_artifact.file.name)
+
+        def read_previous_header():
+            with open_previous_file() as previous_file:
+                return zchunk.read_header(previous_file)[1]
+
+        previous_header = await run_in_thread(read_previous_header)
+        previous_chunks = zchunk.reusable_chunks(header, previous_header)
+        ranges = zchunk.missing_ranges(header, previous_chunks, max_gap=ZCHUNK_RANGE_GAP)
+        if len(ranges) > ZCHUNK_MAX_RANGES:
+            raise ValueError(_("{} ranges of the file changed").format(len(ranges)))
+
+        downloaders = [
+            self.remote.get_downloader(
+                url=url, byte_range=(start, end), expected_size=end - start + 1
+            )
+            for start, end in ranges
+        ]
+        results = await asyncio.gather(*[downloader.run() for downloader in downloaders])
+        downloaded_ranges = [
+            (start, end, result.path) for (start, end), result in zip(ranges, results)
+        ]
+
+        def assemble():
+            with open_previous_file() as previous_file, tempfile.NamedTemporaryFile(
+                "wb", dir=".", suffix=".zck", delete=False
+            ) as output:
+                zchunk.assemble(
+                    header_data, header, previous_file, previous_chunks, downloaded_ranges, output
+                )
+            return output.name
+
+        path = await run_in_thread(assemble)
+        log.info(
+            _("Downloaded {ranges} changed ranges of {url} instead of the whole file.").format(
+                ranges=len(ranges), url=url
+            )
+        )
+        return await run_in_thread(
+            partial(
+                Artifact.init_and_validate,
+                path,
+                expected_digests={record.checksum_type: record.checksum},
+                expected_size=record.size,
+            )
+        )
+
     async def parse_distribution_tree(self):
         """Parse content from the file treeinfo if present."""
         if self.treeinfo:
+            treeinfo_url = urlpath_sanitize(self.remote_url, self.treeinfo["filename"])
+            # The file was already fetched to find the sub-repos, reuse it, or the existing artifact
+            # if it has not been modified since the previous sync.
+            treeinfo_result = self.fetch_cache.get(treeinfo_url)
+            if treeinfo_result is not None:
+                treeinfo_artifact = Artifact(
+                    **treeinfo_result.artifact_attributes, file=treeinfo_result.path
+                )
+            else:
+                treeinfo_artifact = Artifact(sha256=self.treeinfo["hash"])
             d_artifacts = [
                 DeclarativeArtifact(
-                    artifact=Artifact(),
-                    url=urlpath_sanitize(self.remote_url, self.treeinfo["filename"]),
+                    artifact=treeinfo_artifact,
+                    url=treeinfo_url,
                     relative_path=".treeinfo",
                     remote=self.remote,
                     deferred_download=False,
@@ -873,13 +2040,7 @@ class RpmFirstStage(Stage):
             ]
             for path, checksum in self.treeinfo["download"]["images"].items():
                 artifact = Artifact(**checksum)
-                da = DeclarativeArtifact(
-                    artifact=artifact,
-                    url=urlpath_sanitize(self.remote_url, path),
-                    relative_path=path,
-                    remote=self.remote,
-                    deferred_download=self.deferred_download,
-                )
+                da = self.mirror_artifact(artifact, path, path)
                 d_artifacts.append(da)
 
             tree_digest = f'{self.treeinfo["hash"]}-{self.repository.pulp_id}'
@@ -891,7 +2052,10 @@ class RpmFirstStage(Stage):
 
     async def parse_repository_metadata(self, repomd, metadata_results):
         """Parse repository metadata."""
-        needed_metadata = set(PACKAGE_REPODATA) - set(metadata_results.keys())
+        packages_unchanged = self.unchanged_metadata.issuperset(PACKAGE_REPODATA)
+        needed_metadata = set()
+        if not packages_unchanged:
+            needed_metadata = set(PACKAGE_REPODATA) - set(metadata_results.keys())
 
         if needed_metadata:
             raise FileNotFoundError(
@@ -916,12 +2080,13 @@ class RpmFirstStage(Stage):
             (modulemd_dcs, modulemd_list) = await self.parse_modules_metadata(modulemd_result)
 
         # **Now** we can successfully parse package-metadata
-        await self.parse_packages(
-            metadata_results["primary"],
-            metadata_results["filelists"],
-            metadata_results["other"],
-            modulemd_list=modulemd_list,
-        )
+        if not packages_unchanged:
+            await self.parse_packages(
+                metadata_results["primary"],
+                metadata_results["filelists"],
+                metadata_results["other"],
+                modulemd_list=modulemd_list,
+            )
 
         groups_list = []
         comps_result = metadata_results.get("group", None)
@@ -950,8 +2115,11 @@ class RpmFirstStage(Stage):
         for record in repomd.records:
             should_skip = False
             if record.type not in record_types:
+                # zchunk package metadata is kept for the next sync to download only the chunks
+                # which changed
+                keep_zchunk = self.use_zchunk and record.type in PACKAGE_ZCK_REPODATA
                 for suffix in ["_zck", "_gz", "_xz"]:
-                    if suffix in record.type:
+                    if suffix in record.type and not keep_zchunk:
                         should_skip = True
                 if record.type in RepoMetadataFile.UNSUPPORTED_METADATA:
                     should_skip = True
@@ -961,8 +2129,9 @@ class RpmFirstStage(Stage):
 
                 sanitized_checksum_type = getattr(CHECKSUM_TYPES, record.checksum_type.upper())
                 file_data = {sanitized_checksum_type: record.checksum, "size": record.size}
+                artifact = self.zchunk_artifacts.get(record.type) or Artifact(**file_data)
                 da = DeclarativeArtifact(
-                    artifact=Artifact(**file_data),
+                    artifact=artifact,
                     url=urlpath_sanitize(self.remote_url, record.location_href),
                     relative_path=record.location_href,
                     remote=self.remote,
@@ -984,7 +2153,9 @@ class RpmFirstStage(Stage):
         Args:
             modulemd_result(pulpcore.download.base.DownloadResult): downloaded modulemd file
         """
-        modulemd_all, defaults_all, obsoletes_all = parse_modular(modulemd_result.path)
+        modulemd_all, defaults_all, obsoletes_all = await run_in_thread(
+            parse_modular, modulemd_result.path
+        )
 
         modulemd_dcs = []
 
@@ -1061,12 +2232,16 @@ class RpmFirstStage(Stage):
         dc_environments = []
         dc_groups = []
 
-        comps = libcomps.Comps()
-        with tempfile.TemporaryDirectory(dir=".") as tf:
-            decompressed_path = os.path.join(tf, "comps.xml")
-            cr.decompress_file(comps_result.path, decompressed_path, cr.AUTO_DETECT_COMPRESSION)
-            with open(decompressed_path) as f:
-                comps.fromxml_str(f.read())
+        def parse_comps():
+            comps = libcomps.Comps()
+            with tempfile.TemporaryDirectory(dir=".") as tf:
+                decompressed_path = os.path.join(tf, "comps.xml")
+                cr.decompress_file(comps_result.path, decompressed_path, cr.AUTO_DETECT_COMPRESSION)
+                with open(decompressed_path) as f:
+                    comps.fromxml_str(f.read())
+            return comps
+
+        comps = await run_in_thread(parse_comps)
 
         async with ProgressReport(message="Parsed Comps", code="sync.parsing.comps") as comps_pb:
             comps_total = len(comps.groups) + len(comps.categories) + len(comps.environments)
@@ -1163,8 +2338,6 @@ class RpmFirstStage(Stage):
 
         # skip SRPM if defined
         skip_srpms = "srpm" in self.skip_types
-        nevras = set()
-        checksums = set()
         modular_artifact_nevras = set()
         pkgid_warning_triggered = False
         nevra_warning_triggered = False
@@ -1176,24 +2349,37 @@ class RpmFirstStage(Stage):
             if modulemd[PULP_MODULE_ATTR.ARTIFACTS]:
                 modular_artifact_nevras |= set(modulemd[PULP_MODULE_ATTR.ARTIFACTS])
 
-        package_skip_nevras = set()
+        # To keep the memory footprint small for large repositories, every distinct NEVRA gets an
+        # integer id and everything else is tracked per id or per position in primary.xml.
+        nevra_ids = {}
+        # hashes of the pkgIds, only used to detect duplicates
+        pkgid_hashes = set()
+        # NEVRA ids, pkgIds and locations of the packages, by position in primary.xml. The base
+        # URLs of the locations are rare, they are kept by position only if set.
+        package_nevra_ids = array.array("q")
+        package_pkgids = []
+        package_location_hrefs = []
+        package_location_bases = {}
+        # ids of the checksum types of the packages, by position in primary.xml
+        checksum_type_ids = {}
+        package_checksum_type_ids = bytearray()
+        # duplicate NEVRA tiebreaker - if we have multiple packages with the same nevra then
+        # we might want to pick the latest based on the build time.
+        package_build_times = array.array("q")
+        latest_build_time_by_nevra_id = array.array("q")
+        # NEVRA ids for which all packages are skipped
+        skip_nevra_ids = bytearray()
         # The repository can contain packages of arbitrary arches, and they are not comparable.
         # {"x86_64": {"glibc": [...]}, "i686": {"glibc": [...], "src": {"glibc": [...]}}
         latest_packages_by_arch_and_name = defaultdict(lambda: defaultdict(list))
-        # duplicate NEVRA tiebreaker - if we have multiple packages with the same nevra then
-        # we might want to pick the latest based on the build time.
-        latest_build_time_by_nevra = {}
 
         # Perform various checks and potentially filter out unwanted packages
         # We parse all of primary.xml first and fail fast if something is wrong.
-        # Collect a list of any package nevras() we don't want to include.
+        # Collect the ids of any package nevras() we don't want to include.
         def verification_and_skip_callback(pkg):
             nonlocal pkgid_warning_triggered
             nonlocal nevra_warning_triggered
-            nonlocal package_skip_nevras
-            nonlocal latest_packages_by_arch_and_name
             nonlocal total_packages
-            nonlocal latest_build_time_by_nevra
             nonlocal skipped_packages
 
             WARN_MSG = _(
@@ -1205,9 +2391,11 @@ class RpmFirstStage(Stage):
 
             total_packages += 1
             pkg_nevra = pkg.nevra()
+            pkgid_hash = hash(pkg.pkgId)
 
-            duplicate_nevra = pkg_nevra in nevras
-            duplicate_pkgid = pkg.pkgId in checksums
+            nevra_id = nevra_ids.get(pkg_nevra)
+            duplicate_nevra = nevra_id is not None
+            duplicate_pkgid = pkgid_hash in pkgid_hashes
 
             # Check for packages with duplicate pkgids
             if not pkgid_warning_triggered and duplicate_pkgid:
@@ -1222,11 +2410,23 @@ class RpmFirstStage(Stage):
             # rejected. This matches what DNF ought to do, and should prevent Pulp from ever
             # publishing the repo with multiple packages sharing the same path. Only one can win
             # so let's make sure it's the one that clients will pick.
-            latest_build_time_by_nevra[pkg_nevra] = max(
-                pkg.time_build, latest_build_time_by_nevra.get(pkg_nevra, 0)
+            if not duplicate_nevra:
+                nevra_id = len(latest_build_time_by_nevra_id)
+                nevra_ids[pkg_nevra] = nevra_id
+                latest_build_time_by_nevra_id.append(pkg.time_build)
+                skip_nevra_ids.append(False)
+            elif pkg.time_build > latest_build_time_by_nevra_id[nevra_id]:
+                latest_build_time_by_nevra_id[nevra_id] = pkg.time_build
+            pkgid_hashes.add(pkgid_hash)
+            package_nevra_ids.append(nevra_id)
+            package_build_times.append(pkg.time_build)
+            package_pkgids.append(pkg.pkgId)
+            package_location_hrefs.append(pkg.location_href)
+            if pkg.location_base:
+                package_location_bases[len(package_pkgids) - 1] = pkg.location_base
+            package_checksum_type_ids.append(
+                checksum_type_ids.setdefault(pkg.checksum_type, len(checksum_type_ids))
             )
-            nevras.add(pkg_nevra)
-            checksums.add(pkg.pkgId)
 
             # Check that all packages are within the root of the repo (if in mirror_complete mode).
             # We can't allow mirroring metadata that references packages outside of the repo
@@ -1240,7 +2440,7 @@ class RpmFirstStage(Stage):
 
             # Add any srpms to the skip set if specified
             if skip_srpms and pkg.arch == "src":
-                package_skip_nevras.add(pkg_nevra)
+                skip_nevra_ids[nevra_id] = True
                 skipped_packages += 1
             # Take into account duplicate NEVRA - only one will be synced
             elif duplicate_nevra:
@@ -1253,11 +2453,12 @@ class RpmFirstStage(Stage):
             # newer modular packages existing.
             if self.repository.retain_package_versions and pkg_nevra not in modular_artifact_nevras:
                 pkg_evr = RpmVersion(pkg.epoch, pkg.version, pkg.release)
-                latest_packages_by_arch_and_name[pkg.arch][pkg.name].append((pkg_evr, pkg_nevra))
+                latest_packages_by_arch_and_name[pkg.arch][pkg.name].append((pkg_evr, nevra_id))
 
         # Ew, callback-based API, gross. The streaming API doesn't support optionally
         # specifying particular files yet so we have to use the old way.
-        parser.for_each_pkg_primary(verification_and_skip_callback)
+        await run_in_thread(parser.for_each_pkg_primary, verification_and_skip_callback)
+        pkgid_hashes.clear()
 
         # Go through the package lists, sort them descending by EVR, ignore the first N and then
         # add the remaining ones to the skip list.
@@ -1265,11 +2466,82 @@ class RpmFirstStage(Stage):
             for name, versions in packages.items():
                 versions.sort(key=lambda p: p[0], reverse=True)
                 for pkg in versions[self.repository.retain_package_versions :]:
-                    (evr, nevra) = pkg
-                    package_skip_nevras.add(nevra)
+                    (evr, nevra_id) = pkg
+                    skip_nevra_ids[nevra_id] = True
                     skipped_packages += 1
 
-        del latest_packages_by_arch_and_name
+        latest_packages_by_arch_and_name.clear()
+
+        # Packages are skipped by pkgId while iterating over the full metadata, so that the
+        # filelists and changelogs of skipped packages are never loaded. Packages sharing a pkgId
+        # are the same file, if any of them is wanted it is not skipped.
+        skip_pkgids = set()
+        keep_pkgids = set()
+        for nevra_id, build_time, pkgid in zip(
+            package_nevra_ids, package_build_times, package_pkgids
+        ):
+            # Skip over packages (retention feature, skip_types feature)
+            # Same heuristic as DNF / Yum / Zypper - in the event we encounter multiple package
+            # entries with the same NEVRA, pick the one with the larger build time
+            if skip_nevra_ids[nevra_id] or build_time != latest_build_time_by_nevra_id[nevra_id]:
+                skip_pkgids.add(pkgid)
+            else:
+                keep_pkgids.add(pkgid)
+        skip_pkgids -= keep_pkgids
+
+        # On resync most of the packages are usually known to Pulp already. Building them from the
+        # full metadata would be wasted work, the pipeline replaces them with the saved packages.
+        # They are looked up by pkgId, and only their location, recorded by the verification pass,
+        # is used.
+        known_field_names, known_packages = await sync_to_async(get_known_packages)(keep_pkgids)
+        del keep_pkgids
+        del package_build_times[:]
+        del latest_build_time_by_nevra_id[:]
+        skip_nevra_ids.clear()
+
+        # (pkgId, location_base, location_href) of every entry of a known package in primary.xml
+        known_locations = []
+        if known_packages:
+            nevra_indices = [
+                known_field_names.index(name)
+                for name in ("name", "epoch", "version", "release", "arch")
+            ]
+            checksum_type_index = known_field_names.index("checksum_type")
+            checksum_types = {
+                checksum_type_id: getattr(CHECKSUM_TYPES, checksum_type.upper(), None)
+                for checksum_type, checksum_type_id in checksum_type_ids.items()
+            }
+            for position, pkgid in enumerate(package_pkgids):
+                values = known_packages.get(pkgid)
+                if values is None:
+                    continue
+                # The same pkgId with a different NEVRA is broken metadata, such packages are
+                # built from the full metadata like new ones and saving them sorts it out.
+                name, epoch, version, release, arch = (values[i] for i in nevra_indices)
+                nevra = format_nevra(name, epoch or "0", version, release, arch)
+                if (
+                    nevra_ids.get(nevra) != package_nevra_ids[position]
+                    or checksum_types[package_checksum_type_ids[position]]
+                    != values[checksum_type_index]
+                ):
+                    del known_packages[pkgid]
+                    continue
+                known_locations.append(
+                    (pkgid, package_location_bases.get(position), package_location_hrefs[position])
+                )
+            skip_pkgids.update(known_packages)
+            log.info(
+                "{} packages are already known, skipping their full metadata".format(
+                    len(known_packages)
+                )
+            )
+
+        nevra_ids.clear()
+        del package_nevra_ids[:]
+        package_pkgids.clear()
+        package_location_hrefs.clear()
+        package_location_bases.clear()
+        del package_checksum_type_ids[:]
 
         if skipped_packages:
             msg = (
@@ -1293,52 +2565,109 @@ class RpmFirstStage(Stage):
             "total": total_packages,
         }
         async with ProgressReport(**progress_data) as packages_pb:
-            for pkg in parser.as_iterator():
-                pkg_nevra = pkg.nevra()
-                # Skip over packages (retention feature, skip_types feature)
-                if package_skip_nevras and pkg_nevra in package_skip_nevras:
-                    continue
-                # Same heuristic as DNF / Yum / Zypper - in the event we encounter multiple package
-                # entries with the same NEVRA, pick the one with the larger build time
-                elif pkg.time_build != latest_build_time_by_nevra[pkg_nevra]:
+            for pkgid, location_base, location_href in known_locations:
+                values = known_packages.get(pkgid)
+                if values is None:
                     continue
-                # Implicit: There can be multiple package entries that are completely identical
-                # (same NEVRA, same build time, same checksum / pkgid) and the same or different
-                # location_href. We're not explicitly handling this, the pipeline will deduplicate.
-                package = Package(**Package.createrepo_to_dict(pkg))
-                base_url = pkg.location_base or self.remote_url
-                url = urlpath_sanitize(base_url, package.location_href)
-                del pkg  # delete it as soon as we're done with it
-
-                store_package_for_mirroring(self.repository, package.pkgId, package.location_href)
-                artifact = Artifact(size=package.size_package)
-                checksum_type = getattr(CHECKSUM_TYPES, package.checksum_type.upper())
-                setattr(artifact, checksum_type, package.pkgId)
-                filename = os.path.basename(package.location_href)
-                da = DeclarativeArtifact(
-                    artifact=artifact,
-                    url=url,
-                    relative_path=filename,
-                    remote=self.remote,
-                    deferred_download=self.deferred_download,
-                )
-                dc = DeclarativeContent(content=package, d_artifacts=[da])
-                dc.extra_data = defaultdict(list)
+                package = Package.from_db(DEFAULT_DB_ALIAS, known_field_names, values)
+                dc = self.package_to_declarative_content(package, location_base, location_href)
+                await packages_pb.aincrement()
+                await self.put(dc)
 
-                # find if a package relates to a modulemd
-                if dc.content.nevra in self.nevra_to_module.keys():
-                    dc.content.is_modular = True
-                    for dc_modulemd in self.nevra_to_module[dc.content.nevra]:
-                        dc.extra_data["modulemd_relation"].append(dc_modulemd)
-                        dc_modulemd.extra_data["package_relation"].append(dc)
+            known_locations.clear()
+            known_packages.clear()
+
+            def iterate_packages():
+                for pkg in parser.as_iterator(skip_pkgids=skip_pkgids):
+                    # Implicit: There can be multiple package entries that are completely identical
+                    # (same NEVRA, same build time, same checksum / pkgid) and the same or
+                    # different location_href. We're not explicitly handling this, the pipeline
+                    # will deduplicate.
+                    package = Package(**Package.createrepo_to_dict(pkg))
+                    yield package, pkg.location_base
+                    del pkg  # delete it as soon as we're done with it
+
+            # The packages are parsed and built in a separate thread, which is kept only a few
+            # batches ahead of the pipeline.
+            packages = iterate_in_thread(iterate_packages)
+            try:
+                async for package, location_base in packages:
+                    dc = self.package_to_declarative_content(
+                        package, location_base, package.location_href
+                    )
+                    await packages_pb.aincrement()  # TODO: don't do this for every package
+                    await self.put(dc)
+            finally:
+                await packages.aclose()
 
-                if dc.content.name in self.pkgname_to_groups.keys():
-                    for dc_group in self.pkgname_to_groups[dc.content.name]:
-                        dc.extra_data["group_relations"].append(dc_group)
-                        dc_group.extra_data["related_packages"].append(dc)
+        log.info(
+            _("Parsed {total} packages, peak memory usage of the sync task: {rss} kB").format(
+                total=total_packages, rss=getrusage(RUSAGE_SELF).ru_maxrss
+            )
+        )
 
-                await packages_pb.aincrement()  # TODO: don't do this for every individual package
-                await self.put(dc)
+    def mirror_artifact(self, artifact, path, relative_path, urls=None):
+        """
+        Create the DeclarativeArtifact of an artifact which is downloaded from the mirrors.
+
+        The fastest mirror is listed first, it is the one kept for downloading on demand.
+        Immediate downloads are spread across the mirrors in turn and fail over to the other
+        mirrors.
+
+        Args:
+            artifact (Artifact): The artifact.
+            path (str): The path of the artifact relative to the repository.
+            relative_path (str): The path the artifact is published at.
+            urls (list): The URLs to download the artifact from, if not the mirrors.
+        """
+        if urls is None:
+            urls = [urlpath_sanitize(mirror_url, path) for mirror_url in self.mirror_urls]
+        self.mirror_rotation += 1
+        return MirroredDeclarativeArtifact(
+            artifact=artifact,
+            urls=urls,
+            relative_path=relative_path,
+            remote=self.remote,
+            deferred_download=self.deferred_download,
+            mirror_offset=self.mirror_rotation - 1,
+        )
+
+    def package_to_declarative_content(self, package, location_base, location_href):
+        """Create the DeclarativeContent of a package and relate it to its modules and groups.
+
+        Args:
+            package (Package): The package, either new or already saved
+            location_base (str): The base URL of the package in the remote metadata, if any
+            location_href (str): The location of the package in the remote metadata
+        """
+        urls = None
+        if location_base:
+            urls = [urlpath_sanitize(location_base, location_href)]
+
+        store_package_for_mirroring(
+            self.mirror_index, self.repository, package.pkgId, location_href
+        )
+        artifact = Artifact(size=package.size_package)
+        checksum_type = getattr(CHECKSUM_TYPES, package.checksum_type.upper())
+        setattr(artifact, checksum_type, package.pkgId)
+        filename = os.path.basename(location_href)
+        da = self.mirror_artifact(artifact, location_href, filename, urls=urls)
+        dc = DeclarativeContent(content=package, d_artifacts=[da])
+        dc.extra_data = defaultdict(list)
+
+        # find if a package relates to a modulemd
+        if dc.content.nevra in self.nevra_to_module.keys():
+            dc.content.is_modular = True
+            for dc_modulemd in self.nevra_to_module[dc.content.nevra]:
+                dc.extra_data["modulemd_relation"].append(dc_modulemd)
+                dc_modulemd.extra_data["package_relation"].append(dc)
+
+        if dc.content.name in self.pkgname_to_groups.keys():
+            for dc_group in self.pkgname_to_groups[dc.content.name]:
+                dc.extra_data["group_relations"].append(dc_group)
+                dc_group.extra_data["related_packages"].append(dc)
+
+        return dc
 
     async def parse_advisories(self, result):
         """Parse advisories from the remote repository."""
@@ -1352,26 +2681,39 @@ class RpmFirstStage(Stage):
         }
         async with ProgressReport(**progress_data) as advisories_pb:
             for update in updates:
-                update_record = UpdateRecord(**UpdateRecord.createrepo_to_dict(update))
+                update_record_dict = UpdateRecord.createrepo_to_dict(update)
+                update_record = UpdateRecord(**update_record_dict)
                 update_record.pulp_domain = get_domain()
-                update_record.digest = hash_update_record(update)
                 future_relations = {"collections": defaultdict(list), "references": []}
+                # the digest is computed from the parsed fields
+                digest_collections = []
+                digest_references = []
 
                 for collection in update.collections:
                     coll_dict = UpdateCollection.createrepo_to_dict(collection)
                     if coll_dict["name"] is None:
-                        coll_dict["name"] = "collection-autofill-" + uuid.uuid4().hex[:12]
+                        coll_dict["name"] = (
+                            AUTOFILLED_COLLECTION_NAME_PREFIX + uuid.uuid4().hex[:12]
+                        )
                     coll = UpdateCollection(**coll_dict)
+                    pkg_dicts = []
 
                     for package in collection.packages:
                         pkg_dict = UpdateCollectionPackage.createrepo_to_dict(package)
                         pkg = UpdateCollectionPackage(**pkg_dict)
                         future_relations["collections"][coll].append(pkg)
+                        pkg_dicts.append(pkg_dict)
+                    digest_collections.append((coll_dict, pkg_dicts))
 
                 for reference in update.references:
                     reference_dict = UpdateReference.createrepo_to_dict(reference)
                     ref = UpdateReference(**reference_dict)
                     future_relations["references"].append(ref)
+                    digest_references.append(reference_dict)
+
+                update_record.digest = update_record_digest(
+                    update_record_dict, digest_collections, digest_references
+                )
 
                 await advisories_pb.aincrement()
                 dc = DeclarativeContent(content=update_record)
@@ -1502,7 +2844,27 @@ class RpmContentSaver(ContentSaver):
         update_collection_to_save = []
         update_references_to_save = []
         update_collection_packages_to_save = []
-        seen_updaterecords = []
+        seen_updaterecords = set()
+
+        # existing content which was retrieved from the db at earlier stages already has its
+        # relations, find it with a single query for the whole batch
+        update_record_pks = [
+            declarative_content.content.pk
+            for declarative_content in batch
+            if declarative_content is not None
+            and isinstance(declarative_content.content, UpdateRecord)
+        ]
+        update_records_with_relations = set()
+        if update_record_pks:
+            update_records_with_relations = set(
+                UpdateCollection.objects.filter(update_record__in=update_record_pks)
+                .values_list("update_record", flat=True)
+                .union(
+                    UpdateReference.objects.filter(update_record__in=update_record_pks).values_list(
+                        "update_record", flat=True
+                    )
+                )
+            )
 
         for declarative_content in batch:
             if declarative_content is None:
@@ -1514,11 +2876,7 @@ class RpmContentSaver(ContentSaver):
             elif isinstance(declarative_content.content, UpdateRecord):
                 update_record = declarative_content.content
 
-                relations_exist = (
-                    update_record.collections.count() or update_record.references.count()
-                )
-                if relations_exist:
-                    # existing content which was retrieved from the db at earlier stages
+                if update_record.pk in update_records_with_relations:
                     continue
 
                 # if there are same update_records in a batch, the relations to the references
@@ -1527,7 +2885,7 @@ class RpmContentSaver(ContentSaver):
                 # It can happen easily during pulp 2to3 migration, or in case of a bad repo.
                 if update_record.digest in seen_updaterecords:
                     continue
-                seen_updaterecords.append(update_record.digest)
+                seen_updaterecords.add(update_record.digest)
 
                 future_relations = declarative_content.extra_data
                 update_collections = future_relations.get("collections", {})
@@ -1,16 +1,24 @@
 from django_filters import CharFilter
+from drf_spectacular.utils import extend_schema
+from rest_framework import viewsets
 
+from pulpcore.plugin.models import PulpTemporaryFile
+from pulpcore.plugin.serializers import AsyncOperationResponseSerializer
+from pulpcore.plugin.tasking import dispatch
 from pulpcore.plugin.viewsets import (
     ContentFilter,
+    OperationPostponedResponse,
     SingleArtifactContentUploadViewSet,
 )
 
+from pulp_rpm.app import tasks
 from pulp_rpm.app.models import (
     Package,
 )
 from pulp_rpm.app.serializers import (
     MinimalPackageSerializer,
     PackageSerializer,
+    PackageUploadSerializer,
 )
 
 
@@ -71,3 +79,62 @@ class PackageViewSet(SingleArtifactContentUploadViewSet):
         ],
         "queryset_scoping": {"function": "scope_queryset"},
     }
+
+
+class PackageUploadViewSet(viewsets.ViewSet):
+    """
+    ViewSet for uploading many RPMs at once.
+    """
+
+    DEFAULT_ACCESS_POLICY = {
+        "statements": [
+            {
+                "action": ["create"],
+                "principal": "authenticated",
+                "effect": "allow",
+                "condition": [
+                    "has_required_repo_perms_on_upload:rpm.modify_content_rpmrepository",
+                    "has_required_repo_perms_on_upload:rpm.view_rpmrepository",
+                ],
+            },
+        ],
+    }
+
+    @extend_schema(
+        description=(
+            "Trigger an asynchronous task to create packages from many RPMs, or from a tar "
+            "archive of RPMs, and add them to a repository in a single repository version."
+        ),
+        summary="Upload RPMs",
+        operation_id="rpm_packages_upload",
+        request=PackageUploadSerializer,
+        responses={202: AsyncOperationResponseSerializer},
+    )
+    def create(self, request):
+        """Upload RPM files and create Packages from them."""
+        serializer = PackageUploadSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+
+        # Store the uploads as files we can find/use from our task
+        temp_file_pks = []
+        for file_content in serializer.validated_data.get("files", []):
+            temp_file = PulpTemporaryFile.init_and_validate(file_content)
+            temp_file.save()
+            temp_file_pks.append(str(temp_file.pk))
+        archive_pk = None
+        if serializer.validated_data.get("archive"):
+            temp_file = PulpTemporaryFile.init_and_validate(serializer.validated_data["archive"])
+            temp_file.save()
+            archive_pk = str(temp_file.pk)
+
+        # Lock destination-repo if we are given one so two uploads can't collide
+        repository = serializer.validated_data.get("repository", None)
+        repo_pk = str(repository.pk) if repository else None
+
+        task = dispatch(
+            tasks.upload_packages,
+            exclusive_resources=[repository] if repository else [],
+            args=(temp_file_pks, archive_pk, repo_pk),
+            kwargs={},
+        )
+        return OperationPostponedResponse(task, request)
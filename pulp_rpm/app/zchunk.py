@@ -0,0 +1,283 @@
+"""
+Reading zchunk files, to download only the chunks of metadata which changed since the last sync.
+
+A zchunk file consists of a header, indexing the checksums and lengths of its chunks, followed by
+the chunks. Chunks which are identical in two versions of a file have the same checksum, so a new
+version can be assembled from the chunks of the previous one plus the ones which changed.
+
+See https://github.com/zchunk/zchunk/blob/main/zchunk_format.txt
+"""
+
+import hashlib
+from collections import namedtuple
+from gettext import gettext as _
+
+ZCK_MAGIC = b"\0ZCK1"
+
+# checksum type id: (hashlib name, digest size)
+ZCK_CHECKSUM_TYPES = {
+    0: ("sha1", 20),
+    1: ("sha256", 32),
+    2: ("sha512", 64),
+    3: ("sha512", 16),  # sha512, truncated to 128 bits
+}
+
+ZCK_FLAG_HAS_STREAMS = 1
+ZCK_FLAG_HAS_OPTIONAL_ELEMENTS = 2
+ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS = 4
+
+# A compressed int takes at most 10 bytes, the longest checksum 64.
+ZCK_MAX_LEAD_SIZE = len(ZCK_MAGIC) + 2 * 10 + 64
+
+ZchunkChunk = namedtuple("ZchunkChunk", ["checksum", "offset", "length"])
+
+
+class ZchunkError(ValueError):
+    """
+    Raised when a file is not a zchunk file, or uses features which are not supported.
+    """
+
+
+def read_int(data, pos):
+    """
+    Read a compressed int of a zchunk header.
+
+    The int is stored in little-endian groups of 7 bits, the high bit marks the last byte.
+
+    Returns:
+        tuple: The value, and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ZchunkError(_("The zchunk header is truncated."))
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ZchunkError(_("Invalid integer in the zchunk header."))
+
+
+def read_checksum_type(data, pos):
+    """
+    Read the id of a checksum type from a zchunk header.
+
+    Returns:
+        tuple: The checksum type id, and the position after it.
+    """
+    checksum_type, pos = read_int(data, pos)
+    if checksum_type not in ZCK_CHECKSUM_TYPES:
+        raise ZchunkError(_("Unsupported zchunk checksum type: {}").format(checksum_type))
+    return checksum_type, pos
+
+
+def checksum_digest(checksum_type, data=b""):
+    """Return a hashlib object for a zchunk checksum type."""
+    return hashlib.new(ZCK_CHECKSUM_TYPES[checksum_type][0], data)
+
+
+def header_size(data):
+    """
+    Return the size of the lead and the header of a zchunk file, read from the lead.
+
+    Args:
+        data (bytes): The beginning of a zchunk file, including at least the whole lead.
+    """
+    if not data.startswith(ZCK_MAGIC):
+        raise ZchunkError(_("Not a zchunk file."))
+    checksum_type, pos = read_checksum_type(data, len(ZCK_MAGIC))
+    size, pos = read_int(data, pos)
+    return pos + ZCK_CHECKSUM_TYPES[checksum_type][1] + size
+
+
+class ZchunkHeader:
+    """
+    The header of a zchunk file.
+
+    Attributes:
+        size (int): The size of the lead and the header, the offset of the first chunk.
+        chunk_checksum_type (int): The zchunk id of the checksum type of the chunks.
+        chunks (list): The ZchunkChunks of the file, in order, starting with the dictionary.
+    """
+
+    def __init__(self, data):
+        """
+        Parse the header and verify its checksum.
+
+        Args:
+            data (bytes): The beginning of a zchunk file, including at least the whole header.
+
+        Raises:
+            ZchunkError: If the data is not a valid zchunk header.
+        """
+        self.size = header_size(data)
+        if len(data) < self.size:
+            raise ZchunkError(_("The zchunk header is truncated."))
+        data = data[: self.size]
+
+        # lead
+        checksum_type, pos = read_checksum_type(data, len(ZCK_MAGIC))
+        _size, pos = read_int(data, pos)
+        checksum_size = ZCK_CHECKSUM_TYPES[checksum_type][1]
+        header_checksum = data[pos : pos + checksum_size]
+        digest = checksum_digest(checksum_type, data[:pos])
+        pos += checksum_size
+        digest.update(data[pos:])
+        if digest.digest()[:checksum_size] != header_checksum:
+            raise ZchunkError(_("The checksum of the zchunk header does not match."))
+
+        # preface
+        pos += checksum_size  # data checksum
+        flags, pos = read_int(data, pos)
+        if flags & ~(ZCK_FLAG_HAS_OPTIONAL_ELEMENTS | ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS):
+            raise ZchunkError(_("Unsupported zchunk flags: {}").format(flags))
+        _compression_type, pos = read_int(data, pos)
+        if flags & ZCK_FLAG_HAS_OPTIONAL_ELEMENTS:
+            count, pos = read_int(data, pos)
+            for _i in range(count):
+                _element_type, pos = read_int(data, pos)
+                element_size, pos = read_int(data, pos)
+                pos += element_size
+
+        # index
+        index_size, pos = read_int(data, pos)
+        index_end = pos + index_size
+        self.chunk_checksum_type, pos = read_checksum_type(data, pos)
+        chunk_checksum_size = ZCK_CHECKSUM_TYPES[self.chunk_checksum_type][1]
+        # the checksum of the uncompressed chunk follows the one of the compressed chunk
+        entry_checksum_size = chunk_checksum_size
+        if flags & ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS:
+            entry_checksum_size *= 2
+        count, pos = read_int(data, pos)
+        self.chunks = []
+        offset = self.size
+        for _i in range(count):
+            checksum = data[pos : pos + chunk_checksum_size]
+            pos += entry_checksum_size
+            length, pos = read_int(data, pos)
+            _uncompressed_length, pos = read_int(data, pos)
+            self.chunks.append(ZchunkChunk(checksum, offset, length))
+            offset += length
+        if pos != index_end:
+            raise ZchunkError(_("The size of the zchunk index does not match."))
+
+    @property
+    def file_size(self):
+        """The size of the whole zchunk file."""
+        return self.size + sum(chunk.length for chunk in self.chunks)
+
+
+def read_header(fileobj):
+    """
+    Read the header of a zchunk file.
+
+    Args:
+        fileobj: A zchunk file opened in binary mode, positioned at its beginning.
+
+    Returns:
+        tuple: The lead and header as bytes, and the parsed ZchunkHeader.
+    """
+    data = fileobj.read(ZCK_MAX_LEAD_SIZE)
+    data += fileobj.read(max(header_size(data) - len(data), 0))
+    return data, ZchunkHeader(data)
+
+
+def reusable_chunks(header, previous_header):
+    """
+    Find the chunks of the previous version of a zchunk file which can be reused.
+
+    Args:
+        header (ZchunkHeader): The header of the file to assemble.
+        previous_header (ZchunkHeader): The header of the previous version, or None.
+
+    Returns:
+        dict: The ZchunkChunks of the previous version by their checksum.
+    """
+    if previous_header is None or previous_header.chunk_checksum_type != header.chunk_checksum_type:
+        return {}
+    return {chunk.checksum: chunk for chunk in previous_header.chunks if chunk.length}
+
+
+def is_reusable(chunk, previous_chunks):
+    """Whether a chunk of a zchunk file is present in its previous version."""
+    previous_chunk = previous_chunks.get(chunk.checksum)
+    return previous_chunk is not None and previous_chunk.length == chunk.length
+
+
+def missing_ranges(header, previous_chunks, max_gap=0):
+    """
+    Find the byte ranges of the chunks of a zchunk file which are missing from its previous version.
+
+    Args:
+        header (ZchunkHeader): The header of the file to assemble.
+        previous_chunks (dict): The reusable chunks of the previous version by their checksum.
+        max_gap (int): Ranges separated by at most this many bytes are merged into one.
+
+    Returns:
+        list: (start, end) tuples of inclusive byte offsets into the file, in order.
+    """
+    ranges = []
+    for chunk in header.chunks:
+        if not chunk.length or is_reusable(chunk, previous_chunks):
+            continue
+        end = chunk.offset + chunk.length - 1
+        if ranges and chunk.offset - ranges[-1][1] - 1 <= max_gap:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((chunk.offset, end))
+    return ranges
+
+
+def assemble(header_data, header, previous_file, previous_chunks, ranges, output):
+    """
+    Assemble a zchunk file from the chunks of its previous version and the downloaded byte ranges.
+
+    The checksum of every chunk is verified.
+
+    Args:
+        header_data (bytes): The lead and header of the file to assemble.
+        header (ZchunkHeader): The parsed header.
+        previous_file: The previous version of the file opened in binary mode, or None.
+        previous_chunks (dict): The reusable chunks of the previous version by their checksum.
+        ranges (list): (start, end, path) tuples of the downloaded byte ranges, in order.
+        output: The file to write to, opened in binary mode.
+
+    Raises:
+        ZchunkError: If a chunk is neither reusable nor downloaded, or its checksum is wrong.
+    """
+    checksum_size = ZCK_CHECKSUM_TYPES[header.chunk_checksum_type][1]
+    output.write(header_data[: header.size])
+    ranges = iter(ranges)
+    current_range = None
+    range_file = None
+    try:
+        for chunk in header.chunks:
+            if not chunk.length:
+                continue
+            if is_reusable(chunk, previous_chunks):
+                previous_file.seek(previous_chunks[chunk.checksum].offset)
+                data = previous_file.read(chunk.length)
+            else:
+                while current_range is None or chunk.offset > current_range[1]:
+                    current_range = next(ranges, None)
+                    if current_range is None:
+                        raise ZchunkError(_("A zchunk chunk was not downloaded."))
+                    if range_file is not None:
+                        range_file.close()
+                    range_file = open(current_range[2], "rb")
+                if chunk.offset < current_range[0]:
+                    raise ZchunkError(_("A zchunk chunk was not downloaded."))
+                range_file.seek(chunk.offset - current_range[0])
+                data = range_file.read(chunk.length)
+
+            digest = checksum_digest(header.chunk_checksum_type, data).digest()
+            if digest[:checksum_size] != chunk.checksum:
+                raise ZchunkError(_("The checksum of a zchunk chunk does not match."))
+            output.write(data)
+    finally:
+        if range_file is not None:
+            range_file.close()
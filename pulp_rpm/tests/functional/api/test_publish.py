@@ -560,6 +560,62 @@ def get_checksum_types(
     return _get_checksum_types
 
 
+def test_publish_reused_metadata(
+    init_and_sync,
+    rpm_repository_factory,
+    rpm_repository_api,
+    rpm_package_api,
+    rpm_publication_factory,
+    rpm_distribution_factory,
+    monitor_task,
+):
+    """
+    Test that reusing the metadata of a previous publication doesn't change the metadata.
+
+    - Sync and publish a repository
+    - Remove a package and publish the new version, reusing the previous publication
+    - Publish a new repository with the same packages, which has nothing to reuse
+    - Verify that the primary, filelists and other files are identical
+    """
+    repo, _ = init_and_sync(url=RPM_UNSIGNED_FIXTURE_URL, policy="on_demand")
+    rpm_publication_factory(repository=repo.pulp_href)
+
+    packages = rpm_package_api.list(repository_version=repo.latest_version_href).results
+    response = rpm_repository_api.modify(
+        repo.pulp_href, {"remove_content_units": [packages[0].pulp_href]}
+    )
+    monitor_task(response.task)
+    repo = rpm_repository_api.read(repo.pulp_href)
+    reused_publication = rpm_publication_factory(repository=repo.pulp_href)
+
+    new_repo = rpm_repository_factory()
+    response = rpm_repository_api.modify(
+        new_repo.pulp_href, {"add_content_units": [p.pulp_href for p in packages[1:]]}
+    )
+    monitor_task(response.task)
+    new_publication = rpm_publication_factory(repository=new_repo.pulp_href)
+
+    def get_metadata(publication):
+        distribution = rpm_distribution_factory(publication=publication.pulp_href)
+        repomd = ElementTree.fromstring(
+            requests.get(os.path.join(distribution.base_url, "repodata/repomd.xml")).text
+        )
+        data_xpath = "{{{}}}data".format(RPM_NAMESPACES["metadata/repo"])
+        location_xpath = "{{{}}}location".format(RPM_NAMESPACES["metadata/repo"])
+        metadata = {}
+        for data_elem in repomd.findall(data_xpath):
+            if data_elem.get("type") in ("primary", "filelists", "other"):
+                location_href = data_elem.find(location_xpath).get("href")
+                metadata[data_elem.get("type")] = download_and_decompress_file(
+                    os.path.join(distribution.base_url, location_href)
+                )
+        return metadata
+
+    reused_metadata = get_metadata(reused_publication)
+    assert sorted(reused_metadata) == ["filelists", "other", "primary"]
+    assert reused_metadata == get_metadata(new_publication)
+
+
 @pytest.mark.parallel
 def test_publish_with_disallowed_checksum_type(rpm_unsigned_repo_on_demand, rpm_publication_api):
     """
@@ -1,7 +1,10 @@
 """Tests that sync rpm plugin repositories."""
 
+import hashlib
+import os
 import pytest
 from random import choice
+from xml.etree import ElementTree
 
 import dictdiffer
 import requests
@@ -40,6 +43,7 @@ from pulp_rpm.tests.functional.constants import (
     RPM_ADVISORY_UPDATED_VERSION_URL,
     RPM_CUSTOM_REPO_METADATA_CHANGED_FIXTURE_URL,
     RPM_CUSTOM_REPO_METADATA_FIXTURE_URL,
+    RPM_DIFF_NAME_SAME_CONTENT_URL,
     RPM_EPEL_MIRROR_URL,
     RPM_COMPLEX_FIXTURE_URL,
     RPM_COMPLEX_PACKAGE_DATA,
@@ -70,9 +74,10 @@ from pulp_rpm.tests.functional.constants import (
     RPM_MODULEMD_DEFAULTS_DATA,
     RPM_MODULEMD_OBSOLETES_DATA,
     RPM_MODULEMDS_DATA,
+    RPM_NAMESPACES,
     RPM_ZSTD_METADATA_FIXTURE_URL,
 )
-from pulp_rpm.tests.functional.utils import gen_rpm_remote
+from pulp_rpm.tests.functional.utils import download_and_decompress_file, gen_rpm_remote
 from pulp_rpm.tests.functional.utils import set_up_module as setUpModule  # noqa:F401
 
 from pulpcore.client.pulp_rpm import RpmRepositorySyncURL
@@ -1050,6 +1055,70 @@ def test_modular_metadata(
         assert pkg["is_modular"] is True
 
 
+@pytest.mark.parametrize(
+    "url", [RPM_UNSIGNED_FIXTURE_URL, RPM_MODULAR_FIXTURE_URL, RPM_DIFF_NAME_SAME_CONTENT_URL]
+)
+def test_sync_known_packages(
+    url,
+    init_and_sync,
+    rpm_publication_api,
+    rpm_distribution_factory,
+    delete_orphans_pre,
+):
+    """Test that syncing packages which are already known gives the same result as parsing them.
+
+    Do the following:
+
+    1. Sync a repo, parsing the full metadata of its packages.
+    2. Sync the same repo into another repository, building the packages from the database.
+    3. Assert that both repositories have the same content.
+    4. Assert that the packages are served at their upstream locations from both mirror
+       publications.
+    """
+    full_repo, _ = init_and_sync(url=url, policy="on_demand", sync_policy="mirror_complete")
+    known_repo, _ = init_and_sync(url=url, policy="on_demand", sync_policy="mirror_complete")
+
+    full_content = get_content(full_repo.to_dict())
+    known_content = get_content(known_repo.to_dict())
+    assert sorted(full_content) == sorted(known_content)
+    for content_type, units in full_content.items():
+        known_units = {unit["pulp_href"]: unit for unit in known_content[content_type]}
+        assert {unit["pulp_href"]: unit for unit in units} == known_units
+
+    # the locations of the packages in the remote metadata
+    repomd_xml = requests.get(os.path.join(url, "repodata/repomd.xml")).content
+    repomd = ElementTree.fromstring(repomd_xml)
+    data_xpath = "{{{}}}data".format(RPM_NAMESPACES["metadata/repo"])
+    location_xpath = "{{{}}}location".format(RPM_NAMESPACES["metadata/repo"])
+    primary_href = next(
+        data.find(location_xpath).get("href")
+        for data in repomd.findall(data_xpath)
+        if data.get("type") == "primary"
+    )
+    primary = ElementTree.fromstring(download_and_decompress_file(os.path.join(url, primary_href)))
+    package_xpath = "{{{}}}package".format(RPM_NAMESPACES["metadata/common"])
+    checksum_xpath = "{{{}}}checksum".format(RPM_NAMESPACES["metadata/common"])
+    package_location_xpath = "{{{}}}location".format(RPM_NAMESPACES["metadata/common"])
+    locations = {
+        package.find(package_location_xpath).get("href"): (
+            package.find(checksum_xpath).get("type"),
+            package.find(checksum_xpath).text,
+        )
+        for package in primary.findall(package_xpath)
+    }
+    assert locations
+
+    for repo in (full_repo, known_repo):
+        publication = rpm_publication_api.list(repository_version=repo.latest_version_href)
+        distribution = rpm_distribution_factory(publication=publication.results[0].pulp_href)
+        response = requests.get(os.path.join(distribution.base_url, "repodata/repomd.xml"))
+        assert response.content == repomd_xml
+        for location_href, (checksum_type, checksum) in locations.items():
+            response = requests.get(os.path.join(distribution.base_url, location_href))
+            assert response.status_code == 200, location_href
+            assert hashlib.new(checksum_type, response.content).hexdigest() == checksum
+
+
 @pytest.mark.parallel
 def test_additive_mode(init_and_sync):
     """Test of additive mode.
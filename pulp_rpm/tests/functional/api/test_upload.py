@@ -1,6 +1,8 @@
 """Tests that perform actions over content unit."""
 
+import io
 import os
+import tarfile
 from tempfile import NamedTemporaryFile
 
 import pytest
@@ -17,6 +19,9 @@ from pulp_rpm.tests.functional.constants import (
     RPM_PACKAGECATEGORY_CONTENT_NAME,
     RPM_PACKAGEGROUP_CONTENT_NAME,
     RPM_PACKAGELANGPACKS_CONTENT_NAME,
+    RPM_SIGNED_FIXTURE_URL,
+    RPM_SIGNED_URL,
+    RPM_SIGNED_URL2,
     RPM_UNSIGNED_FIXTURE_URL,
     RPM_PACKAGE_FILENAME,
     RPM_WITH_NON_ASCII_URL,
@@ -78,6 +83,69 @@ def test_upload_non_ascii(delete_orphans_pre, rpm_package_api, monitor_task):
     assert (packages_count + 1) == new_packages_count
 
 
+def test_upload_many_packages(
+    delete_orphans_pre,
+    init_and_sync,
+    rpm_package_api,
+    rpm_package_factory,
+    rpm_repository_factory,
+    rpm_repository_version_api,
+    bindings_cfg,
+    pulp_api_v3_url,
+    monitor_task,
+):
+    """Test uploading many RPMs and a tar archive of RPMs into a single repository version.
+
+    1. Sync a repository on-demand, so that its packages have no artifacts
+    2. Upload a package, so that it already exists with its artifact
+    3. Upload RPMs and an archive with both of them, a new one and duplicates
+    """
+    init_and_sync(url=RPM_SIGNED_FIXTURE_URL, policy="on_demand")
+    existing_package = rpm_package_factory(url=RPM_WITH_NON_ASCII_URL)
+    repo = rpm_repository_factory()
+
+    on_demand_rpm, new_rpm, existing_rpm = (
+        requests.get(url).content
+        for url in (RPM_SIGNED_URL, RPM_SIGNED_URL2, RPM_WITH_NON_ASCII_URL)
+    )
+    archive_file = io.BytesIO()
+    with tarfile.open(fileobj=archive_file, mode="w:gz") as archive:
+        for name, data in (("rpms/new.rpm", new_rpm), ("rpms/existing.rpm", existing_rpm)):
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+
+    files = [
+        ("files", ("on-demand.rpm", on_demand_rpm)),
+        ("files", ("existing.rpm", existing_rpm)),
+        ("files", ("duplicate.rpm", on_demand_rpm)),
+        ("archive", ("rpms.tar.gz", archive_file.getvalue())),
+    ]
+    response = requests.post(
+        f"{pulp_api_v3_url}rpm/packages/upload/",
+        files=files,
+        data={"repository": repo.pulp_href},
+        auth=(bindings_cfg.username, bindings_cfg.password),
+    )
+    response.raise_for_status()
+    task = monitor_task(response.json()["task"])
+
+    versions = [href for href in task.created_resources if "/versions/" in href]
+    package_hrefs = [href for href in task.created_resources if "/packages/" in href]
+    assert len(versions) == 1
+    assert len(package_hrefs) == 3
+    assert existing_package.pulp_href in package_hrefs
+
+    version = rpm_repository_version_api.read(versions[0])
+    assert version.number == 1
+    assert version.content_summary.added["rpm.package"]["count"] == 3
+
+    # The package synced on-demand got the uploaded artifact
+    packages = rpm_package_api.list(repository_version=versions[0]).results
+    assert {package.pulp_href for package in packages} == set(package_hrefs)
+    assert all(package.artifact for package in packages)
+
+
 @pytest.fixture
 def upload_comps_into(rpm_comps_api, monitor_task):
     def _upload_comps_into(file_path, expected_totals, repo_href=None, replace=False):
@@ -0,0 +1,39 @@
+"""Tests that measure loading RPMs into libsolv."""
+
+import os
+import time
+
+import solv
+
+from pulp_rpm.app.depsolving import Solver, rpm_to_solvable, write_rpm_solv
+from pulp_rpm.tests.unit.test_depsolving import make_rpm
+
+
+def test_bulk_load(tmp_path):
+    """Compare the time it takes to load RPMs one by one and in bulk."""
+    rpms = [
+        make_rpm("pkg{}".format(i), requires=["pkg{}".format(i - 1)], files=50) for i in range(2000)
+    ]
+
+    start = time.perf_counter()
+    pool = solv.Pool()
+    pool.setarch()
+    repo = pool.add_repo("per-unit")
+    repodata = repo.add_repodata()
+    for rpm in rpms:
+        solvable = rpm_to_solvable(repo, rpm)
+        repodata.set_str(solvable.id, solv.SOLVABLE_PKGID, str(rpm["pk"]))
+    repodata.internalize()
+    per_unit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    path = os.path.join(tmp_path, "rpms.solv")
+    write_rpm_solv(rpms, path)
+    pool = solv.Pool()
+    pool.setarch()
+    repo = pool.add_repo("bulk")
+    assert Solver._add_solv(repo, path)
+    bulk_time = time.perf_counter() - start
+
+    print("Loaded RPMs one by one in {:.3f}s, in bulk in {:.3f}s".format(per_unit_time, bulk_time))
+    assert bulk_time < per_unit_time
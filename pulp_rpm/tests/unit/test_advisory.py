@@ -1,3 +1,4 @@
+import datetime
 import json
 import unittest
 
@@ -7,8 +8,20 @@ from django.test import TestCase
 # If we can't import pulp_rpm.app.advisory, set a flag so we know to skip this test on the
 # platform we're running on at the moment.
 try:
-    from pulp_rpm.app.advisory import resolve_advisory_conflict
+    import createrepo_c as cr
+
+    from pulp_rpm.app.advisory import (
+        hash_update_record,
+        resolve_advisory_conflict,
+        update_record_digest,
+    )
     from pulp_rpm.app.exceptions import AdvisoryConflict
+    from pulp_rpm.app.models import (
+        UpdateCollection,
+        UpdateCollectionPackage,
+        UpdateRecord,
+        UpdateReference,
+    )
     from pulp_rpm.app.serializers.advisory import UpdateRecordSerializer
 
     no_createrepo = False
@@ -460,3 +473,72 @@ class TestAdvisoryConflicts(TestCase):
         finally:
             existing.delete()
             incoming.delete()
+
+
+@unittest.skipIf(
+    no_createrepo,
+    "This test can only be run on a system that supports createrepo_c",
+)
+class TestAdvisoryDigest(unittest.TestCase):
+    """Test the digest of advisories."""
+
+    def make_update(self, package_names):
+        update = cr.UpdateRecord()
+        update.id = "TEST-2022-0001"
+        update.issued_date = datetime.datetime(2022, 1, 1, 12, 34, 55)
+        update.title = "Bear and fox"
+        update.reboot_suggested = True
+        collection = cr.UpdateCollection()
+        collection.shortname = "bear-fox"
+        for name in package_names:
+            package = cr.UpdateCollectionPackage()
+            package.name = name
+            package.version = "1.0"
+            package.release = "1"
+            package.arch = "noarch"
+            package.filename = "{}-1.0-1.noarch.rpm".format(name)
+            collection.append(package)
+        update.append_collection(collection)
+        for href in ("https://example.com/1", "https://example.com/2"):
+            reference = cr.UpdateReference()
+            reference.href = href
+            reference.type = "bugzilla"
+            update.append_reference(reference)
+        return update
+
+    def test_order(self):
+        """Test that the digest does not depend on the order of the packages."""
+        self.assertEqual(
+            hash_update_record(self.make_update(["bear", "fox"])),
+            hash_update_record(self.make_update(["fox", "bear"])),
+        )
+        self.assertNotEqual(
+            hash_update_record(self.make_update(["bear", "fox"])),
+            hash_update_record(self.make_update(["bear"])),
+        )
+
+    def test_models(self):
+        """Test that the digest of the saved collections is the same as of the parsed ones."""
+        update = self.make_update(["bear", "fox"])
+        collections = []
+        for collection in reversed(update.collections):
+            collection_dict = UpdateCollection.createrepo_to_dict(collection)
+            # autofilled when the collection has no name
+            collection_dict["name"] = "collection-autofill-0123456789ab"
+            collections.append(
+                (
+                    UpdateCollection(**collection_dict),
+                    [
+                        UpdateCollectionPackage(**UpdateCollectionPackage.createrepo_to_dict(pkg))
+                        for pkg in reversed(collection.packages)
+                    ],
+                )
+            )
+        references = [
+            UpdateReference(**UpdateReference.createrepo_to_dict(reference))
+            for reference in reversed(update.references)
+        ]
+        self.assertEqual(
+            update_record_digest(UpdateRecord.createrepo_to_dict(update), collections, references),
+            hash_update_record(update),
+        )
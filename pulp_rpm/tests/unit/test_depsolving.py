@@ -0,0 +1,183 @@
+import os
+import re
+import tempfile
+import uuid
+from types import SimpleNamespace
+from unittest import TestCase
+
+import solv
+
+from pulp_rpm.app.depsolving import SolvCache, Solver, rpm_to_solvable, write_rpm_solv
+
+ZERO_EPOCH_RE = re.compile(r"(?<=[ -])0:")
+
+
+def make_rpm(name, requires=(), files=10):
+    """Create a Pulp RPM dict as loaded from the database."""
+    return {
+        "pk": uuid.uuid4(),
+        "name": name,
+        "epoch": "1",
+        "version": "1.0",
+        "release": "1",
+        "arch": "noarch",
+        "rpm_vendor": "",
+        "provides": [
+            [name, "EQ", "1", "1.0", "1", False],
+            ["{}-libs(x86-64)".format(name), None, None, None, None, False],
+        ],
+        "requires": [[req, None, None, None, None, False] for req in requires]
+        + [
+            ["bash", "GE", "0", "4.0", None, True],
+            ["(glibc >= 2.28 if glibc)", None, None, None, None, False],
+        ],
+        "files": [[None, "/usr/share/{}/".format(name), "file{}".format(i)] for i in range(files)]
+        + [[None, "", "ignored"]],
+    }
+
+
+def describe_solvables(repo):
+    """Describe the solvables of a repo by the pk stored as their SOLVABLE_PKGID.
+
+    Zero epochs are left out, libsolv drops them when parsing rpmmd and they compare equal.
+    """
+    flags = solv.Dataiterator.SEARCH_FILES | solv.Dataiterator.SEARCH_COMPLETE_FILELIST
+
+    def deps(solvable, keyname):
+        return sorted(ZERO_EPOCH_RE.sub("", str(dep)) for dep in solvable.lookup_deparray(keyname))
+
+    return {
+        solvable.lookup_str(solv.SOLVABLE_PKGID): (
+            ZERO_EPOCH_RE.sub("", str(solvable)),
+            deps(solvable, solv.SOLVABLE_PROVIDES),
+            deps(solvable, solv.SOLVABLE_REQUIRES),
+            sorted(d.str for d in solvable.Dataiterator(solv.SOLVABLE_FILELIST, None, flags)),
+        )
+        for solvable in repo.solvables
+    }
+
+
+class TestBulkLoad(TestCase):
+    """Test bulk loading RPMs into libsolv."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "rpms.solv")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load_per_unit(self, rpms):
+        pool = solv.Pool()
+        pool.setarch()
+        repo = pool.add_repo("per-unit")
+        repodata = repo.add_repodata()
+        for rpm in rpms:
+            solvable = rpm_to_solvable(repo, rpm)
+            repodata.set_str(solvable.id, solv.SOLVABLE_PKGID, str(rpm["pk"]))
+        repodata.internalize()
+        return pool, repo
+
+    def load_bulk(self, rpms):
+        write_rpm_solv(rpms, self.path)
+        pool = solv.Pool()
+        pool.setarch()
+        repo = pool.add_repo("bulk")
+        self.assertTrue(Solver._add_solv(repo, self.path))
+        return pool, repo
+
+    def test_equivalent(self):
+        """Test that bulk loaded solvables match the ones created one by one."""
+        rpms = [make_rpm("foo", requires=["bar", 'a&b<c>"d"']), make_rpm("bar")]
+        rpms[1]["files"].append([None, "/usr/share/bar/", "<&>"])
+
+        _per_unit_pool, per_unit_repo = self.load_per_unit(rpms)
+        _bulk_pool, bulk_repo = self.load_bulk(rpms)
+
+        expected = describe_solvables(per_unit_repo)
+        self.assertEqual(describe_solvables(bulk_repo), expected)
+        self.assertIn("/usr/share/bar/<&>", expected[str(rpms[1]["pk"])][3])
+
+    def test_unsupported_flags(self):
+        """Test that unsupported dependency flags are rejected."""
+        rpm = make_rpm("foo")
+        rpm["requires"].append(["bar", "NE", None, "1", None, False])
+        with self.assertRaises(ValueError):
+            write_rpm_solv([rpm], self.path)
+
+
+class TestSolvCache(TestCase):
+    """Test the cache of the RPM solvables of repository versions."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SolvCache(directory=self.tmpdir.name, max_size=1024**2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        """Test that cached solvables keep their dependencies and map back to their units."""
+        rpms = [make_rpm("foo", requires=["bar"]), make_rpm("bar")]
+        repo_version = SimpleNamespace(pk=uuid.uuid4())
+        self.assertIsNone(self.cache.get(repo_version))
+
+        path = self.cache.put(repo_version, lambda path: write_rpm_solv(rpms, path))
+        self.assertEqual(self.cache.get(repo_version), path)
+
+        solver = Solver()
+        repo = solver._pool.add_repo("test")
+        self.assertTrue(solver._add_solv(repo, path))
+
+        loaded = {s.lookup_str(solv.SOLVABLE_PKGID): s for s in repo.solvables}
+        self.assertEqual(set(loaded), {str(rpm["pk"]) for rpm in rpms})
+
+        solver._pool.createwhatprovides()
+        foo = loaded[str(rpms[0]["pk"])]
+        self.assertEqual(str(foo), "foo-1:1.0-1.noarch")
+        providers = solver._pool.whatprovides(foo.lookup_deparray(solv.SOLVABLE_REQUIRES)[0])
+        self.assertEqual(
+            [s.lookup_str(solv.SOLVABLE_PKGID) for s in providers], [str(rpms[1]["pk"])]
+        )
+
+    def test_evict(self):
+        """Test that the least recently used files are evicted past the size cap."""
+        repo_versions = [SimpleNamespace(pk=uuid.uuid4()) for _ in range(3)]
+        paths = []
+        for i, repo_version in enumerate(repo_versions):
+            path = self.cache.put(
+                repo_version, lambda path: write_rpm_solv([make_rpm("foo")], path)
+            )
+            os.utime(path, (i, i))
+            paths.append(path)
+
+        self.cache.get(repo_versions[0])
+        self.cache.max_size = os.path.getsize(paths[0]) + os.path.getsize(paths[2])
+        self.cache.evict()
+
+        self.assertIsNotNone(self.cache.get(repo_versions[0]))
+        self.assertIsNone(self.cache.get(repo_versions[1]))
+        self.assertIsNotNone(self.cache.get(repo_versions[2]))
+
+    def test_oversized(self):
+        """Test that a file larger than the size cap is loaded once without evicting others."""
+        cached_version = SimpleNamespace(pk=uuid.uuid4())
+        self.cache.put(cached_version, lambda path: write_rpm_solv([make_rpm("foo")], path))
+        self.cache.max_size = 1
+
+        rpms = [make_rpm("foo", requires=["bar"]), make_rpm("bar")]
+        repo_version = SimpleNamespace(pk=uuid.uuid4())
+        path = self.cache.put(repo_version, lambda path: write_rpm_solv(rpms, path))
+        self.assertTrue(os.path.exists(path))
+        self.assertIsNotNone(self.cache.get(cached_version))
+        self.cache.discard(repo_version)
+
+        solver = Solver()
+        solver._solv_cache = self.cache
+        solver._iter_rpms = lambda package_ids: iter(rpms)
+        repo = solver._pool.add_repo("test")
+        solver._load_rpms_from_cache(repo_version, None, repo)
+
+        self.assertEqual(repo.nsolvables, len(rpms))
+        self.assertIsNone(self.cache.get(repo_version))
+        self.assertIsNotNone(self.cache.get(cached_version))
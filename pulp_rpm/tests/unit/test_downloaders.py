@@ -0,0 +1,59 @@
+import asyncio
+from unittest import TestCase
+
+from pulp_rpm.app.downloaders import UlnSession
+
+
+class FakeUlnSession(UlnSession):
+    """A ULN session which counts its logins instead of calling the ULN server."""
+
+    def __init__(self, **kwargs):
+        super().__init__("https://uln.example.com/", "user", "password", **kwargs)
+        self.logins = 0
+
+    async def login(self, client, proxy=None, proxy_auth=None, auth=None):
+        self.logins += 1
+        await asyncio.sleep(0.01)
+        return "key{}".format(self.logins).ljust(43, "x")
+
+
+class TestUlnSession(TestCase):
+    """Test sharing the ULN session key between downloaders."""
+
+    def test_concurrent(self):
+        """Test that concurrent downloads wait for a single login."""
+        uln_session = FakeUlnSession()
+
+        async def get_keys():
+            return await asyncio.gather(*[uln_session.get_key(None) for _ in range(10)])
+
+        keys = asyncio.run(get_keys())
+        self.assertEqual(len(set(keys)), 1)
+        self.assertEqual(uln_session.logins, 1)
+
+    def test_invalidate(self):
+        """Test that a rejected key is replaced once, even if rejected by several downloads."""
+        uln_session = FakeUlnSession()
+
+        async def relogin():
+            key = await uln_session.get_key(None)
+            uln_session.invalidate(key)
+            new_key = await uln_session.get_key(None)
+            uln_session.invalidate(key)
+            return key, new_key, await uln_session.get_key(None)
+
+        key, new_key, current_key = asyncio.run(relogin())
+        self.assertNotEqual(key, new_key)
+        self.assertEqual(new_key, current_key)
+        self.assertEqual(uln_session.logins, 2)
+
+    def test_expiry(self):
+        """Test that expired keys are replaced."""
+        uln_session = FakeUlnSession(lifetime=0)
+
+        async def get_keys():
+            return [await uln_session.get_key(None) for _ in range(2)]
+
+        first_key, second_key = asyncio.run(get_keys())
+        self.assertNotEqual(first_key, second_key)
+        self.assertEqual(uln_session.logins, 2)
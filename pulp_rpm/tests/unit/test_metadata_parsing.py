@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import createrepo_c as cr
+
+from pulp_rpm.app.metadata_parsing import MetadataParser
+
+
+def make_package(name, pkgid, location_href=None):
+    """Create a minimal createrepo_c package with files and changelogs."""
+    pkg = cr.Package()
+    pkg.name = name
+    pkg.epoch = "0"
+    pkg.version = "1.0"
+    pkg.release = "1"
+    pkg.arch = "noarch"
+    pkg.pkgId = pkgid
+    pkg.checksum_type = "sha256"
+    pkg.location_href = location_href or f"Packages/{name}-1.0-1.noarch.rpm"
+    pkg.files = [("", "/usr/share/", name)]
+    pkg.changelogs = [("Someone <someone@example.com>", 1, f"- {name}\n")]
+    return pkg
+
+
+class TestMetadataParser(TestCase):
+    """Test parsing packages from primary, filelists and other metadata."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # "bar" is listed twice with the same pkgId, at different locations
+        self.packages = [
+            make_package("foo", "1" * 64),
+            make_package("bar", "2" * 64),
+            make_package("bar", "2" * 64, "Other/bar-1.0-1.noarch.rpm"),
+            make_package("baz", "3" * 64),
+        ]
+        paths = []
+        file_types = [
+            (cr.PrimaryXmlFile, "primary"),
+            (cr.FilelistsXmlFile, "filelists"),
+            (cr.OtherXmlFile, "other"),
+        ]
+        for file_cls, metadata_type in file_types:
+            path = os.path.join(self.tmpdir.name, f"{metadata_type}.xml")
+            xml_file = file_cls(path, compressiontype=cr.NO_COMPRESSION)
+            xml_file.set_num_of_pkgs(len(self.packages))
+            for pkg in self.packages:
+                xml_file.add_pkg(pkg)
+            xml_file.close()
+            paths.append(path)
+        self.parser = MetadataParser.from_metadata_files(*paths)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def parse(self, skip_pkgids=None):
+        return [
+            (pkg.name, pkg.location_href, pkg.files, pkg.changelogs)
+            for pkg in self.parser.as_iterator(skip_pkgids=skip_pkgids)
+        ]
+
+    def expected(self, *indices):
+        return [
+            (
+                pkg.name,
+                pkg.location_href,
+                [(None, "/usr/share/", pkg.name)],
+                [("Someone <someone@example.com>", 1, f"- {pkg.name}\n")],
+            )
+            for pkg in (self.packages[i] for i in indices)
+        ]
+
+    def test_all_packages(self):
+        """Test that all packages are returned with their files and changelogs."""
+        self.assertEqual(self.parse(), self.expected(0, 1, 2, 3))
+        self.assertEqual(self.parse(set()), self.expected(0, 1, 2, 3))
+
+    def test_skip_pkgids(self):
+        """Test that skipped packages are not returned and the rest are complete."""
+        self.assertEqual(self.parse({"1" * 64}), self.expected(1, 2, 3))
+        self.assertEqual(self.parse({"1" * 64, "3" * 64}), self.expected(1, 2))
+
+    def test_skip_duplicate_pkgids(self):
+        """Test that all entries of a skipped pkgId are skipped."""
+        self.assertEqual(self.parse({"2" * 64}), self.expected(0, 3))
+
+    def test_duplicate_pkgids_detected(self):
+        """Test that the primary pass, which detects duplicates, sees every entry."""
+        pkgids = []
+        self.parser.for_each_pkg_primary(lambda pkg: pkgids.append(pkg.pkgId))
+        self.assertEqual(pkgids, [pkg.pkgId for pkg in self.packages])
+        self.assertEqual(len(set(pkgids)), len(pkgids) - 1)
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import tempfile
+from unittest import TestCase
+
+from pulp_rpm.app.mirrors import (
+    is_metalink,
+    parse_metalink,
+    parse_mirrorlist,
+    verify_metalink_hashes,
+)
+
+REPOMD = b"<repomd>current</repomd>"
+OLD_REPOMD = b"<repomd>previous</repomd>"
+
+METALINK = """<?xml version="1.0" encoding="utf-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/"
+    xmlns:mm0="http://fedorahosted.org/mirrormanager" type="dynamic">
+ <files>
+  <file name="repomd.xml">
+   <size>24</size>
+   <verification>
+    <hash type="md5">{md5}</hash>
+    <hash type="sha256">{sha256}</hash>
+   </verification>
+   <mm0:alternates>
+    <mm0:alternate>
+     <verification>
+      <hash type="sha256">{old_sha256}</hash>
+     </verification>
+    </mm0:alternate>
+   </mm0:alternates>
+   <resources maxconnections="1">
+    <url protocol="rsync" preference="100">rsync://a.example.com/repo/repodata/repomd.xml</url>
+    <url protocol="https" preference="90">https://b.example.com/repo/repodata/repomd.xml</url>
+    <url protocol="http" preference="99">http://c.example.com/repo/repodata/repomd.xml</url>
+    <url protocol="https" preference="95">https://d.example.com/repo/repodata/repomd.xml</url>
+   </resources>
+  </file>
+ </files>
+</metalink>
+""".format(
+    md5=hashlib.md5(REPOMD).hexdigest(),
+    sha256=hashlib.sha256(REPOMD).hexdigest(),
+    old_sha256=hashlib.sha256(OLD_REPOMD).hexdigest(),
+).encode()
+
+
+class TestMirrorlist(TestCase):
+    """Test parsing mirrorlists."""
+
+    def test_parse(self):
+        """Test that commented out and duplicate URLs are ignored."""
+        mirrorlist = (
+            b"# https://commented.example.com/repo/\n"
+            b"https://a.example.com/repo/\n"
+            b"baseurl= http://b.example.com/repo/\n"
+            b"https://a.example.com/repo/\n"
+        )
+        self.assertFalse(is_metalink(mirrorlist))
+        self.assertEqual(
+            parse_mirrorlist(mirrorlist),
+            ["https://a.example.com/repo/", "http://b.example.com/repo/"],
+        )
+
+
+class TestMetalink(TestCase):
+    """Test parsing metalinks and verifying the repomd.xml of mirrors with them."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, data):
+        path = os.path.join(self.tmpdir.name, "repomd.xml")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_parse(self):
+        """Test that the http(s) mirrors are returned by preference, with all repomd versions."""
+        self.assertTrue(is_metalink(METALINK))
+        metalink = parse_metalink(METALINK)
+        self.assertEqual(
+            metalink.urls,
+            [
+                "http://c.example.com/repo/",
+                "https://d.example.com/repo/",
+                "https://b.example.com/repo/",
+            ],
+        )
+        self.assertEqual(len(metalink.hashes), 2)
+        self.assertEqual(set(metalink.hashes[0]), {"md5", "sha256"})
+
+    def test_verify(self):
+        """Test that only the versions of the repomd.xml listed by the metalink are accepted."""
+        hashes = parse_metalink(METALINK).hashes
+        self.assertTrue(verify_metalink_hashes(self.write(REPOMD), hashes))
+        self.assertTrue(verify_metalink_hashes(self.write(OLD_REPOMD), hashes))
+        self.assertFalse(verify_metalink_hashes(self.write(b"<repomd>other</repomd>"), hashes))
+
+    def test_invalid(self):
+        """Test that metalinks without a repomd.xml entry are rejected."""
+        for metalink in (b"<metalink><files/></metalink>", b"<metalink"):
+            with self.subTest(metalink=metalink):
+                with self.assertRaises(ValueError):
+                    parse_metalink(metalink)
@@ -1,5 +1,9 @@
+import uuid
+
 from django.test import TestCase
 
+from pulp_rpm.app.models import Package, RpmRepository
+
 
 class TestNothing(TestCase):
     """Test Nothing (placeholder)."""
@@ -7,3 +11,116 @@ class TestNothing(TestCase):
     def test_nothing_at_all(self):
         """Test that the tests are running and that's it."""
         self.assertTrue(True)
+
+
+class TestRetentionPolicy(TestCase):
+    """Test applying the "retain_package_versions" policy of repositories."""
+
+    def setUp(self):
+        self.repo = RpmRepository.objects.create(name=str(uuid.uuid4()))
+
+    def make_package(self, name, version, is_modular=False):
+        return Package.objects.create(
+            name=name,
+            epoch="0",
+            version=version,
+            release="1",
+            arch="noarch",
+            pkgId=uuid.uuid4().hex,
+            checksum_type="sha256",
+            location_href=f"{name}-{version}-1.noarch.rpm",
+            is_modular=is_modular,
+        )
+
+    def set_retention(self, retain_package_versions, retention_details=None):
+        self.repo.refresh_from_db()
+        self.repo.retain_package_versions = retain_package_versions
+        fields = ["retain_package_versions"]
+        if retention_details:
+            self.repo.retention_details = retention_details
+            fields.append("retention_details")
+        self.repo.save(update_fields=fields)
+
+    def add(self, packages, base_version=None):
+        with self.repo.new_version(base_version=base_version) as new_version:
+            new_version.add_content(Package.objects.filter(pk__in=[p.pk for p in packages]))
+        self.repo.refresh_from_db()
+        return self.repo.latest_version()
+
+    def assertPackages(self, version, expected):
+        packages = Package.objects.filter(pk__in=version.content)
+        self.assertEqual(
+            sorted(f"{p.name}-{p.version}" for p in packages),
+            sorted(f"{p.name}-{p.version}" for p in expected),
+        )
+
+    def test_retention_details(self):
+        """Test that the versions the policy was applied to are recorded."""
+        foo = [self.make_package("foo", str(i)) for i in range(1, 3)]
+        self.add(foo[:1])
+        self.assertEqual(self.repo.retention_details, {})
+
+        self.set_retention(1)
+        version = self.add(foo[1:])
+        self.assertEqual(
+            self.repo.retention_details,
+            {"version": version.number, "retain_package_versions": 1},
+        )
+        self.assertPackages(version, foo[1:])
+
+    def test_incremental_after_applied_version(self):
+        """Test that only the names of added packages are evaluated after an applied version."""
+        foo = [self.make_package("foo", str(i)) for i in range(1, 4)]
+        bar = [self.make_package("bar", str(i)) for i in range(1, 4)]
+        version = self.add(foo[:2] + bar)
+
+        # pretend the policy was applied to the version, so that bar is known to comply
+        self.set_retention(2, {"version": version.number, "retain_package_versions": 2})
+        version = self.add(foo[2:])
+        self.assertPackages(version, foo[1:] + bar)
+        self.assertEqual(
+            self.repo.retention_details,
+            {"version": version.number, "retain_package_versions": 2},
+        )
+
+    def test_full_after_tightened_policy(self):
+        """Test that all packages are evaluated once the policy has been tightened."""
+        foo = [self.make_package("foo", str(i)) for i in range(1, 4)]
+        bar = self.make_package("bar", "1")
+        self.set_retention(3)
+        self.add(foo)
+
+        self.set_retention(1)
+        version = self.add([bar])
+        self.assertPackages(version, [foo[2], bar])
+
+    def test_other_base_version(self):
+        """Test versions based on another version than the one the policy was applied to."""
+        foo = [self.make_package("foo", str(i)) for i in range(1, 5)]
+        bar = [self.make_package("bar", str(i)) for i in range(1, 3)]
+        unfiltered_version = self.add(foo[:3])
+
+        self.set_retention(2)
+        version = self.add(bar[:1])
+        self.assertPackages(version, foo[1:3] + bar[:1])
+
+        # the base version doesn't comply with the policy
+        version = self.add(bar[1:], base_version=unfiltered_version)
+        self.assertPackages(version, foo[1:3] + bar[1:])
+
+        # the base version complies with the policy, but packages which are in the latest
+        # version may still be added to it
+        compliant_version = version
+        self.set_retention(0)
+        self.add(foo[3:])
+        self.set_retention(2)
+        version = self.add(foo[3:], base_version=compliant_version)
+        self.assertPackages(version, foo[2:] + bar[1:])
+
+    def test_modular_packages(self):
+        """Test that modular packages are always retained."""
+        foo = [self.make_package("foo", str(i)) for i in range(1, 3)]
+        modular_foo = [self.make_package("foo", str(i), is_modular=True) for i in range(3, 5)]
+        self.set_retention(1)
+        version = self.add(foo + modular_foo)
+        self.assertPackages(version, foo[1:] + modular_foo)
@@ -0,0 +1,77 @@
+import io
+import os
+import tarfile
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from django.test import override_settings
+
+from pulp_rpm.app.tasks.package import extract_rpms, read_packages_data
+
+
+class TestExtractRpms(TestCase):
+    """Test extracting the RPMs of an uploaded tar archive."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_archive(self, members, mode="w:gz"):
+        archive_file = io.BytesIO()
+        with tarfile.open(fileobj=archive_file, mode=mode) as archive:
+            for name, data in members:
+                member = tarfile.TarInfo(name)
+                member.size = len(data)
+                archive.addfile(member, io.BytesIO(data))
+        archive_file.seek(0)
+        return archive_file
+
+    def test_extract(self):
+        """Test that only the RPMs are extracted, under generated names."""
+        archive_file = self.make_archive(
+            [
+                ("../../bear-4.1-1.noarch.rpm", b"bear"),
+                ("README", b"readme"),
+                ("/packages/fox-1.1-2.noarch.rpm", b"fox"),
+            ]
+        )
+        paths = extract_rpms(archive_file, self.tmpdir.name)
+
+        self.assertEqual(len(paths), 2)
+        for path, data in zip(paths, (b"bear", b"fox")):
+            self.assertEqual(os.path.dirname(path), self.tmpdir.name)
+            with open(path, "rb") as rpm_file:
+                self.assertEqual(rpm_file.read(), data)
+
+    def test_uncompressed(self):
+        """Test that uncompressed archives are supported."""
+        archive_file = self.make_archive([("bear-4.1-1.noarch.rpm", b"bear")], mode="w")
+        self.assertEqual(len(extract_rpms(archive_file, self.tmpdir.name)), 1)
+
+
+class TestReadPackagesData(TestCase):
+    """Test parsing the headers of uploaded RPMs."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_invalid(self):
+        """Test that RPMs which cannot be parsed are reported, with and without processes."""
+        artifacts = []
+        for i in range(2):
+            path = os.path.join(self.tmpdir.name, "{}.rpm".format(i))
+            with open(path, "wb") as rpm_file:
+                rpm_file.write(b"not an rpm")
+            artifacts.append(SimpleNamespace(file=path, sha256="{}".format(i) * 64, size=10))
+
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with override_settings(RPM_UPLOAD_PARSING_PROCESSES=processes):
+                    with self.assertRaisesRegex(ValueError, "0" * 64):
+                        read_packages_data(artifacts)
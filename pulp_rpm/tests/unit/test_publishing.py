@@ -0,0 +1,275 @@
+import gzip
+import os
+import shutil
+import signal
+import tempfile
+from unittest import TestCase, mock
+
+import createrepo_c as cr
+from django.core.management import call_command
+from django.test import TestCase as DBTestCase, override_settings
+
+from pulp_rpm.app.models import Package, PackageMetadataCache
+from pulp_rpm.app.tasks.publishing import (
+    REPOMD_RECORD_ATTRS,
+    MetadataFileWriter,
+    MetadataFileWriterProcess,
+    fill_repomd_records,
+    iter_package_chunks,
+    write_package_chunks,
+)
+
+FILE_TYPES = [
+    (cr.PrimaryXmlFile, "primary"),
+    (cr.FilelistsXmlFile, "filelists"),
+    (cr.OtherXmlFile, "other"),
+]
+
+
+def make_package(name, pkgid):
+    """Create a minimal createrepo_c package."""
+    pkg = cr.Package()
+    pkg.name = name
+    pkg.epoch = "0"
+    pkg.version = "1.0"
+    pkg.release = "1"
+    pkg.arch = "noarch"
+    pkg.pkgId = pkgid
+    pkg.checksum_type = "sha256"
+    pkg.location_href = f"Packages/{name[0]}/{name}-1.0-1.noarch.rpm"
+    pkg.summary = "<package > & friends"
+    pkg.description = "multi\n<package line\n</package>\n"
+    pkg.time_file = 1234
+    pkg.files = [("", "/usr/share/", name)]
+    pkg.changelogs = [("Someone <someone@example.com>", 1, "- <package >\n")]
+    return pkg
+
+
+class TestPackageChunks(TestCase):
+    """Test splitting published metadata into reusable per-package chunks."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.packages = [make_package(f"pkg{i}", f"{i:064x}") for i in range(3)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, file_cls, metadata_type, chunks=None):
+        path = os.path.join(self.tmpdir.name, f"{metadata_type}-{chunks is None}.xml.gz")
+        xml_file = file_cls(path)
+        xml_file.set_num_of_pkgs(len(self.packages))
+        for i, pkg in enumerate(self.packages):
+            if chunks is None:
+                xml_file.add_pkg(pkg)
+            else:
+                xml_file.add_chunk(chunks[i])
+        xml_file.close()
+        return path
+
+    def test_chunks_roundtrip(self):
+        """Test that rewriting the chunks of a file produces identical output."""
+        for file_cls, metadata_type in FILE_TYPES:
+            path = self.write(file_cls, metadata_type)
+            xml_path = os.path.join(self.tmpdir.name, f"{metadata_type}.xml")
+            with gzip.open(path) as src, open(xml_path, "wb") as dst:
+                dst.write(src.read())
+
+            chunks = list(iter_package_chunks(xml_path, metadata_type))
+            self.assertEqual([c[0] for c in chunks], [p.pkgId for p in self.packages])
+            if metadata_type == "primary":
+                self.assertEqual([c[2] for c in chunks], [1234] * 3)
+
+            new_path = self.write(file_cls, metadata_type, [c[1] for c in chunks])
+            with gzip.open(path) as old, gzip.open(new_path) as new:
+                self.assertEqual(old.read(), new.read())
+
+
+class TestMetadataFileWriters(TestCase):
+    """Test writing metadata files in the current process and in child processes."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.packages = [make_package(f"pkg{i}", f"{i:064x}") for i in range(5)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, writer_cls, file_cls, metadata_type):
+        path = os.path.join(self.tmpdir.name, f"{metadata_type}-{writer_cls.__name__}.xml.gz")
+        writer = writer_cls(file_cls, path, cr.GZ, len(self.packages))
+        chunks = [cr.xml_dump(pkg) for pkg in self.packages]
+        index = [file_cls for file_cls, _metadata_type in FILE_TYPES].index(file_cls)
+        # add the chunks in several batches, like the publish task does
+        writer.add_chunks([c[index] for c in chunks[:2]])
+        writer.add_chunks([c[index] for c in chunks[2:]])
+        writer.finish()
+        writer.close()
+        with gzip.open(path) as f:
+            return f.read()
+
+    def test_identical_files(self):
+        """Test that both writers produce the same files as createrepo_c itself."""
+        for file_cls, metadata_type in FILE_TYPES:
+            path = os.path.join(self.tmpdir.name, f"{metadata_type}.xml.gz")
+            xml_file = file_cls(path, compressiontype=cr.GZ)
+            xml_file.set_num_of_pkgs(len(self.packages))
+            for pkg in self.packages:
+                xml_file.add_pkg(pkg)
+            xml_file.close()
+            with gzip.open(path) as f:
+                expected = f.read()
+
+            self.assertEqual(self.write(MetadataFileWriter, file_cls, metadata_type), expected)
+            self.assertEqual(
+                self.write(MetadataFileWriterProcess, file_cls, metadata_type), expected
+            )
+
+    def test_abort(self):
+        """Test that aborting a writer stops its child process."""
+        path = os.path.join(self.tmpdir.name, "primary.xml.gz")
+        writer = MetadataFileWriterProcess(cr.PrimaryXmlFile, path, cr.GZ, len(self.packages))
+        writer.add_chunks([cr.xml_dump_primary(self.packages[0])])
+        self.assertTrue(writer._process.is_alive())
+
+        writer.abort()
+        self.assertFalse(writer._process.is_alive())
+        self.assertEqual(writer._process.exitcode, -signal.SIGTERM)
+
+    def test_fill_repomd_records(self):
+        """Test that filling records concurrently gives the same records as doing it serially."""
+        for file_cls, metadata_type in FILE_TYPES:
+            path = os.path.join(self.tmpdir.name, f"{metadata_type}.xml.gz")
+            xml_file = file_cls(path, compressiontype=cr.GZ)
+            xml_file.set_num_of_pkgs(len(self.packages))
+            for pkg in self.packages:
+                xml_file.add_pkg(pkg)
+            xml_file.close()
+
+        def copy_files(dirname):
+            records = []
+            os.mkdir(os.path.join(self.tmpdir.name, dirname))
+            for _file_cls, metadata_type in FILE_TYPES:
+                path = os.path.join(self.tmpdir.name, dirname, f"{metadata_type}.xml.gz")
+                shutil.copy2(os.path.join(self.tmpdir.name, f"{metadata_type}.xml.gz"), path)
+                records.append((metadata_type, path, cr.SHA256))
+            return records
+
+        expected = []
+        for name, path, checksum_type in copy_files("serial"):
+            record = cr.RepomdRecord(name, path)
+            record.fill(checksum_type)
+            record.rename_file()
+            expected.append(record)
+
+        filled = fill_repomd_records(copy_files("concurrent"), workers=4)
+        self.assertEqual(len(filled), len(expected))
+        for record, expected_record in zip(filled, expected):
+            self.assertEqual(record.type, expected_record.type)
+            for attr in REPOMD_RECORD_ATTRS:
+                value, expected_value = getattr(record, attr), getattr(expected_record, attr)
+                if attr == "location_real":
+                    self.assertTrue(os.path.exists(value))
+                    value, expected_value = os.path.basename(value), os.path.basename(
+                        expected_value
+                    )
+                self.assertEqual(value, expected_value, attr)
+
+
+class ChunkCollector:
+    """Collect the chunks written for a metadata file."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def add_chunks(self, chunks):
+        self.chunks.extend(chunks)
+
+
+@override_settings(RPM_CACHE_PACKAGE_METADATA=True, KEEP_CHANGELOG_LIMIT=None)
+class TestPackageMetadataCache(DBTestCase):
+    """Test caching the serialized metadata of packages across publications."""
+
+    def setUp(self):
+        pkg = make_package("pkg0", "0" * 64)
+        pkg.changelogs = [
+            ("Someone <someone@example.com>", i, f"- change {i}\n") for i in range(1, 4)
+        ]
+        self.package = Package(**Package.createrepo_to_dict(pkg))
+        self.package.save()
+        self.pkg_to_hash = {self.package.pk: ("sha256", "0" * 64)}
+
+    def write(self, pkg_to_hash=None):
+        """Publish the package, returning the number of cached packages and the chunks."""
+        writers = (ChunkCollector(), ChunkCollector(), ChunkCollector())
+        reused = write_package_chunks(
+            [(self.package.pk, None)], writers, pkg_to_hash or self.pkg_to_hash, None
+        )
+        return reused, tuple(writer.chunks[0] for writer in writers)
+
+    def test_miss_and_hit(self):
+        """Test that serialized packages are cached and the cache is used afterwards."""
+        reused, chunks = self.write()
+        self.assertEqual(reused, 0)
+        cache = PackageMetadataCache.objects.get(package=self.package)
+        self.assertEqual((cache.primary, cache.filelists, cache.other), chunks)
+
+        reused, cached_chunks = self.write()
+        self.assertEqual(reused, 1)
+        self.assertEqual(cached_chunks, chunks)
+
+    def test_checksum_type_change(self):
+        """Test that the cache isn't used for a package published with another checksum."""
+        _reused, chunks = self.write()
+        reused, new_chunks = self.write({self.package.pk: ("sha512", "1" * 128)})
+        self.assertEqual(reused, 0)
+        self.assertIn("1" * 128, new_chunks[0])
+        self.assertNotEqual(new_chunks, chunks)
+        self.assertEqual(PackageMetadataCache.objects.filter(package=self.package).count(), 2)
+
+        # the same checksum type with another checksum replaces the entry
+        reused, _chunks = self.write({self.package.pk: ("sha256", "2" * 64)})
+        self.assertEqual(reused, 0)
+        cache = PackageMetadataCache.objects.get(package=self.package, checksum_type="sha256")
+        self.assertEqual(cache.pkgId, "2" * 64)
+
+    def test_concurrent_upsert(self):
+        """Test caching a package which another publication has cached in the meantime."""
+        PackageMetadataCache.objects.create(
+            package=self.package,
+            checksum_type="sha256",
+            pkgId="0" * 64,
+            primary="stale",
+            filelists="stale",
+            other="stale",
+        )
+        with mock.patch("pulp_rpm.app.tasks.publishing.get_cached_chunks", return_value={}):
+            reused, chunks = self.write()
+        self.assertEqual(reused, 0)
+        cache = PackageMetadataCache.objects.get(package=self.package)
+        self.assertEqual((cache.primary, cache.filelists, cache.other), chunks)
+
+    def test_package_updated(self):
+        """Test that the cache isn't used once the package has been updated."""
+        self.write()
+        self.package.summary = "A new summary"
+        self.package.save()
+
+        reused, chunks = self.write()
+        self.assertEqual(reused, 0)
+        self.assertIn("A new summary", chunks[0])
+        reused, _chunks = self.write()
+        self.assertEqual(reused, 1)
+
+    def test_trim_changelogs(self):
+        """Test that trimming the changelogs of packages invalidates their cache."""
+        _reused, chunks = self.write()
+        self.assertEqual(chunks[2].count("<changelog "), 3)
+
+        call_command("rpm-trim-changelogs", changelog_limit=1)
+        self.assertFalse(PackageMetadataCache.objects.filter(package=self.package).exists())
+
+        reused, chunks = self.write()
+        self.assertEqual(reused, 0)
+        self.assertEqual(chunks[2].count("<changelog "), 1)
+        self.assertIn("- change 3", chunks[2])
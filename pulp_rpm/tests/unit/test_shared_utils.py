@@ -1,6 +1,20 @@
+import io
+import struct
 from unittest import TestCase
 from datetime import datetime
-from pulp_rpm.app.shared_utils import is_previous_version, urlpath_sanitize, parse_time
+from pulp_rpm.app.shared_utils import (
+    is_previous_version,
+    urlpath_sanitize,
+    parse_time,
+    read_rpm_header,
+    RPM_HEADER_MAGIC,
+)
+
+
+def make_header_structure(index_count, data_size):
+    """Create a signature or a header with the given number of index entries and data size."""
+    preamble = RPM_HEADER_MAGIC + b"\x01" + bytes(4) + struct.pack(">II", index_count, data_size)
+    return preamble + b"i" * (16 * index_count) + b"d" * data_size
 
 
 class TestSharedUtils(TestCase):
@@ -82,3 +96,26 @@ class TestSharedUtils(TestCase):
         self.assertNotEqual(iso_input, parse_time(iso_input))
 
         self.assertIsNone(parse_time("abcd"))
+
+
+class TestReadRpmHeader(TestCase):
+    """Test reading the header of RPMs without their payload."""
+
+    def test_read_header(self):
+        """Test that the signature is padded and the payload is not read."""
+        signature = make_header_structure(2, 5)
+        header = make_header_structure(3, 40)
+        padding = bytes(-(96 + len(signature)) % 8)
+        rpm_header = b"l" * 96 + signature + padding + header
+
+        rpm_file = io.BytesIO(rpm_header + b"payload")
+        self.assertEqual(read_rpm_header(rpm_file), rpm_header)
+        self.assertEqual(rpm_file.read(), b"payload")
+
+    def test_invalid(self):
+        """Test that truncated files and other files are rejected."""
+        rpm_header = b"l" * 96 + make_header_structure(1, 8) + make_header_structure(1, 8)
+        for invalid in (rpm_header[:-1], b"<?xml version='1.0'?>" * 10):
+            with self.subTest(invalid=invalid[:10]):
+                with self.assertRaises(OSError):
+                    read_rpm_header(io.BytesIO(invalid))
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pulp_rpm.app.downloaders import NotModified
+from pulp_rpm.app.models import Package, UpdateRecord
+from pulp_rpm.app.tasks.synchronizing import (
+    MIRROR_INDEX_BATCH_SIZE,
+    EventLoopLagMonitor,
+    MetadataFetchCache,
+    MirrorIndex,
+    MirroredDeclarativeArtifact,
+    get_unchanged_metadata,
+    iterate_in_thread,
+)
+
+
+class TestMirrorIndex(TestCase):
+    """Test the index of the metadata files and packages of mirrored repositories."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.index = MirrorIndex()
+        self.repo = SimpleNamespace(pk="repo")
+        self.sub_repo = SimpleNamespace(pk="sub-repo")
+
+    def tearDown(self):
+        if os.path.exists(self.index.path):
+            self.index.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_metadata_files(self):
+        """Test that the latest path of every metadata file of a repository is returned."""
+        self.index.add_metadata_file(self.repo, "/tmp/a", "repodata/repomd.xml")
+        self.index.add_metadata_file(self.repo, "/tmp/b", "repodata/repomd.xml")
+        self.index.add_metadata_file(self.sub_repo, "/tmp/c", "repodata/repomd.xml.asc")
+
+        self.assertEqual(
+            list(self.index.metadata_files(self.repo)), [("repodata/repomd.xml", "/tmp/b")]
+        )
+        self.assertTrue(self.index.has_metadata_file(self.sub_repo, "repodata/repomd.xml.asc"))
+        self.assertFalse(self.index.has_metadata_file(self.repo, "repodata/repomd.xml.asc"))
+
+    def test_package_locations(self):
+        """Test that all the distinct locations of the requested packages are returned."""
+        pkgids = ["{:064x}".format(i) for i in range(MIRROR_INDEX_BATCH_SIZE + 1)]
+        for pkgid in pkgids:
+            self.index.add_package(self.repo, pkgid, "Packages/{}.rpm".format(pkgid))
+        self.index.add_package(self.repo, pkgids[0], "Other/{}.rpm".format(pkgids[0]))
+        self.index.add_package(self.repo, pkgids[0], "Other/{}.rpm".format(pkgids[0]))
+        self.index.add_package(self.sub_repo, pkgids[1], "Sub/{}.rpm".format(pkgids[1]))
+
+        locations = list(self.index.package_locations(self.repo, pkgids + ["missing"]))
+        self.assertEqual(len(locations), len(pkgids) + 1)
+        self.assertEqual(
+            sorted(location for pkgid, location in locations if pkgid == pkgids[0]),
+            ["Other/{}.rpm".format(pkgids[0]), "Packages/{}.rpm".format(pkgids[0])],
+        )
+
+    def test_close(self):
+        """Test that closing the index removes its file."""
+        self.index.close()
+        self.assertFalse(os.path.exists(self.index.path))
+
+
+class TestIterateInThread(TestCase):
+    """Test iterating over CPU-bound iterables outside of the event loop."""
+
+    def consume(self, iterable_func, limit=None, **kwargs):
+        async def consume():
+            items = []
+            iterator = iterate_in_thread(iterable_func, **kwargs)
+            try:
+                async for item in iterator:
+                    items.append(item)
+                    if len(items) == limit:
+                        break
+            finally:
+                await iterator.aclose()
+            return items
+
+        return asyncio.run(consume())
+
+    def test_items(self):
+        """Test that all the items are returned in order, across batches."""
+        threads = set()
+
+        def iterable():
+            for i in range(25):
+                threads.add(threading.get_ident())
+                yield i
+
+        self.assertEqual(self.consume(iterable, batch_size=10, max_size=1), list(range(25)))
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_error(self):
+        """Test that errors of the iterable are raised in the event loop."""
+
+        def iterable():
+            yield 1
+            raise ValueError("broken metadata")
+
+        with self.assertRaises(ValueError):
+            self.consume(iterable)
+
+    def test_stop(self):
+        """Test that the thread stops when the iteration is stopped early."""
+        produced = []
+
+        def iterable():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        self.assertEqual(self.consume(iterable, limit=5, batch_size=2, max_size=2), list(range(5)))
+        self.assertLess(len(produced), 1000)
+
+
+class TestEventLoopLagMonitor(TestCase):
+    """Test measuring the lag of the event loop."""
+
+    def test_blocking(self):
+        """Test that blocking the event loop is measured."""
+
+        async def block():
+            async with EventLoopLagMonitor(interval=0.01) as monitor:
+                await asyncio.sleep(0.05)
+                time.sleep(0.2)
+                await asyncio.sleep(0.05)
+            return monitor
+
+        monitor = asyncio.run(block())
+        self.assertGreaterEqual(monitor.max_lag, 0.15)
+        self.assertGreater(monitor.samples, 1)
+        self.assertLess(monitor.mean_lag, monitor.max_lag)
+
+
+class TestGetUnchangedMetadata(TestCase):
+    """Test finding the metadata which has not changed since the previous sync."""
+
+    def sync_details(self, **changes):
+        details = {
+            "url": "https://example.com/repo/",
+            "download_policy": "on_demand",
+            "sync_policy": "mirror_content_only",
+            "most_recent_version": 3,
+            "retain_package_versions": 0,
+            "skip_types": [],
+            "repomd_checksums": {
+                "primary": "a",
+                "filelists": "b",
+                "other": "c",
+                "modules": "d",
+                "updateinfo": "e",
+                "group": "f",
+            },
+        }
+        details.update(changes)
+        return details
+
+    def test_updateinfo_changed(self):
+        """Test that only the changed groups of metadata are parsed again."""
+        details = self.sync_details()
+        details["repomd_checksums"] = dict(details["repomd_checksums"], updateinfo="g")
+
+        unchanged_metadata, unchanged_models = get_unchanged_metadata(details, self.sync_details())
+        self.assertEqual(unchanged_metadata, {"primary", "filelists", "other", "modules", "group"})
+        self.assertIn(Package, unchanged_models)
+        self.assertNotIn(UpdateRecord, unchanged_models)
+
+    def test_group_changed(self):
+        """Test that a change to any of the records of a group changes the whole group."""
+        details = self.sync_details()
+        details["repomd_checksums"] = dict(details["repomd_checksums"], modules="g")
+
+        unchanged_metadata, unchanged_models = get_unchanged_metadata(details, self.sync_details())
+        self.assertEqual(unchanged_metadata, {"updateinfo", "group"})
+        self.assertNotIn(Package, unchanged_models)
+
+    def test_configuration_changed(self):
+        """Test that nothing is carried forward if the sync or the repository changed."""
+        for changes in (
+            {"most_recent_version": 4},
+            {"skip_types": ["srpm"]},
+            {"retain_package_versions": 1},
+            {"url": "https://example.com/other/"},
+            {"repomd_checksums": None},
+        ):
+            with self.subTest(changes=changes):
+                self.assertEqual(
+                    get_unchanged_metadata(self.sync_details(), self.sync_details(**changes)),
+                    (set(), []),
+                )
+
+
+class FakeRemote:
+    """A remote whose downloaders answer with the given files, by URL."""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def get_downloader(self, url, validators=None, **kwargs):
+        remote = self
+
+        class Downloader:
+            async def run(self, extra_data=None):
+                remote.requests.append((url, validators))
+                if url not in remote.files:
+                    raise FileNotFoundError(url)
+                etag = remote.files[url]
+                if validators and validators.get("etag") == etag:
+                    raise NotModified(url)
+                return SimpleNamespace(url=url, path="/tmp/file", headers={"ETag": etag})
+
+        return Downloader()
+
+
+class TestMetadataFetchCache(TestCase):
+    """Test fetching the repomd.xml and treeinfo files once per task, and conditionally."""
+
+    def setUp(self):
+        self.url = "https://example.com/repo/repodata/repomd.xml"
+        self.remote = FakeRemote({self.url: '"v2"'})
+        self.cache = MetadataFetchCache()
+
+    def fetch(self, url, validators=None):
+        return asyncio.run(self.cache.fetch(self.remote, url, validators=validators))
+
+    def test_fetched_once(self):
+        """Test that files are only downloaded once, and their validators are kept."""
+        result = self.fetch(self.url, validators={})
+        self.assertIs(self.fetch(self.url), result)
+        self.assertIs(self.cache.get(self.url), result)
+        self.assertEqual(self.remote.requests, [(self.url, None)])
+        self.assertEqual(self.cache.validators, {self.url: {"etag": '"v2"'}})
+
+    def test_not_modified(self):
+        """Test that unmodified files are only downloaded when requested unconditionally."""
+        validators = {self.url: {"etag": '"v2"'}}
+        self.assertIsNone(self.fetch(self.url, validators=validators))
+        self.assertIsNone(self.fetch(self.url, validators=validators))
+        self.assertTrue(self.cache.not_modified(self.url))
+        self.assertEqual(self.cache.validators, validators)
+        self.assertEqual(len(self.remote.requests), 1)
+
+        self.assertIsNotNone(self.fetch(self.url))
+        self.assertEqual(self.remote.requests[1], (self.url, None))
+
+    def test_modified(self):
+        """Test that modified files are downloaded with their new validators."""
+        result = self.fetch(self.url, validators={self.url: {"etag": '"v1"'}})
+        self.assertIsNotNone(result)
+        self.assertEqual(self.cache.validators, {self.url: {"etag": '"v2"'}})
+
+    def test_not_found(self):
+        """Test that missing files are only requested once."""
+        url = "https://example.com/repo/.treeinfo"
+        for _ in range(2):
+            with self.assertRaises(FileNotFoundError):
+                self.fetch(url)
+        self.assertEqual(len(self.remote.requests), 1)
+
+
+class FakeArtifact:
+    """An unsaved artifact of which nothing is known."""
+
+    def __getattr__(self, name):
+        return None
+
+
+class TestMirroredDeclarativeArtifact(TestCase):
+    """Test spreading the downloads of artifacts across mirrors."""
+
+    def setUp(self):
+        self.remote = FakeRemote({})
+        self.urls = ["https://{}.example.com/foo.rpm".format(mirror) for mirror in "abc"]
+
+    def download(self, da):
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(da.download())
+        return [url for url, _validators in self.remote.requests]
+
+    def test_rotation(self):
+        """Test that only the order of the download attempts is rotated."""
+        da = MirroredDeclarativeArtifact(
+            artifact=FakeArtifact(),
+            urls=self.urls,
+            relative_path="foo.rpm",
+            remote=self.remote,
+            mirror_offset=4,
+        )
+        self.assertEqual(da.url, self.urls[0])
+        self.assertEqual(self.download(da), self.urls[1:] + self.urls[:1])
+        self.assertEqual(da.urls, self.urls)
+
+    def test_replaced_urls(self):
+        """Test that replaced URLs, e.g. of an alternate content source, are tried in order."""
+        da = MirroredDeclarativeArtifact(
+            artifact=FakeArtifact(),
+            urls=self.urls,
+            relative_path="foo.rpm",
+            remote=self.remote,
+            mirror_offset=1,
+        )
+        acs_url = "https://acs.example.com/foo.rpm"
+        da.urls = [acs_url] + da.urls
+        self.assertEqual(self.download(da), [acs_url] + self.urls)
@@ -0,0 +1,145 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from pulp_rpm.app.zchunk import (
+    ZCK_CHECKSUM_TYPES,
+    ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS,
+    ZCK_MAGIC,
+    ZchunkError,
+    ZchunkHeader,
+    assemble,
+    checksum_digest,
+    missing_ranges,
+    read_header,
+    reusable_chunks,
+)
+
+
+def compint(value):
+    """Encode a compressed int of a zchunk header."""
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F)
+        value >>= 7
+    data.append(value | 0x80)
+    return bytes(data)
+
+
+def make_zchunk(chunks, checksum_type=1, chunk_checksum_type=3, flags=0):
+    """Create a zchunk file with the given, uncompressed, chunks."""
+    chunk_checksum_size = ZCK_CHECKSUM_TYPES[chunk_checksum_type][1]
+    entries = b""
+    for chunk in chunks:
+        checksum = checksum_digest(chunk_checksum_type, chunk).digest()[:chunk_checksum_size]
+        entries += checksum
+        if flags & ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS:
+            entries += checksum
+        entries += compint(len(chunk)) + compint(len(chunk))
+    index = compint(chunk_checksum_type) + compint(len(chunks)) + entries
+
+    checksum_size = ZCK_CHECKSUM_TYPES[checksum_type][1]
+    preface = bytes(checksum_size) + compint(flags) + compint(0)
+    header = preface + compint(len(index)) + index + compint(0)
+    lead = ZCK_MAGIC + compint(checksum_type) + compint(len(header))
+    header_checksum = checksum_digest(checksum_type, lead + header).digest()
+    return lead + header_checksum + header + b"".join(chunks)
+
+
+class TestZchunkHeader(TestCase):
+    """Test parsing the header of zchunk files."""
+
+    def test_chunks(self):
+        """Test that the offsets and lengths of the chunks are read."""
+        chunks = [b"dictionary", b"a" * 100, b"b" * 1000]
+        for flags in (0, ZCK_FLAG_HAS_UNCOMPRESSED_CHECKSUMS):
+            with self.subTest(flags=flags):
+                data = make_zchunk(chunks, flags=flags)
+                header_data, header = read_header(io.BytesIO(data))
+
+                self.assertEqual(len(header_data), header.size)
+                self.assertEqual(header.file_size, len(data))
+                self.assertEqual([chunk.length for chunk in header.chunks], [10, 100, 1000])
+                for chunk, expected in zip(header.chunks, chunks):
+                    self.assertEqual(data[chunk.offset : chunk.offset + chunk.length], expected)
+
+    def test_invalid(self):
+        """Test that corrupted headers and other files are rejected."""
+        data = bytearray(make_zchunk([b"dictionary", b"chunk"]))
+        data[len(ZCK_MAGIC) + 10] ^= 0xFF
+        for invalid in (bytes(data), b"<?xml version='1.0'?>"):
+            with self.subTest(invalid=invalid[:10]):
+                with self.assertRaises(ZchunkError):
+                    ZchunkHeader(invalid)
+
+
+class TestZchunkAssemble(TestCase):
+    """Test assembling zchunk files from their previous version and the changed chunks."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.previous = make_zchunk([b"dictionary", b"a" * 100, b"b" * 100, b"c" * 100])
+        self.new = make_zchunk([b"dictionary", b"a" * 100, b"B" * 100, b"c" * 100, b"d" * 50])
+        self.header_data, self.header = read_header(io.BytesIO(self.new))
+        self.previous_chunks = reusable_chunks(
+            self.header, read_header(io.BytesIO(self.previous))[1]
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def download(self, ranges):
+        downloaded = []
+        for start, end in ranges:
+            path = os.path.join(self.tmpdir.name, "{}-{}".format(start, end))
+            with open(path, "wb") as f:
+                f.write(self.new[start : end + 1])
+            downloaded.append((start, end, path))
+        return downloaded
+
+    def assemble(self, ranges):
+        output = io.BytesIO()
+        assemble(
+            self.header_data,
+            self.header,
+            io.BytesIO(self.previous),
+            self.previous_chunks,
+            self.download(ranges),
+            output,
+        )
+        return output.getvalue()
+
+    def test_missing_ranges(self):
+        """Test that only the changed chunks are downloaded, merging the ones close together."""
+        changed = self.header.chunks[2]
+        added = self.header.chunks[4]
+
+        ranges = missing_ranges(self.header, self.previous_chunks)
+        self.assertEqual(
+            ranges,
+            [
+                (changed.offset, changed.offset + changed.length - 1),
+                (added.offset, added.offset + added.length - 1),
+            ],
+        )
+        self.assertEqual(
+            missing_ranges(self.header, self.previous_chunks, max_gap=100),
+            [(changed.offset, added.offset + added.length - 1)],
+        )
+        self.assertEqual(
+            missing_ranges(self.header, {}), [(self.header.size, self.header.file_size - 1)]
+        )
+
+    def test_assemble(self):
+        """Test that the assembled file is identical to the new version."""
+        for max_gap in (0, 100):
+            with self.subTest(max_gap=max_gap):
+                ranges = missing_ranges(self.header, self.previous_chunks, max_gap=max_gap)
+                self.assertEqual(self.assemble(ranges), self.new)
+
+    def test_assemble_missing_chunk(self):
+        """Test that chunks which are neither reusable nor downloaded are detected."""
+        ranges = missing_ranges(self.header, self.previous_chunks)
+        with self.assertRaises(ZchunkError):
+            self.assemble(ranges[:1])